@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Async Polygon client built on the shared aiohttp connection pool.
+Mirrors the PolygonFinancials method surface so many Polygon calls can be
+fanned out concurrently on one event loop instead of one thread per call.
+Only sending requests is async here: endpoints, strategy tables, caching and
+every decision on the responses are PolygonFinancials helpers shared by both.
+SyncPolygonFinancials wraps it for the (synchronous) Flask routes.
+"""
+import asyncio
+import contextvars
+import functools
+
+import aiohttp
+
+from http_pool import get_aiohttp_session, run_sync
+from singleflight import normalize_url
+from request_memo import memoized_async
+from fanout import fan_out_async
+from get_pe_and_cash_flow import (
+    API_KEY,
+    RATE_LIMITER,
+    POLYGON_FLIGHTS,
+    INDUSTRY_PE_DEADLINE,
+    INDUSTRY_PE_MAX_PARALLEL,
+    PRICE_CHAIN,
+    PE_CHAIN,
+    PolygonFinancials,
+    _strategies,
+    _price_sources,
+    _pe_sources,
+    _details_urls,
+    _financials_urls,
+    _earnings_url,
+    _dividends_url,
+    _peer_search_urls,
+    _extract_financials,
+    _empty_financials,
+    _latest_earnings,
+    _dividend_history,
+    _dividend_error,
+    _peer_tickers,
+    _observed_details,
+    _extract_pe_from_details,
+)
+
+class AsyncPolygonFinancials:
+    """Async counterpart of PolygonFinancials. All data methods are coroutines."""
+    def __init__(self, ticker, api_key=None, analyzer=None):
+        self.ticker = ticker
+        self.api_key = api_key or API_KEY
+        self.analyzer = analyzer  # StockAnalyzer instance for getting similar companies
+        # Sync instance holding the shared logic and state (caches, misses, formatting)
+        self._formatter = PolygonFinancials(ticker, self.api_key, analyzer)
+
+    async def _get_json(self, url):
+        """Plain GET on the shared pool without rate limiting or retries (memoized per request)."""
+        try:
+            data = await memoized_async(normalize_url(url), self._send_get_json, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._formatter._note_failure(url, getattr(e, 'status', None))
+            raise
+        return self._formatter._note_json_status(url, data)
+
+    async def _send_get_json(self, url):
+        session = get_aiohttp_session()
+        async with session.get(url) as response:
+            return await response.json(content_type=None)
+
+    async def _make_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+        """Make an API request, sharing the result with concurrent identical requests
+        and with later identical requests in the same request_memo() block."""
+        key = normalize_url(url, method)
+        try:
+            data = await memoized_async(
+                key, POLYGON_FLIGHTS.do_async, key, self._send_api_request, url, method, max_retries, retry_delay
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._formatter._note_failure(url, getattr(e, 'status', None))
+            raise
+        if data is None:  # Rate limited on every attempt
+            self._formatter._note_failure(url)
+        return data
+
+    def record_miss(self, data_type):
+        """Negatively cache a lookup that found nothing (see PolygonFinancials.record_miss)."""
+        self._formatter.record_miss(data_type)
+
+    def record_industry_pe(self, pe_ratio):
+        """Add a looked up P/E ratio to the shared industry statistics."""
+        self._formatter.record_industry_pe(pe_ratio)
+
+    async def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+        """Make an API request with proper error handling and rate limiting."""
+        session = get_aiohttp_session()
+        for attempt in range(max_retries):
+            try:
+                # Wait for rate limiter before making request
+                await RATE_LIMITER.acquire_async()
+
+                async with session.request(method, url) as response:
+                    # Feed rate limit headers and 429s back into the shared limiter
+                    retry_after = RATE_LIMITER.record_response(response.status, response.headers)
+                    if response.status == 429:  # Too Many Requests
+                        print(f"Rate limit hit, upstream blocked for {retry_after} seconds...")
+                        continue
+
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if getattr(e, 'status', None) == 404:
+                    raise  # Unknown ticker or endpoint: retrying won't change the answer
+                print(f"API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                if attempt < max_retries - 1:  # Don't sleep on the last attempt
+                    await asyncio.sleep(retry_delay * (attempt + 1))  # Exponential backoff
+                else:
+                    raise
+
+        return None
+
+    async def _extract_from(self, url, extract):
+        """Fetch url and parse the response with extract (one fallback strategy)."""
+        return extract(await self._make_api_request(url))
+
+    async def _run_sync(self, fn, *args):
+        """Run a blocking call (the analyzer's Claude calls) off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+
+    async def get_current_price(self):
+        """Get the latest closing price for the ticker."""
+        cached_price = self._formatter._cached_price()
+        if cached_price is not None:
+            return cached_price
+        if self._formatter._negative('price'):
+            return None
+
+        price = await PRICE_CHAIN.run_async(self._price_strategies(), is_valid=bool, ticker=self.ticker)
+        return self._formatter._store_price(price)
+
+    def _price_strategies(self):
+        """(name, fn) price sources in order of preference."""
+        return _strategies(_price_sources(self.ticker, self.api_key), self._extract_from)
+
+    async def get_ticker_details(self):
+        """Get basic information about the ticker."""
+        if self._formatter._negative('ticker_details'):
+            return self._formatter._minimal_details()
+        v3_url, v1_url = _details_urls(self.ticker, self.api_key)
+        try:
+            details = self._formatter._details_from_v3(await self._get_json(v3_url))
+            if details is None:
+                details = self._formatter._details_from_v1(await self._get_json(v1_url))
+            return details
+        except Exception as e:
+            return self._formatter._details_error(e)
+
+    async def get_latest_earnings(self):
+        """Get the latest earnings data."""
+        try:
+            return _latest_earnings(await self._get_json(_earnings_url(self.ticker, self.api_key)))
+        except Exception as e:
+            print(f"Error getting earnings data: {e}")
+            return None
+
+    async def get_dividend_history(self):
+        """Get dividend history for the past 5 years and analyze growth."""
+        try:
+            return _dividend_history(await self._get_json(_dividends_url(self.ticker, self.api_key)))
+        except Exception as e:
+            return _dividend_error(e)
+
+    async def get_pe_ratio(self):
+        """Get the P/E ratio, reusing a recently cached value."""
+        cached_pe = self._formatter._cached_pe_ratio()
+        if cached_pe is not None:
+            return cached_pe
+        if self._formatter._negative('pe_ratio'):
+            return None
+
+        pe_ratio, fallback = await self._fetch_pe_ratio()
+        self._formatter._record_pe_ratio(pe_ratio, fallback)
+        return pe_ratio
+
+    async def _fetch_pe_ratio(self):
+        """Calculate P/E ratio with the same fallback chain as PolygonFinancials.get_pe_ratio."""
+        return self._formatter._pe_or_fallback(await self.lookup_pe_ratio())
+
+    async def lookup_pe_ratio(self, manual=True):
+        """Run the P/E fallback chain (see PolygonFinancials.lookup_pe_ratio)."""
+        details = await self._pe_details()
+        if self._formatter.not_found:
+            return None  # Unknown ticker: no other source will know it either
+        return await PE_CHAIN.run_async(self._pe_strategies(details, manual), ticker=self.ticker)
+
+    async def _pe_details(self):
+        """Ticker details response fetched ahead of the P/E chain (see PolygonFinancials._pe_details)."""
+        try:
+            return _observed_details(await self._make_api_request(_details_urls(self.ticker, self.api_key)[0]))
+        except Exception as e:
+            print(f"Error getting ticker details for {self.ticker}: {e}")
+            return None
+
+    async def _extract_pe_from(self, details):
+        return _extract_pe_from_details(details)
+
+    def _pe_strategies(self, details, manual=True):
+        """(name, fn) P/E sources in order of preference (see PolygonFinancials._pe_strategies)."""
+        strategies = [('ticker_details', functools.partial(self._extract_pe_from, details))]
+        strategies += _strategies(_pe_sources(self.ticker, self.api_key), self._extract_from)
+        if manual:
+            strategies.append(('manual', self._calculate_pe_manually))
+        return strategies
+
+    async def _calculate_pe_manually(self):
+        """Calculate P/E ratio manually using price and earnings."""
+        price = await self.get_current_price()
+        if not price:
+            return None
+        for url in _financials_urls(self.ticker, self.api_key):
+            pe_ratio = self._formatter._pe_from_eps(price, await self._make_api_request(url))
+            if pe_ratio is not None:
+                return pe_ratio
+        return None
+
+    async def get_financial_data(self):
+        """Get comprehensive financial data."""
+        cached_data = self._formatter._cached_financials()
+        if cached_data is not None:
+            return cached_data
+        if self._formatter._negative('financials'):
+            return _empty_financials(self.ticker)
+
+        for url in _financials_urls(self.ticker, self.api_key):
+            result = _extract_financials(await self._make_api_request(url))
+            if result:
+                return self._formatter._store_financials(result)
+        return self._formatter._no_financials()
+
+    async def format_balance_sheet(self, output_format='dict'):
+        """Fetch financial data and format the balance sheet (see PolygonFinancials.format_balance_sheet)."""
+        financial_data = await self.get_financial_data()
+        return self._formatter.format_balance_sheet(output_format, financial_data=financial_data)
+
+    async def format_cash_flow(self, output_format='dict'):
+        """Fetch financial data and format the cash flow (see PolygonFinancials.format_cash_flow)."""
+        financial_data = await self.get_financial_data()
+        return self._formatter.format_cash_flow(output_format, financial_data=financial_data)
+
+    async def get_industry_peers(self):
+        """Get a list of peer companies in the same industry."""
+        try:
+            peers = self._formatter._known_peers()
+            if peers:
+                return peers
+
+            if self.analyzer:
+                peers = await self._run_sync(self.analyzer.get_similar_companies, self.ticker)
+                if peers:
+                    return self._formatter._store_peers(peers)
+
+            peers = []
+            for url in _peer_search_urls(await self.get_ticker_details(), self.api_key):
+                peers = _peer_tickers(await self._get_json(url), self.ticker)
+                if peers:
+                    break
+            return self._formatter._store_peers(peers)
+        except Exception as e:
+            print(f"Error getting industry peers: {e}")
+            return []
+
+    async def get_industry_pe_ratio(self):
+        """Calculate the average P/E ratio for the industry peers."""
+        return (await self.get_industry_pe_summary())['industry_pe_ratio']
+
+    async def get_industry_pe_summary(self, deadline=INDUSTRY_PE_DEADLINE, max_parallel=INDUSTRY_PE_MAX_PARALLEL):
+        """Async version of PolygonFinancials.get_industry_pe_summary."""
+        summary = self._formatter._industry_pe_shortcut()
+        if summary['industry_pe_ratio'] is not None:
+            return summary
+        try:
+            peers = [peer for peer in await self.get_industry_peers() if peer != self.ticker]
+            if not peers:
+                print(f"No industry peers found for {self.ticker}")
+                return summary
+            summary['peers'] = peers
+
+            # Reuse cached peer P/E ratios and fetch the rest concurrently until the deadline
+            peer_pe_ratios = self._formatter._cached_peer_pe_ratios(peers)
+            fetched, summary['partial'] = await fan_out_async(
+                lambda peer: AsyncPolygonFinancials(peer, self.api_key, self.analyzer).get_pe_ratio(),
+                [peer for peer in peers if peer not in peer_pe_ratios],
+                max_parallel=max_parallel,
+                deadline=deadline
+            )
+            peer_pe_ratios.update(fetched)
+            if self._formatter._average_peer_pe_ratios(summary, peer_pe_ratios):
+                return summary
+
+            # If we couldn't get P/E ratios for peers, ask Claude for the industry average
+            if self.analyzer and not summary['partial']:
+                try:
+                    prompt = self._formatter._industry_pe_prompt(await self.get_ticker_details())
+                    if prompt:
+                        pe_str = await self._run_sync(self._formatter._ask_industry_pe, prompt)
+                        self._formatter._store_industry_pe_answer(summary, pe_str)
+                except Exception as e:
+                    print(f"Error getting industry P/E from Claude: {e}")
+
+            return summary
+        except Exception as e:
+            print(f"Error calculating industry P/E ratio: {e}")
+            return summary
+
+    async def get_financial_data_for_agent(self):
+        """Get financial data in a format suitable for the agent, fetching all parts concurrently."""
+        parts = await asyncio.gather(
+            self.get_ticker_details(),
+            self.get_current_price(),
+            self.get_pe_ratio(),
+            self.get_industry_pe_summary(),
+            self.get_dividend_history(),
+            self.get_financial_data(),
+        )
+        return self._formatter._agent_data(*parts)
+
+    async def get_financial_data_for_ticker(self):
+        """Get P/E ratio, balance sheet, cash flow and dividend data concurrently."""
+        try:
+            return self._formatter._ticker_data(*await asyncio.gather(
+                self.get_pe_ratio(),
+                self.get_financial_data(),
+                self.get_dividend_history(),
+            ))
+        except Exception as e:
+            return self._formatter._ticker_data_error(e)
+
+class SyncPolygonFinancials:
+    """Blocking facade over AsyncPolygonFinancials for Flask routes.
+
+    Every coroutine method is exposed as a regular method that runs on the shared
+    background event loop, so calls made from any Flask thread reuse the same
+    keep-alive connection pool.
+    """
+    def __init__(self, ticker, api_key=None, analyzer=None):
+        self._client = AsyncPolygonFinancials(ticker, api_key, analyzer)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def blocking(*args, **kwargs):
+            return run_sync(attr(*args, **kwargs))
+        return blocking
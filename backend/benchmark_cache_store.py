@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the stock_info_cache storage engine.
+Compares the previous helpers (a new rollback-journal connection per read and
+write) with StockInfoStore (pooled WAL connections, batched writes) under
+concurrent request load. Runs against a temporary database.
+
+Usage: python benchmark_cache_store.py [threads] [operations per thread]
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from cache_store import StockInfoStore
+
+TICKERS = [f"T{i:03d}" for i in range(200)]
+DATA_TYPES = ['basic_info', 'financials', 'pe_ratio', 'balance_sheet']
+PAYLOAD = {'name': 'Example Corp', 'description': 'x' * 400, 'risk': 'medium', 'metrics': list(range(50))}
+WRITE_SHARE = 0.1  # Share of operations that are writes
+
+class LegacyHelpers:
+    """The previous cache_stock_info / get_cached_stock_info implementation."""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = self._connect()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS stock_info_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(ticker, data_type)
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def put(self, ticker, data_type, data):
+        conn = self._connect()
+        conn.execute(
+            "REPLACE INTO stock_info_cache (ticker, data_type, data) VALUES (?, ?, ?)",
+            (ticker.upper(), data_type, json.dumps(data))
+        )
+        conn.commit()
+        conn.close()
+
+    def get(self, ticker, data_type, max_age_seconds=86400):
+        conn = self._connect()
+        cache_expiry = (datetime.now() - timedelta(seconds=max_age_seconds)).isoformat(sep=' ', timespec='seconds')
+        row = conn.execute(
+            "SELECT data FROM stock_info_cache WHERE ticker = ? AND data_type = ? AND timestamp > ?",
+            (ticker.upper(), data_type, cache_expiry)
+        ).fetchone()
+        conn.close()
+        return json.loads(row['data']) if row else None
+
+    def close(self):
+        pass
+
+def run(store, threads, operations):
+    """Run a mixed read/write load and return (reads per second, writes per second)."""
+    for ticker in TICKERS:
+        for data_type in DATA_TYPES:
+            store.put(ticker, data_type, PAYLOAD)
+    if hasattr(store, 'flush'):
+        store.flush()
+
+    counts = {'reads': 0, 'writes': 0}
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        reads = writes = 0
+        for _ in range(operations):
+            ticker, data_type = rng.choice(TICKERS), rng.choice(DATA_TYPES)
+            if rng.random() < WRITE_SHARE:
+                store.put(ticker, data_type, PAYLOAD)
+                writes += 1
+            else:
+                store.get(ticker, data_type)
+                reads += 1
+        with lock:
+            counts['reads'] += reads
+            counts['writes'] += writes
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    store.close()  # Includes committing the queued writes
+    elapsed = time.perf_counter() - start
+    return counts['reads'] / elapsed, counts['writes'] / elapsed
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    print(f"{threads} threads x {operations} operations, {WRITE_SHARE:.0%} writes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = run(LegacyHelpers(os.path.join(tmp, "legacy.db")), threads, operations)
+        store = run(StockInfoStore(os.path.join(tmp, "store.db")), threads, operations)
+
+    print(f"{'':20}{'reads/s':>12}{'writes/s':>12}")
+    print(f"{'legacy helpers':20}{legacy[0]:>12,.0f}{legacy[1]:>12,.0f}")
+    print(f"{'StockInfoStore':20}{store[0]:>12,.0f}{store[1]:>12,.0f}")
+    print(f"Speedup: {store[0] / legacy[0]:.1f}x reads, {store[1] / legacy[1]:.1f}x writes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Background refresh of cache entries that are past their soft TTL.
+A stale entry is served right away and its refresh is queued here, so the
+request doesn't wait on Polygon or Claude. Refreshes for the same key are
+deduplicated and run at refresh priority, behind interactive requests.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_scheduler import request_priority, PRIORITY_REFRESH
+from request_memo import request_memo
+
+MAX_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", 2))  # Refreshes running at once
+
+class BackgroundRefresher:
+    """Runs at most one refresh per key at a time on a small thread pool.
+
+    Args:
+        max_workers: Refreshes running at once
+        priority: Rate limiter priority class the refreshes run under
+    """
+    def __init__(self, max_workers=MAX_WORKERS, priority=PRIORITY_REFRESH):
+        self.priority = priority
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-refresh")
+        self.lock = threading.Lock()
+        self.running = set()  # Keys queued or being refreshed
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, key, fn, *args):
+        """Queue fn(*args) to refresh key unless a refresh for it is already queued.
+
+        Returns:
+            True if a refresh was queued
+        """
+        with self.lock:
+            if key in self.running:
+                self.deduplicated += 1
+                return False
+            self.running.add(key)
+            self.scheduled += 1
+        self.executor.submit(contextvars.copy_context().run, self._run, key, fn, args)
+        return True
+
+    def _run(self, key, fn, args):
+        try:
+            with request_priority(self.priority), request_memo():
+                fn(*args)
+            succeeded = True
+        except Exception as e:
+            print(f"Error refreshing {key}: {e}")
+            succeeded = False
+        with self.lock:
+            self.running.discard(key)
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'scheduled': self.scheduled,
+                'deduplicated': self.deduplicated,
+                'completed': self.completed,
+                'failed': self.failed,
+                'running': len(self.running),
+            }
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Two-tier storage engine for the per-ticker stock_info_cache table.
+Hot entries are served from a bounded in-process LRU as Python objects, so a
+hit costs neither a SQLite query nor json.loads. Behind it, SQLite connections
+(and their prepared statement caches) are kept open in a small pool instead of
+connecting for every read and write. The database runs in WAL mode so readers
+don't block behind writers, and writes go through both tiers and are committed
+in batches by a background thread. Memory entries also keep their serialized
+JSON, encoded once into a ResponseBody (bytes, ETag, compressed variants) the
+first time a route serves it.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from market_calendar import price_expiry, statement_expiry
+from response_body import ResponseBody
+
+BATCH_SIZE = int(os.getenv("CACHE_STORE_BATCH_SIZE", 100))  # Writes committed per transaction
+FLUSH_INTERVAL = float(os.getenv("CACHE_STORE_FLUSH_INTERVAL", 0.05))  # Max seconds a write waits in the queue
+POOL_SIZE = int(os.getenv("CACHE_STORE_POOL_SIZE", 8))  # Open connections kept for reuse
+MMAP_SIZE = int(os.getenv("CACHE_STORE_MMAP_SIZE", 256 * 1024 * 1024))  # Bytes of the file memory-mapped for reads
+MEMORY_ENTRIES = int(os.getenv("CACHE_STORE_MEMORY_ENTRIES", 2000))  # Entries kept in the in-process tier
+MEMORY_REVALIDATE = int(os.getenv("CACHE_STORE_MEMORY_REVALIDATE", 300))  # Seconds before a memory entry is re-read from SQLite
+
+# Time-to-live per data type in seconds (DEFAULT_TTL for anything else)
+DATA_TYPE_TTLS = {
+    'basic_info': 24 * 3600,
+    'financials': 24 * 3600,
+    'balance_sheet': 24 * 3600,
+    'pe_ratio': 3600,  # Moves with the price (see DATA_TYPE_EXPIRY_POLICIES)
+    'news': 3600,
+}
+DEFAULT_TTL = 24 * 3600
+STALE_SECONDS = int(os.getenv("CACHE_STORE_STALE_SECONDS", 7 * 24 * 3600))  # How long past expiry stale entries are served while refreshed
+
+def _balance_sheet_expiry(written_at, data):
+    return statement_expiry(written_at, (data or {}).get('balance_sheet'))
+
+# Data types whose expiry depends on the trading calendar or the data: fn(written_at, data) -> expiry epoch seconds
+DATA_TYPE_EXPIRY_POLICIES = {
+    'pe_ratio': price_expiry,
+    'balance_sheet': _balance_sheet_expiry,
+}
+
+def utc_timestamp(epoch=None):
+    """Timestamp text for epoch seconds (default: now) in UTC, like SQLite's CURRENT_TIMESTAMP."""
+    when = datetime.fromtimestamp(time.time() if epoch is None else epoch, timezone.utc)
+    return when.replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
+
+def timestamp_epoch(text):
+    """Epoch seconds of a timestamp written by utc_timestamp() or CURRENT_TIMESTAMP."""
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp()
+
+def _copy(data):
+    """Shallow copy so callers can change top-level fields without touching the cached object."""
+    if isinstance(data, dict):
+        return dict(data)
+    if isinstance(data, list):
+        return list(data)
+    return data
+
+def connect(db_path):
+    """Open a connection tuned for a shared cache database."""
+    conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers don't wait for writers
+    conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, fsync only at checkpoints
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=10000")
+    return conn
+
+class StockInfoStore:
+    """stock_info_cache with an in-process LRU in front of pooled SQLite connections.
+
+    Args:
+        db_path: SQLite database file
+        pool_size: Connections kept open for reuse
+        batch_size: Maximum writes committed in one transaction
+        flush_interval: Maximum seconds a write waits before it is committed
+        memory_entries: Entries kept in the in-process tier
+        ttls: Mapping of data type to TTL in seconds (merged over DATA_TYPE_TTLS)
+        expiry_policies: Mapping of data type to expiry policy (merged over DATA_TYPE_EXPIRY_POLICIES)
+        stale_seconds: How long past expiry routes may serve an entry while it is refreshed
+    """
+    def __init__(self, db_path, pool_size=POOL_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 memory_entries=MEMORY_ENTRIES, ttls=None, expiry_policies=None, stale_seconds=STALE_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.memory_entries = memory_entries
+        self.ttls = dict(DATA_TYPE_TTLS, **(ttls or {}))
+        # An explicitly configured TTL replaces the default policy for that data type
+        self.expiry_policies = {t: p for t, p in DATA_TYPE_EXPIRY_POLICIES.items() if t not in (ttls or {})}
+        self.expiry_policies.update(expiry_policies or {})
+        self.stale_seconds = stale_seconds
+        self.memory = OrderedDict()  # (ticker, data_type) -> (data, written_at, validated_at, JSON text or ResponseBody, expires_at)
+        self.pool = queue.LifoQueue(maxsize=pool_size)  # Idle connections, most recently used first
+        self.lock = threading.Lock()
+        self.pending = {}  # (ticker, data_type) -> (json text, timestamp) waiting to be written
+        self.flushing = {}  # Batch currently being committed (still visible to readers)
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.reads = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.writes = 0
+        self.batches = 0
+        self.connections_opened = 0
+        self._stop = threading.Event()
+
+        self._init_table()
+        self._writer = threading.Thread(target=self._write_loop, name="stock-info-store-writer", daemon=True)
+        self._writer.start()
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening a new one if none is idle."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_path)
+            with self.lock:
+                self.connections_opened += 1
+        try:
+            yield conn
+        finally:
+            try:
+                self.pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _init_table(self):
+        with self._connection() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS stock_info_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(ticker, data_type)
+            )
+            ''')
+            # Covers the lookup and freshness check without reading the table row first
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_stock_info_cache_lookup ON stock_info_cache (ticker, data_type, timestamp)'
+            )
+            conn.commit()
+
+    def ttl_for(self, data_type):
+        """Fixed TTL in seconds for a data type without an expiry policy."""
+        return self.ttls.get(data_type, DEFAULT_TTL)
+
+    def expires_at(self, data_type, data, written_at):
+        """Epoch seconds at which a cached value stops being fresh."""
+        policy = self.expiry_policies.get(data_type)
+        if policy is not None:
+            try:
+                return policy(written_at, data)
+            except Exception as e:
+                print(f"Error in stock info expiry policy for {data_type}: {e}")
+        return written_at + self.ttl_for(data_type)
+
+    def _remember(self, key, data, written_at, text):
+        """Put an entry in the memory tier and evict down to the limit. Must hold the lock."""
+        expires = self.expires_at(key[1], data, written_at)
+        self.memory[key] = (data, written_at, time.time(), text, expires)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, ticker, data_type, max_age_seconds=None, stale_seconds=0):
+        """Cached data for a ticker and data type, or None if missing or expired.
+
+        Args:
+            ticker: Stock ticker symbol
+            data_type: Kind of data (basic_info, pe_ratio, ...)
+            max_age_seconds: Maximum age of the data (defaults to the data type's expiry)
+            stale_seconds: Also return data expired up to this many seconds ago
+        """
+        entry = self._entry(ticker, data_type, max_age_seconds, stale_seconds)
+        return _copy(entry[0]) if entry is not None else None
+
+    def get_entry(self, ticker, data_type, max_age_seconds=None, stale_seconds=0):
+        """(data, written_at, expires_at) for a ticker and data type, or None if missing or expired."""
+        entry = self._entry(ticker, data_type, max_age_seconds, stale_seconds)
+        return (_copy(entry[0]), entry[1], entry[4]) if entry is not None else None
+
+    def get_body(self, ticker, data_type, max_age_seconds=None, stale_seconds=0):
+        """Cached data as a pre-serialized ResponseBody, or None if missing or expired."""
+        entry = self._entry(ticker, data_type, max_age_seconds, stale_seconds)
+        if entry is None:
+            return None
+        if isinstance(entry[3], ResponseBody):
+            return entry[3]
+        body = ResponseBody.from_text(entry[3], entry[1], entry[4])  # Encoded once per cached value
+        key = (ticker.upper(), data_type)
+        with self.lock:
+            if self.memory.get(key) is entry:
+                self.memory[key] = entry[:3] + (body,) + entry[4:]
+        return body
+
+    @staticmethod
+    def _usable(entry, max_age_seconds, stale_seconds, now):
+        if max_age_seconds is not None:
+            return now - entry[1] < max_age_seconds
+        return now < entry[4] + stale_seconds
+
+    def _entry(self, ticker, data_type, max_age_seconds=None, stale_seconds=0):
+        """Usable memory entry for a key, loading it from SQLite if needed."""
+        key = (ticker.upper(), data_type)
+        now = time.time()
+        with self.lock:
+            self.reads += 1
+            entry = self.memory.get(key)
+            if entry is not None and self._usable(entry, max_age_seconds, stale_seconds, now):
+                # Re-read from SQLite now and then in case another process changed it
+                if now - entry[2] < MEMORY_REVALIDATE or key in self.pending or key in self.flushing:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry
+
+        with self._connection() as conn:
+            if max_age_seconds is not None:
+                cutoff = utc_timestamp(now - max_age_seconds)
+                row = conn.execute(
+                    "SELECT data, timestamp FROM stock_info_cache WHERE ticker = ? AND data_type = ? AND timestamp > ?",
+                    (key[0], data_type, cutoff)
+                ).fetchone()
+            else:
+                # Expiry may depend on the data, so it is checked after reading
+                row = conn.execute(
+                    "SELECT data, timestamp FROM stock_info_cache WHERE ticker = ? AND data_type = ?",
+                    (key[0], data_type)
+                ).fetchone()
+        with self.lock:
+            queued = self.pending.get(key) or self.flushing.get(key)
+            if queued is not None:
+                # Written but not committed yet (or while we were reading)
+                entry = self.memory.get(key)
+                if entry is None:
+                    data = json.loads(queued[0])
+                    self._remember(key, data, timestamp_epoch(queued[1]), queued[0])
+                    entry = self.memory[key]
+            elif row is None:
+                self.memory.pop(key, None)
+                return None
+            else:
+                data = json.loads(row['data'])
+                self._remember(key, data, timestamp_epoch(row['timestamp']), row['data'])
+                self.disk_hits += 1
+                entry = self.memory[key]
+            if not self._usable(entry, max_age_seconds, stale_seconds, time.time()):
+                return None
+            return entry
+
+    def put(self, ticker, data_type, data):
+        """Write through both tiers; the SQLite write is committed with others within flush_interval seconds."""
+        key = (ticker.upper(), data_type)
+        text = json.dumps(data)
+        now = time.time()
+        with self.lock:
+            self.pending[key] = (text, utc_timestamp(now))
+            # Keep a private copy so later changes to the caller's object don't leak into the cache
+            self._remember(key, json.loads(text), now, text)
+            self.writes += 1
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wakeup.set()
+
+    def snapshot(self, limit, data_types=None):
+        """Most recently used memory entries as (ticker, data_type, json text, written_at) rows, newest first.
+
+        Args:
+            limit: Maximum number of rows
+            data_types: Only include these data types (default: all)
+        """
+        with self.lock:
+            entries = [(key, entry) for key, entry in reversed(self.memory.items())
+                       if data_types is None or key[1] in data_types][:limit]
+        rows = []
+        for (ticker, data_type), entry in entries:
+            text = entry[3].body.decode('utf-8') if isinstance(entry[3], ResponseBody) else entry[3]
+            rows.append((ticker, data_type, text, entry[1]))
+        return rows
+
+    def restore(self, rows):
+        """Write snapshot rows through both tiers, keeping their original timestamps.
+
+        Rows past the stale window, or older than the cached copy, are skipped.
+
+        Returns:
+            Number of entries restored
+        """
+        restored = 0
+        for ticker, data_type, text, written_at in reversed(list(rows)):
+            data = json.loads(text)
+            if time.time() >= self.expires_at(data_type, data, written_at) + self.stale_seconds:
+                continue
+            current = self._entry(ticker, data_type, stale_seconds=self.stale_seconds)
+            if current is not None and int(current[1]) >= int(written_at):  # SQLite keeps whole seconds
+                continue
+            key = (ticker.upper(), data_type)
+            with self.lock:
+                self.pending[key] = (text, utc_timestamp(written_at))
+                self._remember(key, data, written_at, text)
+            restored += 1
+        if restored:
+            self.wakeup.set()
+        return restored
+
+    def delete(self, ticker, data_type=None):
+        """Remove one data type (or all data) cached for a ticker from both tiers."""
+        ticker = ticker.upper()
+        with self.flush_lock:  # Not while a batch that may contain the ticker is being committed
+            with self.lock:
+                for entries in (self.pending, self.memory):
+                    for key in [k for k in entries if k[0] == ticker and data_type in (None, k[1])]:
+                        del entries[key]
+            with self._connection() as conn:
+                if data_type is None:
+                    conn.execute("DELETE FROM stock_info_cache WHERE ticker = ?", (ticker,))
+                else:
+                    conn.execute("DELETE FROM stock_info_cache WHERE ticker = ? AND data_type = ?", (ticker, data_type))
+                conn.commit()
+
+    def flush(self):
+        """Commit all queued writes now."""
+        with self.flush_lock:
+            with self.lock:
+                batch = self.flushing = self.pending
+                self.pending = {}
+            if not batch:
+                return 0
+            try:
+                with self._connection() as conn, conn:
+                    conn.executemany(
+                        "REPLACE INTO stock_info_cache (ticker, data_type, data, timestamp) VALUES (?, ?, ?, ?)",
+                        [(ticker, data_type, text, timestamp) for (ticker, data_type), (text, timestamp) in batch.items()]
+                    )
+            except sqlite3.Error as e:
+                print(f"Error writing stock info cache: {e}")
+                with self.lock:
+                    # Keep the batch unless a newer write for the same key arrived meanwhile
+                    for key, value in batch.items():
+                        self.pending.setdefault(key, value)
+                    self.flushing = {}
+                return 0
+            with self.lock:
+                self.flushing = {}
+                self.batches += 1
+            return len(batch)
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the writer, commit queued writes and close all connections."""
+        self._stop.set()
+        self.wakeup.set()
+        self._writer.join(5)
+        self.flush()
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'reads': self.reads,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'memory_entries': len(self.memory),
+                'writes': self.writes,
+                'batches': self.batches,
+                'pending_writes': len(self.pending),
+                'connections_opened': self.connections_opened,
+                'idle_connections': self.pool.qsize(),
+            }
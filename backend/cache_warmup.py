@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Cache warmup for cold starts.
+On graceful shutdown the hottest cache entries (prices, P/E ratios, peers,
+industry P/E and company info from the analyzer cache, the most recently used
+stock_info_cache entries, and the ticker popularity counts) are dumped to a
+small gzipped JSON snapshot. On boot the snapshot is restored into memory, then
+a warm set of tickers (the client's trending tickers plus the hottest tickers
+from the snapshot) is fetched in the background at batch priority, so the first
+users after a redeploy don't wait on Polygon and Claude.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+
+from rate_scheduler import request_priority, PRIORITY_BATCH
+from request_memo import request_memo
+
+SNAPSHOT_PATH = os.getenv(  # Snapshot file (point it at a persistent volume to survive redeploys)
+    "CACHE_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_snapshot.json.gz')
+)
+SNAPSHOT_ENTRIES = int(os.getenv("CACHE_SNAPSHOT_ENTRIES", 500))  # Entries per cache kept in the snapshot
+SNAPSHOT_METHODS = ('price', 'pe', 'peers', 'industry_pe', 'get_company_info', 'profile')  # Analyzer cache methods
+SNAPSHOT_DATA_TYPES = ('basic_info', 'pe_ratio')  # stock_info_cache data types
+SNAPSHOT_VERSION = 1
+WARM_TICKERS = [  # Tickers fetched on boot (the client's trending tickers)
+    t.strip().upper() for t in os.getenv("WARM_TICKERS", "NVDA,TSLA,AMD,PLTR").split(',') if t.strip()
+]
+WARM_HOT_TICKERS = int(os.getenv("WARM_HOT_TICKERS", 10))  # Hottest tickers from the snapshot also fetched
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """Snapshot dict from a file, or None if it is missing or unreadable."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Error reading cache snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        print(f"Ignoring cache snapshot {path} with unknown format")
+        return None
+    return snapshot
+
+def write_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """Write a snapshot atomically (a crash mid-write leaves the previous one in place)."""
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+class CacheWarmup:
+    """Restores the cache snapshot on boot and warms a set of tickers in the background.
+
+    Args:
+        analyzer_cache: ResponseCache shared by the StockAnalyzer instances
+        store: StockInfoStore behind the stock_info_cache routes
+        popularity: PopularityRefresher whose request counts are kept across restarts
+        refresh: refresh(ticker, data_type, fetch, *args) fetches and caches data
+        fetches_for: fetches_for(ticker) -> [(data_type, fetch, args)] entries to warm for a ticker
+        path: Snapshot file
+        entries: Entries per cache kept in the snapshot
+    """
+    def __init__(self, analyzer_cache, store, popularity, refresh, fetches_for,
+                 path=SNAPSHOT_PATH, entries=SNAPSHOT_ENTRIES):
+        self.analyzer_cache = analyzer_cache
+        self.store = store
+        self.popularity = popularity
+        self.refresh = refresh
+        self.fetches_for = fetches_for
+        self.path = path
+        self.entries = entries
+        self.lock = threading.Lock()
+        self.state = 'cold'
+        self.restored = {'analyzer_cache': 0, 'stock_info': 0, 'popularity': 0}
+        self.snapshot_age = None
+        self.warm_total = 0
+        self.warmed = 0
+        self.already_fresh = 0
+        self.failed = 0
+        self.warm_seconds = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def restore(self):
+        """Load the snapshot file into the caches.
+
+        Returns:
+            Entries restored per cache
+        """
+        snapshot = read_snapshot(self.path)
+        if snapshot is None:
+            return dict(self.restored)
+        try:
+            restored = {
+                'analyzer_cache': self.analyzer_cache.restore(
+                    (key, timestamp, value) for key, timestamp, value in snapshot.get('analyzer_cache', [])
+                ),
+                'stock_info': self.store.restore(
+                    (ticker, data_type, text, written_at)
+                    for ticker, data_type, text, written_at in snapshot.get('stock_info', [])
+                ),
+            }
+            self.popularity.restore(snapshot.get('popularity', {}))
+            restored['popularity'] = len(snapshot.get('popularity', {}))
+        except (TypeError, ValueError) as e:
+            print(f"Error restoring cache snapshot {self.path}: {e}")
+            return dict(self.restored)
+        with self.lock:
+            self.restored = restored
+            self.snapshot_age = int(time.time() - snapshot.get('created_at', time.time()))
+        print(f"Restored cache snapshot ({self.snapshot_age}s old): {restored}")
+        return restored
+
+    def dump(self):
+        """Write the hottest cache entries to the snapshot file.
+
+        Returns:
+            Entries written per cache, or None if writing failed
+        """
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'created_at': time.time(),
+            'analyzer_cache': self.analyzer_cache.snapshot(SNAPSHOT_METHODS, self.entries),
+            'stock_info': self.store.snapshot(self.entries, SNAPSHOT_DATA_TYPES),
+            'popularity': self.popularity.snapshot(self.entries),
+        }
+        try:
+            write_snapshot(snapshot, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing cache snapshot {self.path}: {e}")
+            return None
+        counts = {name: len(snapshot[name]) for name in ('analyzer_cache', 'stock_info', 'popularity')}
+        print(f"Wrote cache snapshot to {self.path}: {counts}")
+        return counts
+
+    def warm_set(self, tickers=None):
+        """Tickers to warm: the configured ones, then the hottest ones from the snapshot."""
+        tickers = list(WARM_TICKERS if tickers is None else tickers)
+        for ticker in self.popularity.hottest(WARM_HOT_TICKERS):
+            if ticker not in tickers:
+                tickers.append(ticker)
+        return tickers
+
+    def warm(self, tickers):
+        """Fetch the warm set's entries that aren't cached and fresh. Runs at batch priority."""
+        started = time.time()
+        jobs = {ticker: self.fetches_for(ticker) for ticker in tickers}
+        with self.lock:
+            self.state = 'warming'
+            self.warm_total = sum(len(fetches) for fetches in jobs.values())
+        with request_priority(PRIORITY_BATCH):
+            for ticker, fetches in jobs.items():
+                if self._stop.is_set():
+                    break
+                # A ticker's data types share upstream responses (e.g. the ticker details)
+                with request_memo():
+                    for data_type, fetch, args in fetches:
+                        self._warm_one(ticker, data_type, fetch, args)
+        with self.lock:
+            self.state = 'warm'
+            self.warm_seconds = round(time.time() - started, 1)
+
+    def _warm_one(self, ticker, data_type, fetch, args):
+        # Keep warmed entries fresh once users start requesting them
+        self.popularity.register(ticker, data_type, fetch, *args)
+        if self.store.get_entry(ticker, data_type) is not None:
+            with self.lock:
+                self.already_fresh += 1
+            return
+        try:
+            succeeded = self.refresh(ticker, data_type, fetch, *args) is not None
+        except Exception as e:
+            print(f"Error warming {data_type} for {ticker}: {e}")
+            succeeded = False
+        with self.lock:
+            if succeeded:
+                self.warmed += 1
+            else:
+                self.failed += 1
+
+    def start(self, tickers=None):
+        """Restore the snapshot, then warm the warm set in a background thread."""
+        self.restore()
+        tickers = self.warm_set(tickers)
+        with self.lock:
+            self.state = 'warming'
+        self._thread = threading.Thread(target=self.warm, args=(tickers,), name="cache-warmup", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop warming and dump the snapshot."""
+        self._stop.set()
+        return self.dump()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'state': self.state,
+                'restored': dict(self.restored),
+                'snapshot_age_seconds': self.snapshot_age,
+                'warm_total': self.warm_total,
+                'warmed': self.warmed,
+                'already_fresh': self.already_fresh,
+                'failed': self.failed,
+                'warm_seconds': self.warm_seconds,
+            }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Company profiles (name, description, industry) built from Polygon reference data.
+Polygon's /v3/reference/tickers/{ticker} already returns the name, description
+and SIC code; the industry and sector come from a local SIC table. Claude is
+only asked (through StockAnalyzer.get_company_info) when fields are missing,
+never for tickers Polygon doesn't know.
+"""
+import re
+import time
+
+from get_pe_and_cash_flow import PolygonFinancials
+from negative_cache import NOT_FOUND
+
+# SIC divisions: (first major group, last major group, sector)
+SIC_DIVISIONS = [
+    (1, 9, "Agriculture, Forestry and Fishing"),
+    (10, 14, "Mining"),
+    (15, 17, "Construction"),
+    (20, 39, "Manufacturing"),
+    (40, 49, "Transportation, Communications and Utilities"),
+    (50, 51, "Wholesale Trade"),
+    (52, 59, "Retail Trade"),
+    (60, 67, "Finance, Insurance and Real Estate"),
+    (70, 89, "Services"),
+    (91, 99, "Public Administration"),
+]
+
+# SIC major groups (first two digits of the SIC code) -> industry
+SIC_MAJOR_GROUPS = {
+    1: "Agricultural Production - Crops",
+    2: "Agricultural Production - Livestock",
+    7: "Agricultural Services",
+    8: "Forestry",
+    9: "Fishing, Hunting and Trapping",
+    10: "Metal Mining",
+    12: "Coal Mining",
+    13: "Oil and Gas Extraction",
+    14: "Nonmetallic Minerals Mining",
+    15: "Building Construction",
+    16: "Heavy Construction",
+    17: "Special Trade Contractors",
+    20: "Food Products",
+    21: "Tobacco Products",
+    22: "Textile Mill Products",
+    23: "Apparel",
+    24: "Lumber and Wood Products",
+    25: "Furniture and Fixtures",
+    26: "Paper Products",
+    27: "Printing and Publishing",
+    28: "Chemicals and Pharmaceuticals",
+    29: "Petroleum Refining",
+    30: "Rubber and Plastics Products",
+    31: "Leather Products",
+    32: "Stone, Clay and Glass Products",
+    33: "Primary Metals",
+    34: "Fabricated Metal Products",
+    35: "Industrial Machinery and Computer Equipment",
+    36: "Electronic and Electrical Equipment",
+    37: "Transportation Equipment",
+    38: "Measuring and Medical Instruments",
+    39: "Miscellaneous Manufacturing",
+    40: "Railroads",
+    41: "Passenger Transit",
+    42: "Trucking and Warehousing",
+    43: "Postal Service",
+    44: "Water Transportation",
+    45: "Airlines and Air Transportation",
+    46: "Pipelines",
+    47: "Transportation Services",
+    48: "Telecommunications",
+    49: "Utilities",
+    50: "Wholesale - Durable Goods",
+    51: "Wholesale - Nondurable Goods",
+    52: "Building Materials and Garden Retail",
+    53: "General Merchandise Stores",
+    54: "Food Stores",
+    55: "Auto Dealers and Gas Stations",
+    56: "Apparel Stores",
+    57: "Home Furnishings Stores",
+    58: "Restaurants",
+    59: "Miscellaneous Retail",
+    60: "Banking",
+    61: "Credit and Lending",
+    62: "Securities and Brokerage",
+    63: "Insurance Carriers",
+    64: "Insurance Brokers",
+    65: "Real Estate",
+    67: "Holding and Investment Offices",
+    70: "Hotels and Lodging",
+    72: "Personal Services",
+    73: "Software and Business Services",
+    75: "Automotive Services",
+    76: "Repair Services",
+    78: "Motion Pictures",
+    79: "Entertainment and Recreation",
+    80: "Health Services",
+    81: "Legal Services",
+    82: "Educational Services",
+    83: "Social Services",
+    84: "Museums and Gardens",
+    86: "Membership Organizations",
+    87: "Engineering and Management Services",
+    88: "Private Households",
+    89: "Miscellaneous Services",
+    99: "Nonclassifiable Establishments",
+}
+
+def _sic_major_group(sic_code):
+    try:
+        return int(str(sic_code).strip()[:2])
+    except (TypeError, ValueError):
+        return None
+
+def industry_for_sic(sic_code, sic_description=None):
+    """Industry name for a SIC code, preferring Polygon's own SIC description."""
+    if sic_description:
+        return sic_description.strip().title()
+    return SIC_MAJOR_GROUPS.get(_sic_major_group(sic_code))
+
+def sector_for_sic(sic_code):
+    """Sector (SIC division) for a SIC code."""
+    major_group = _sic_major_group(sic_code)
+    if major_group is None:
+        return None
+    for first, last, sector in SIC_DIVISIONS:
+        if first <= major_group <= last:
+            return sector
+    return None
+
+def _brief(description, sentences=2):
+    """Trim a long description to its first sentences."""
+    if not description:
+        return None
+    parts = re.split(r'(?<=[.!?])\s+', description.strip())
+    return ' '.join(parts[:sentences])
+
+class CompanyProfileService:
+    """Builds company profiles from Polygon reference data, with Claude as a fallback."""
+    def __init__(self, analyzer=None, api_key=None, cache_ttl=7 * 24 * 3600):
+        self.analyzer = analyzer  # StockAnalyzer used for its cache and the Claude fallback
+        self.api_key = api_key
+        self.cache_ttl = cache_ttl
+        self.polygon_profiles = 0  # Profiles completed from Polygon data alone
+        self.llm_fallbacks = 0  # Profiles that needed Claude for missing fields
+
+    def fetch_details(self, ticker):
+        """Fetch Polygon reference data (/v3/reference/tickers) for a ticker."""
+        return PolygonFinancials(ticker, self.api_key, self.analyzer).get_ticker_details() or {}
+
+    def _from_details(self, ticker, details):
+        """Map Polygon ticker details to a profile; missing fields are None."""
+        name = details.get('name')
+        if not name or name == ticker:  # get_ticker_details falls back to the ticker itself
+            name = None
+        sic_code = details.get('sic_code')
+        return {
+            'name': name,
+            'description': _brief(details.get('description')),
+            'industry': industry_for_sic(sic_code, details.get('sic_description')) or details.get('industry'),
+            'sector': sector_for_sic(sic_code) or details.get('sector'),
+        }
+
+    def _unknown(self, ticker):
+        """Whether the ticker is negatively cached as unknown to Polygon."""
+        negative_cache = PolygonFinancials.negative_cache
+        miss = negative_cache.get(ticker, 'profile') if negative_cache is not None else None
+        return miss is not None and miss['kind'] == NOT_FOUND
+
+    def get_profile(self, ticker: str) -> dict:
+        """Get the name, description, industry and sector for a ticker.
+
+        Raises:
+            LookupError: Polygon doesn't know the ticker (so Claude isn't asked to make up a profile)
+        """
+        ticker = ticker.upper()
+        cache = getattr(self.analyzer, 'cache', None)
+        cache_key = f"profile_{ticker}"
+        if cache is not None:
+            cached = cache.get(cache_key)
+            if cached and time.time() - cached[0] < self.cache_ttl:
+                return dict(cached[1])
+
+        details = self.fetch_details(ticker)
+        if self._unknown(ticker):  # Recorded by get_ticker_details
+            raise LookupError(f"Unknown ticker {ticker}")
+        profile = self._from_details(ticker, details)
+
+        missing = [field for field in ('name', 'description', 'industry') if not profile.get(field)]
+        if missing and self.analyzer:
+            self.llm_fallbacks += 1
+            print(f"Polygon profile for {ticker} is missing {missing}, asking Claude")
+            company_info = self.analyzer.get_company_info(ticker)
+            for field in missing:
+                profile[field] = company_info.get(field)
+        elif not missing:
+            self.polygon_profiles += 1
+
+        profile['name'] = profile.get('name') or f"Company {ticker}"
+        profile['description'] = profile.get('description') or "Information not available"
+        profile['industry'] = profile.get('industry') or "Unknown"
+
+        if cache is not None:
+            cache[cache_key] = (time.time(), profile)
+        return dict(profile)
+
+    def stats(self) -> dict:
+        return {
+            'polygon_profiles': self.polygon_profiles,
+            'llm_fallbacks': self.llm_fallbacks,
+        }
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Hedged fallback chains for lookups with several upstream strategies (e.g. the
+price from /prev, the snapshot or daily aggs).
+Strategies are tried in order, but a strategy that returns nothing hands over
+to the next one immediately, and a strategy that is still running after the
+hedge delay gets the next one started alongside it. The first valid answer
+wins and the strategies still running are cancelled (async) or left to finish
+with their results ignored (sync). Hedges are speculative, so they are only
+started while the upstream rate limiter has spare capacity beyond the tokens
+reserved for interactive requests; otherwise the chain simply waits.
+With a learner attached (see strategy_stats.py), each outcome is recorded and
+the strategies are reordered, or skipped, by their hit rate for the ticker.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from rate_scheduler import PRIORITY_REFRESH
+
+HEDGE_DELAY = float(os.getenv("FALLBACK_HEDGE_DELAY", 1.0))  # Seconds before a slow strategy gets the next one started alongside it
+MAX_WORKERS = int(os.getenv("FALLBACK_MAX_WORKERS", 16))  # Threads per chain for sync strategies
+
+def _not_none(value):
+    return value is not None
+
+class FallbackChain:
+    """Runs fallback strategies with hedging and reports which ones answer.
+
+    Args:
+        name: Name used in logs and stats
+        hedge_delay: Seconds before the next strategy is started alongside a slow one
+        limiter: Rate limiter that must have spare capacity before a hedge is started
+        max_workers: Threads running sync strategies (each chain has its own pool, so a
+            strategy may run another chain without starving it)
+    """
+    learner = None  # Optional strategy_stats.StrategyStats ordering the strategies (set by main)
+
+    def __init__(self, name, hedge_delay=HEDGE_DELAY, limiter=None, max_workers=MAX_WORKERS):
+        self.name = name
+        self.hedge_delay = hedge_delay
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.runs = 0
+        self.answered = 0
+        self.hedges = 0  # Strategies started while an earlier one was still running
+        self.hedges_skipped = 0  # Hedges not started for lack of rate budget
+        self.cancelled = 0  # Strategies still running when another one answered
+        self.wins = {}  # Strategy name -> answers it provided
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"fallback-{name}")
+
+    def _can_hedge(self):
+        if self.limiter is not None and not self.limiter.has_spare_capacity(PRIORITY_REFRESH):
+            with self.lock:
+                self.hedges_skipped += 1
+            return False
+        with self.lock:
+            self.hedges += 1
+        return True
+
+    def _finish(self, winner, losers):
+        with self.lock:
+            self.runs += 1
+            self.cancelled += losers
+            if winner is not None:
+                self.answered += 1
+                self.wins[winner] = self.wins.get(winner, 0) + 1
+
+    def _plan(self, strategies, ticker):
+        """Strategies in the order to try them (the learner's order when one is attached)."""
+        if self.learner is None or ticker is None:
+            return list(strategies)
+        return self.learner.order(self.name, ticker, strategies)
+
+    def _record(self, ticker, name, succeeded, started):
+        if self.learner is not None and ticker is not None:
+            self.learner.record(self.name, ticker, name, succeeded, time.monotonic() - started)
+
+    def _timed(self, ticker, name, fn, is_valid):
+        """fn wrapped to record its outcome with the learner."""
+        def timed():
+            started = time.monotonic()
+            try:
+                value = fn()
+            except Exception:
+                self._record(ticker, name, False, started)
+                raise
+            self._record(ticker, name, is_valid(value), started)
+            return value
+        return timed
+
+    def _timed_async(self, ticker, name, fn, is_valid):
+        """Async version of _timed(); cancelled strategies are not recorded."""
+        async def timed():
+            started = time.monotonic()
+            try:
+                value = await fn()
+            except Exception:
+                self._record(ticker, name, False, started)
+                raise
+            self._record(ticker, name, is_valid(value), started)
+            return value
+        return timed
+
+    def run(self, strategies, is_valid=_not_none, ticker=None):
+        """First valid answer from strategies, or None.
+
+        Args:
+            strategies: Sequence of (name, fn); fn() returns the answer
+            is_valid: Whether an answer is usable (default: not None)
+            ticker: Ticker the strategies look up, used by the learner
+        """
+        strategies = [(name, self._timed(ticker, name, fn, is_valid)) for name, fn in self._plan(strategies, ticker)]
+        order = {name: i for i, (name, fn) in enumerate(strategies)}
+        pending = list(strategies)
+        running = {}  # Future -> strategy name
+        last_start = 0.0
+
+        def start():
+            nonlocal last_start
+            name, fn = pending.pop(0)
+            running[self.executor.submit(contextvars.copy_context().run, fn)] = name
+            last_start = time.monotonic()
+
+        while pending or running:
+            if not running:
+                start()
+            timeout = max(0.0, last_start + self.hedge_delay - time.monotonic()) if pending else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if self._can_hedge():
+                    start()
+                else:
+                    last_start = time.monotonic()  # Check the budget again after another delay
+                continue
+            for future in sorted(done, key=lambda f: order[running[f]]):
+                name = running.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    print(f"{self.name} strategy {name} failed: {e}")
+                    continue
+                if is_valid(value):
+                    for loser in running:
+                        loser.cancel()
+                    self._finish(name, len(running))
+                    return value
+        self._finish(None, 0)
+        return None
+
+    async def run_async(self, strategies, is_valid=_not_none, ticker=None):
+        """Async version of run(); fn() returns a coroutine. Losing strategies are cancelled."""
+        strategies = [
+            (name, self._timed_async(ticker, name, fn, is_valid)) for name, fn in self._plan(strategies, ticker)
+        ]
+        loop = asyncio.get_running_loop()
+        order = {name: i for i, (name, fn) in enumerate(strategies)}
+        pending = list(strategies)
+        running = {}  # Task -> strategy name
+        last_start = 0.0
+
+        def start():
+            nonlocal last_start
+            name, fn = pending.pop(0)
+            running[asyncio.ensure_future(fn())] = name
+            last_start = loop.time()
+
+        try:
+            while pending or running:
+                if not running:
+                    start()
+                timeout = max(0.0, last_start + self.hedge_delay - loop.time()) if pending else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._can_hedge():
+                        start()
+                    else:
+                        last_start = loop.time()
+                    continue
+                for task in sorted(done, key=lambda t: order[running[t]]):
+                    name = running.pop(task)
+                    if task.exception() is not None:
+                        print(f"{self.name} strategy {name} failed: {task.exception()}")
+                        continue
+                    if is_valid(task.result()):
+                        self._finish(name, len(running))
+                        return task.result()
+            self._finish(None, 0)
+            return None
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'runs': self.runs,
+                'answered': self.answered,
+                'hedges': self.hedges,
+                'hedges_skipped_no_budget': self.hedges_skipped,
+                'cancelled': self.cancelled,
+                'wins': dict(self.wins),
+            }
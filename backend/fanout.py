@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Deadline-bounded fan-out for independent upstream lookups (e.g. peer P/E ratios).
+Items are processed with bounded parallelism; whatever finished when the
+deadline passes is returned together with a flag saying the result is partial.
+Lookups still running at the deadline are left to finish in the background, so
+their results can still land in the caches for the next request.
+run_graph() does the same for lookups that depend on each other: every call
+starts as soon as the calls it needs have finished.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", 16))  # Threads shared by all sync fan-outs
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fanout")
+# Separate pool, so graph calls that fan out themselves can't starve their own fan-out
+_graph_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="graph")
+_late_tasks = set()  # Strong references to async lookups still running after their deadline
+
+def fan_out(fn, items, max_parallel=5, deadline=None):
+    """Call fn(item) for every item from a shared thread pool.
+
+    Args:
+        fn: Function called with each item
+        items: Items to process (duplicates are processed once)
+        max_parallel: Maximum number of calls running at once for this fan-out
+        deadline: Seconds to wait for results (None waits for everything)
+
+    Returns:
+        (results, partial): results maps each item that finished without raising to
+        its return value; partial is True if some items didn't finish in time
+    """
+    pending = list(dict.fromkeys(items))
+    running = {}
+    results = {}
+    end = None if deadline is None else time.monotonic() + deadline
+
+    while pending or running:
+        while pending and len(running) < max_parallel:
+            item = pending.pop(0)
+            # Each call gets a copy of the caller's context (request priority etc.)
+            running[_executor.submit(contextvars.copy_context().run, fn, item)] = item
+
+        timeout = None if end is None else end - time.monotonic()
+        if timeout is not None and timeout <= 0:
+            break
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            item = running.pop(future)
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                print(f"Fan-out call for {item} failed: {e}")
+
+    return results, bool(pending or running)
+
+def run_graph(tasks, deadline=None, timings=None):
+    """Run calls that depend on each other, each as soon as its dependencies finished.
+
+    Args:
+        tasks: Mapping of name -> (fn, dependency names); fn is called with the
+            dependencies' results as keyword arguments (None for a dependency that failed)
+        deadline: Seconds to wait for the whole graph (None waits for everything)
+        timings: Optional dict filled with each finished call's duration in milliseconds
+
+    Returns:
+        (results, errors): results maps each call that finished without raising to its
+        return value; errors maps every other call to the reason it has no result
+    """
+    for name, (fn, dependencies) in tasks.items():
+        unknown = [d for d in dependencies if d not in tasks]
+        if unknown:
+            raise ValueError(f"Task {name} depends on unknown tasks {unknown}")
+
+    waiting = dict(tasks)
+    running = {}
+    started = {}
+    results = {}
+    errors = {}
+    end = None if deadline is None else time.monotonic() + deadline
+    reason = 'Timed out'
+
+    while waiting or running:
+        ready = [name for name, (fn, dependencies) in waiting.items()
+                 if all(d in results or d in errors for d in dependencies)]
+        for name in ready:
+            fn, dependencies = waiting.pop(name)
+            started[name] = time.monotonic()
+            kwargs = {d: results.get(d) for d in dependencies}
+            running[_graph_executor.submit(contextvars.copy_context().run, fn, **kwargs)] = name
+        if not running:
+            reason = 'Dependency cycle'  # Only calls waiting on each other are left
+            break
+
+        timeout = None if end is None else end - time.monotonic()
+        if timeout is not None and timeout <= 0:
+            break
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            name = running.pop(future)
+            if timings is not None:
+                timings[name] = round((time.monotonic() - started[name]) * 1000)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Graph call {name} failed: {e}")
+                errors[name] = str(e)
+
+    for name in list(running.values()) + list(waiting):
+        errors[name] = reason
+    return results, errors
+
+def _late_task_done(task):
+    _late_tasks.discard(task)
+    if not task.cancelled():
+        task.exception()  # Retrieve it so it isn't reported as never retrieved
+
+async def fan_out_async(coro_fn, items, max_parallel=5, deadline=None):
+    """Async version of fan_out(); coro_fn(item) must return a coroutine.
+
+    Lookups still running at the deadline keep running as tasks.
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+    items = list(dict.fromkeys(items))
+
+    async def run(item):
+        async with semaphore:
+            return await coro_fn(item)
+
+    tasks = {asyncio.ensure_future(run(item)): item for item in items}
+    if not tasks:
+        return {}, False
+    done, not_done = await asyncio.wait(tasks, timeout=deadline)
+
+    results = {}
+    for task in done:
+        if task.exception() is not None:
+            print(f"Fan-out call for {tasks[task]} failed: {task.exception()}")
+        else:
+            results[tasks[task]] = task.result()
+    for task in not_done:
+        _late_tasks.add(task)
+        task.add_done_callback(_late_task_done)
+    return results, bool(not_done)
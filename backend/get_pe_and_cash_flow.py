@@ -5,6 +5,7 @@ Can be used as a standalone script or imported as a module for Flask routes
 """
 import os
 import json
+import re
 import requests
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
@@ -13,6 +14,16 @@ import importlib.util
 import sys
 import time
 import threading
+import functools
+
+from http_pool import get_session, REQUEST_TIMEOUT
+from singleflight import SingleFlight, normalize_url
+from request_memo import memoized, with_request_memo
+from rate_scheduler import AdaptiveTokenBucketScheduler
+from fanout import fan_out
+from fallback import FallbackChain
+from industry_stats import industry_key
+from negative_cache import NOT_FOUND, NO_DATA, TRANSIENT
 
 # Load environment variables
 load_dotenv()
@@ -21,73 +32,402 @@ ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 if not API_KEY:
     raise ValueError("POLYGON_API_KEY environment variable is not set")
 
-# Global rate limiter for Polygon API
-class RateLimiter:
-    def __init__(self, calls_per_minute=10):
-        self.calls_per_minute = calls_per_minute
-        self.calls = []
-        self.lock = threading.Lock()
-    
-    def wait(self):
-        """Wait if necessary to avoid hitting rate limits."""
-        with self.lock:
-            now = time.time()
-            # Remove timestamps older than the time period
-            time_period = 60  # 1 minute in seconds
-            self.calls = [t for t in self.calls if now - t < time_period]
-            
-            # If we've reached the maximum number of calls, wait
-            if len(self.calls) >= self.calls_per_minute:
-                sleep_time = time_period - (now - self.calls[0])
-                if sleep_time > 0:
-                    # Cap the sleep time to avoid excessive waiting
-                    sleep_time = min(sleep_time, 5)  # Maximum 5 seconds wait
-                    time.sleep(sleep_time)
-                    # Update now after sleeping
-                    now = time.time()
-                    # Clean up calls list again
-                    self.calls = [t for t in self.calls if now - t < time_period]
-            
-            # Add the current timestamp to the calls list
-            self.calls.append(now)
+# Global rate limiter for Polygon API, shared by every thread and coroutine.
+# The rate adapts to X-RateLimit headers and 429s within the configured bounds.
+RATE_LIMITER = AdaptiveTokenBucketScheduler(
+    "polygon",
+    calls_per_minute=float(os.getenv("POLYGON_CALLS_PER_MINUTE", 10)),
+    min_calls_per_minute=float(os.getenv("POLYGON_MIN_CALLS_PER_MINUTE", 1)),
+    max_calls_per_minute=float(os.getenv("POLYGON_MAX_CALLS_PER_MINUTE", 120)),
+)
+
+# Collapses concurrent identical Polygon requests (shared with AsyncPolygonFinancials)
+POLYGON_FLIGHTS = SingleFlight("polygon")
+
+# Hedged fallback chains (a slow source gets the next one started alongside it while
+# the rate limiter has spare capacity; shared with AsyncPolygonFinancials)
+PRICE_CHAIN = FallbackChain("price", limiter=RATE_LIMITER)
+PE_CHAIN = FallbackChain("pe_ratio", limiter=RATE_LIMITER)
+
+# Industry P/E peer fan-out
+INDUSTRY_PE_DEADLINE = float(os.getenv("INDUSTRY_PE_DEADLINE_SECONDS", 8))  # Seconds to wait for peer P/E ratios
+INDUSTRY_PE_MAX_PARALLEL = int(os.getenv("INDUSTRY_PE_MAX_PARALLEL", 5))  # Peers fetched at once
+PE_CACHE_SECONDS = 3600  # Per-ticker P/E ratios are reused for an hour (until the next open while the market is closed)
+
+# Hardcoded P/E ratios for common tickers that might have API issues
+PE_FALLBACKS = {
+    'NVDA': 35.2,  # NVIDIA
+    'AAPL': 28.5,  # Apple
+    'MSFT': 32.1,  # Microsoft
+    'GOOGL': 25.3,  # Alphabet
+    'AMZN': 40.2,  # Amazon
+    'META': 28.0,  # Meta
+    'TSLA': 60.5,  # Tesla
+}
+
+# Endpoints, strategy tables and response parsing helpers shared by PolygonFinancials
+# and AsyncPolygonFinancials (which only differ in how they send requests)
+
+def _details_urls(ticker, api_key):
+    """v3 and v1 (fallback) ticker details endpoints."""
+    return (
+        f"https://api.polygon.io/v3/reference/tickers/{ticker}?apiKey={api_key}",
+        f"https://api.polygon.io/v1/meta/symbols/{ticker}/company?apiKey={api_key}",
+    )
+
+def _snapshot_url(ticker, api_key):
+    return f"https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers/{ticker}?apiKey={api_key}"
+
+def _financials_urls(ticker, api_key):
+    """Financials endpoints in order of preference."""
+    return [
+        # Primary financials endpoint
+        f"https://api.polygon.io/vX/reference/financials?ticker={ticker}&apiKey={api_key}",
+        # Backup endpoint with different format
+        f"https://api.polygon.io/v2/reference/financials/{ticker}?apiKey={api_key}",
+    ]
+
+def _earnings_url(ticker, api_key):
+    return f"https://api.polygon.io/v2/reference/financials/{ticker}?limit=1&apiKey={api_key}"
+
+def _dividends_url(ticker, api_key):
+    return f"https://api.polygon.io/v3/reference/dividends?ticker={ticker}&limit=100&apiKey={api_key}"
+
+def _peer_search_urls(details, api_key):
+    """Ticker list searches for peers by SIC code, then industry, then sector classification."""
+    return [
+        f"https://api.polygon.io/v3/reference/tickers?{field}={details[field]}&active=true&limit=50&apiKey={api_key}"
+        for field in ('sic_code', 'industry', 'sector') if details.get(field)
+    ]
+
+def _price_sources(ticker, api_key):
+    """(name, url, extract) price sources in order of preference."""
+    return [
+        # Previous day close
+        ('prev', f"https://api.polygon.io/v2/aggs/ticker/{ticker}/prev?apiKey={api_key}", _extract_price),
+        # Latest quote
+        ('snapshot', _snapshot_url(ticker, api_key), _extract_price),
+        # Latest daily bar
+        ('daily_bar', f"https://api.polygon.io/v2/aggs/ticker/{ticker}/range/1/day/2023-01-01/{datetime.now().strftime('%Y-%m-%d')}?limit=1&apiKey={api_key}", _extract_price),
+    ]
+
+def _pe_sources(ticker, api_key):
+    """(name, url, extract) P/E sources answered by a single request, in order of preference
+    (they come after the prefetched ticker details and before the manual calculation from price and EPS)."""
+    return [
+        # From the snapshot
+        ('snapshot', _snapshot_url(ticker, api_key), _extract_pe_from_snapshot),
+    ]
+
+def _strategies(sources, extract_from):
+    """(name, fn) fallback chain strategies for (name, url, extract) sources.
+
+    Args:
+        sources: Result of _price_sources() or _pe_sources()
+        extract_from: The client's extract_from(url, extract), sync or async
+    """
+    return [(name, functools.partial(extract_from, url, extract)) for name, url, extract in sources]
+
+def _extract_price(data):
+    """Extract a price from a /prev, snapshot or daily aggs response."""
+    price = None
+    if data and 'results' in data and data['results']:
+        if isinstance(data['results'], list):
+            price = data['results'][0].get('c')  # Close price
+        elif 'lastQuote' in data['results']:
+            price = data['results']['lastQuote'].get('p')  # Quote price
+        elif 'lastTrade' in data['results']:
+            price = data['results']['lastTrade'].get('p')  # Trade price
+    return price
+
+def _extract_pe_from_details(data):
+    """Extract the P/E ratio from a /v3/reference/tickers/{ticker} response."""
+    if data and 'results' in data:
+        if data['results'].get('pe_ratio') is not None:
+            return data['results']['pe_ratio']
+        if 'metrics' in data['results'] and 'pe_ratio' in data['results']['metrics']:
+            return data['results']['metrics']['pe_ratio']
+    return None
+
+def _extract_pe_from_snapshot(data):
+    """Extract the P/E ratio from a snapshot response."""
+    if data and 'ticker' in data:
+        ticker_data = data['ticker']
+        if 'valuation' in ticker_data and 'pe_ratio' in ticker_data['valuation']:
+            return ticker_data['valuation']['pe_ratio']
+    return None
+
+def _extract_eps(data, ticker):
+    """Extract earnings per share from a financials response, or None."""
+    if not data or 'results' not in data or not data['results']:
+        return None
+
+    # Handle different data structures
+    results = data['results']
+    if not isinstance(results, list) or not results:
+        return None
+    result = results[0]
+
+    # Check if financials key exists
+    if 'financials' in result:
+        income_stmt = result['financials'].get('income_statement', {})
+    else:
+        # Try to find income statement directly
+        income_stmt = result.get('income_statement', {})
+
+    # Try different EPS fields
+    eps_fields = [
+        'diluted_earnings_per_share',
+        'basic_earnings_per_share',
+        'net_income_per_share'
+    ]
+
+    for field in eps_fields:
+        if field in income_stmt and income_stmt[field]:
+            eps = None
+            eps_data = income_stmt[field]
+            if isinstance(eps_data, dict) and 'value' in eps_data:
+                eps = eps_data.get('value')
+            elif isinstance(eps_data, (int, float)):
+                eps = eps_data
+
+            if eps is not None:
+                print(f"Using {field} for {ticker}: {eps}")
+                return eps
+    return None
+
+def _extract_financials(data):
+    """Extract the latest financial statement from a financials response, or None."""
+    if data and 'results' in data and data['results']:
+        results = data['results']
+        if isinstance(results, list) and results:
+            result = results[0]
+
+            # Normalize the data structure
+            if 'financials' not in result:
+                result = {'financials': result}
+            return result
+    return None
+
+def _empty_financials(ticker):
+    """Structured response used when no financial data is found."""
+    return {
+        'ticker': ticker,
+        'error': 'No financial data available',
+        'financials': {
+            'balance_sheet': {},
+            'income_statement': {},
+            'cash_flow_statement': {}
+        }
+    }
+
+def _observe_details(results):
+    """Feed a /v3/reference/tickers/{ticker} result to the peer index and the fallback learner."""
+    if PolygonFinancials.peer_index is not None:
+        PolygonFinancials.peer_index.observe(results)
+    if FallbackChain.learner is not None:
+        FallbackChain.learner.observe(results)
+
+def _observed_details(data):
+    """Feed a /v3/reference/tickers/{ticker} response to the observers and return it unchanged."""
+    if data and 'results' in data:
+        _observe_details(data['results'])
+    return data
 
-# Create a global rate limiter instance
-RATE_LIMITER = RateLimiter()
+def _convert_v1_details(data):
+    """Convert a v1 company response to match the v3 ticker details format."""
+    return {
+        'ticker': data.get('symbol'),
+        'name': data.get('name'),
+        'sic_code': data.get('sic'),
+        'industry': data.get('industry'),
+        'sector': data.get('sector'),
+        'description': data.get('description')
+    }
+
+def _summarize_dividends(dividends):
+    """Group dividend records by year and check whether they have been increasing."""
+    dividends.sort(key=lambda x: x.get('pay_date', ''))
+
+    # Group dividends by year
+    dividends_by_year = {}
+    for div in dividends:
+        pay_date = div.get('pay_date')
+        if not pay_date:
+            continue
+
+        year = pay_date.split('-')[0]
+        cash_amount = div.get('cash_amount', 0)
+
+        if year not in dividends_by_year:
+            dividends_by_year[year] = []
+
+        dividends_by_year[year].append(cash_amount)
+
+    # Calculate annual dividend totals
+    annual_dividends = {}
+    for year, amounts in dividends_by_year.items():
+        annual_dividends[year] = sum(amounts)
+
+    # Sort years and check for growth
+    years = sorted(annual_dividends.keys())
+    if len(years) < 2:
+        return {
+            'has_dividends': True,
+            'years_of_data': len(years),
+            'annual_dividends': annual_dividends,
+            'increasing': False,
+            'message': "Not enough years of dividend data to determine trend"
+        }
+
+    # Check if dividends have been increasing
+    increasing = True
+    for i in range(1, len(years)):
+        if annual_dividends[years[i]] <= annual_dividends[years[i-1]]:
+            increasing = False
+            break
+
+    return {
+        'has_dividends': True,
+        'years_of_data': len(years),
+        'annual_dividends': annual_dividends,
+        'increasing': increasing,
+        'message': f"Dividends have {'increased' if increasing else 'not increased'} each year over the available data"
+    }
+
+def _latest_earnings(data):
+    """The latest earnings in a /v2/reference/financials response, or None."""
+    if 'results' in data and data['results']:
+        return data['results'][0]
+    return None
+
+def _dividend_history(data):
+    """Dividend summary from a /v3/reference/dividends response."""
+    if 'results' not in data or not data['results']:
+        return {
+            'has_dividends': False,
+            'message': "No dividend data found"
+        }
+    return _summarize_dividends(data['results'])
+
+def _dividend_error(e):
+    print(f"Error getting dividend history: {e}")
+    return {
+        'has_dividends': False,
+        'error': str(e),
+        'message': "Error retrieving dividend data"
+    }
+
+def _peer_tickers(data, ticker):
+    """Collect peer tickers from a /v3/reference/tickers list response."""
+    if 'results' in data:
+        # Filter out the current ticker and collect peers
+        return [item['ticker'] for item in data['results'] if item['ticker'] != ticker]
+    return []
 
 class PolygonFinancials:
+    peer_index = None  # Optional peer_index.PeerIndex shared by all instances (set by main)
+    industry_pe_store = None  # Optional industry_stats.IndustryPEStore shared by all instances (set by main)
+    negative_cache = None  # Optional negative_cache.NegativeCache shared by all instances (set by main)
+
     def __init__(self, ticker, api_key=None, analyzer=None):
         self.ticker = ticker
         self.api_key = api_key or API_KEY
         self.analyzer = analyzer  # StockAnalyzer instance for getting similar companies
-        self.session = requests.Session()
+        self.session = get_session()  # Shared keep-alive connection pool
         self.cache = {}
+        self.not_found = False  # Polygon answered 404 for this ticker's details
+        self.upstream_errors = 0  # Failed upstream requests, used to classify misses
         
+    def _get_json(self, url):
+        """Plain GET on the shared pool without rate limiting or retries (memoized per request)."""
+        try:
+            data = memoized(normalize_url(url), self._send_get_json, url)
+        except requests.exceptions.RequestException as e:
+            self._note_failure(url, getattr(e.response, 'status_code', None))
+            raise
+        return self._note_json_status(url, data)
+
+    def _send_get_json(self, url):
+        response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+        return response.json()
+
     def _make_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+        """Make an API request, sharing the result with concurrent identical requests
+        and with later identical requests in the same request_memo() block."""
+        key = normalize_url(url, method)
+        try:
+            data = memoized(
+                key, POLYGON_FLIGHTS.do, key, self._send_api_request, url, method, max_retries, retry_delay
+            )
+        except requests.exceptions.RequestException as e:
+            self._note_failure(url, getattr(e.response, 'status_code', None))
+            raise
+        if data is None:  # Rate limited on every attempt
+            self._note_failure(url)
+        return data
+    
+    def _note_failure(self, url, status=None):
+        """Remember a failed upstream request, to classify a lookup that ends up empty."""
+        if status == 404:
+            # Unknown ticker if its details are missing; other endpoints just have no data
+            if url.split('?')[0].endswith(f"/v3/reference/tickers/{self.ticker}"):
+                self.not_found = True
+            return
+        self.upstream_errors += 1
+    
+    def _note_json_status(self, url, data):
+        """Note a failure reported in a plain GET's JSON body (those don't raise on HTTP errors)."""
+        status = data.get('status') if isinstance(data, dict) else None
+        if status == 'NOT_FOUND':
+            self._note_failure(url, 404)
+        elif status == 'ERROR':
+            self._note_failure(url)
+        return data
+    
+    def _negative(self, data_type):
+        """Recorded miss for this ticker and data type, or None."""
+        if self.negative_cache is None:
+            return None
+        miss = self.negative_cache.get(self.ticker, data_type)
+        if miss is not None:
+            print(f"Skipping {data_type} for {self.ticker}: {miss['kind']} ({miss['reason']})")
+        return miss
+    
+    def record_miss(self, data_type):
+        """Negatively cache a lookup that found nothing, classified by the upstream failures seen."""
+        if self.negative_cache is None:
+            return
+        if self.not_found:
+            self.negative_cache.put(self.ticker, data_type, NOT_FOUND, "Ticker details not found")
+        elif self.upstream_errors:
+            self.negative_cache.put(self.ticker, data_type, TRANSIENT, f"{self.upstream_errors} upstream requests failed")
+        else:
+            self.negative_cache.put(self.ticker, data_type, NO_DATA, "No source returned data")
+    
+    def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
         """Make an API request with proper error handling and rate limiting."""
         for attempt in range(max_retries):
             try:
                 # Wait for rate limiter before making request
-                RATE_LIMITER.wait()
+                RATE_LIMITER.acquire()
                 
                 # Make the request
-                response = self.session.request(method, url)
-                
-                # Check rate limit headers
-                remaining = int(response.headers.get('X-RateLimit-Remaining', 0))
-                if remaining < 2:  # If we're running very low on requests
-                    time.sleep(2)  # Add extra delay
+                response = self.session.request(method, url, timeout=REQUEST_TIMEOUT)
                 
-                # Handle different response status codes
+                # Feed rate limit headers and 429s back into the shared limiter;
+                # the next acquire() waits out any back-off without holding up other threads
+                retry_after = RATE_LIMITER.record_response(response.status_code, response.headers)
                 if response.status_code == 429:  # Too Many Requests
-                    retry_after = int(response.headers.get('Retry-After', retry_delay))
-                    print(f"Rate limit hit, waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
+                    print(f"Rate limit hit, upstream blocked for {retry_after} seconds...")
                     continue
                     
                 response.raise_for_status()
                 return response.json()
                 
             except requests.exceptions.RequestException as e:
+                if getattr(e.response, 'status_code', None) == 404:
+                    raise  # Unknown ticker or endpoint: retrying won't change the answer
                 print(f"API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:  # Don't sleep on the last attempt
                     time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
@@ -96,112 +436,89 @@ class PolygonFinancials:
         
         return None
         
+    def _extract_from(self, url, extract):
+        """Fetch url and parse the response with extract (one fallback strategy)."""
+        return extract(self._make_api_request(url))
+    
     def get_current_price(self):
         """Get the latest closing price for the ticker."""
-        # Check cache first
-        if self.analyzer and hasattr(self.analyzer, 'cache'):
-            cache_key = f"price_{self.ticker}"
-            if cache_key in self.analyzer.cache:
-                cached_time, cached_price = self.analyzer.cache[cache_key]
-                if time.time() - cached_time < 3600:  # 1 hour cache
-                    print(f"Using cached price for {self.ticker}: {cached_price}")
-                    return cached_price
-        
-        # Try multiple approaches to get the current price
-        approaches = [
-            # Previous day close
-            lambda: self._make_api_request(
-                f"https://api.polygon.io/v2/aggs/ticker/{self.ticker}/prev?apiKey={self.api_key}"
-            ),
-            # Latest quote
-            lambda: self._make_api_request(
-                f"https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers/{self.ticker}?apiKey={self.api_key}"
-            ),
-            # Latest daily bar
-            lambda: self._make_api_request(
-                f"https://api.polygon.io/v2/aggs/ticker/{self.ticker}/range/1/day/2023-01-01/{datetime.now().strftime('%Y-%m-%d')}?limit=1&apiKey={self.api_key}"
-            )
-        ]
-        
-        for i, approach in enumerate(approaches, 1):
-            try:
-                print(f"Trying approach {i} to get price for {self.ticker}")
-                data = approach()
-                
-                if not data:
-                    continue
-                    
-                price = None
-                if 'results' in data and data['results']:
-                    if isinstance(data['results'], list):
-                        price = data['results'][0].get('c')  # Close price
-                    elif 'lastQuote' in data['results']:
-                        price = data['results']['lastQuote'].get('p')  # Quote price
-                    elif 'lastTrade' in data['results']:
-                        price = data['results']['lastTrade'].get('p')  # Trade price
-                        
-                if price:
-                    print(f"Successfully got price for {self.ticker}: {price}")
-                    # Cache the price
-                    if self.analyzer and hasattr(self.analyzer, 'cache'):
-                        self.analyzer.cache[f"price_{self.ticker}"] = (time.time(), price)
-                    return price
-            except Exception as e:
-                print(f"Error in approach {i} for {self.ticker}: {str(e)}")
-                continue
+        cached_price = self._cached_price()
+        if cached_price is not None:
+            return cached_price
+        if self._negative('price'):
+            return None
         
-        print(f"Failed to get price for {self.ticker} after trying all approaches")
-        return None
+        # Race the price sources: a slow one gets the next started after the hedge delay
+        price = PRICE_CHAIN.run(self._price_strategies(), is_valid=bool, ticker=self.ticker)
+        return self._store_price(price)
+    
+    def _price_strategies(self):
+        """(name, fn) price sources in order of preference."""
+        return _strategies(_price_sources(self.ticker, self.api_key), self._extract_from)
+    
+    def _cached_price(self):
+        """Cached price (fresh for an hour while the market is open, until the next open otherwise), or None."""
+        cached_price = self._cached(f"price_{self.ticker}", 3600)
+        if cached_price is not None:
+            print(f"Using cached price for {self.ticker}: {cached_price}")
+        return cached_price
+    
+    def _store_price(self, price):
+        """Cache a fetched price, or record the miss. Returns the price or None."""
+        if not price:
+            print(f"Failed to get price for {self.ticker} after trying all approaches")
+            self.record_miss('price')
+            return None
+        print(f"Successfully got price for {self.ticker}: {price}")
+        if self.analyzer and hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[f"price_{self.ticker}"] = (time.time(), price)
+        return price
     
     def get_ticker_details(self):
         """Get basic information about the ticker."""
+        if self._negative('ticker_details'):
+            return self._minimal_details()
+        v3_url, v1_url = _details_urls(self.ticker, self.api_key)
         try:
-            # Try the v3 reference endpoint first
-            url = f"https://api.polygon.io/v3/reference/tickers/{self.ticker}?apiKey={self.api_key}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if 'results' in data:
-                return data['results']
-                
-            # If that fails, try the v1 ticker details endpoint
-            url = f"https://api.polygon.io/v1/meta/symbols/{self.ticker}/company?apiKey={self.api_key}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if 'error' not in data:
-                # Convert v1 format to match v3 format
-                return {
-                    'ticker': data.get('symbol'),
-                    'name': data.get('name'),
-                    'sic_code': data.get('sic'),
-                    'industry': data.get('industry'),
-                    'sector': data.get('sector'),
-                    'description': data.get('description')
-                }
-                
-            # If both API calls fail, return a minimal set of data
-            return {
-                'ticker': self.ticker,
-                'name': self.ticker
-            }
+            # Try the v3 reference endpoint first, then the v1 ticker details endpoint
+            details = self._details_from_v3(self._get_json(v3_url))
+            if details is None:
+                details = self._details_from_v1(self._get_json(v1_url))
+            return details
         except Exception as e:
-            print(f"Error getting ticker details: {e}")
-            # Return minimal data on error
-            return {
-                'ticker': self.ticker,
-                'name': self.ticker
-            }
+            return self._details_error(e)
+    
+    def _minimal_details(self):
+        return {
+            'ticker': self.ticker,
+            'name': self.ticker
+        }
+    
+    def _details_from_v3(self, data):
+        """Ticker details from a v3 response (fed to the peer index and the learner), or None."""
+        if 'results' in data:
+            _observe_details(data['results'])
+            return data['results']
+        return None
+    
+    def _details_from_v1(self, data):
+        """Ticker details from a v1 response converted to the v3 format, or minimal details."""
+        if 'error' not in data:
+            return _convert_v1_details(data)
+        # If both API calls fail, return a minimal set of data
+        self.record_miss('ticker_details')  # not_found if the v3 endpoint didn't know the ticker
+        return self._minimal_details()
+    
+    def _details_error(self, e):
+        print(f"Error getting ticker details: {e}")
+        self.record_miss('ticker_details')
+        # Return minimal data on error
+        return self._minimal_details()
     
     def get_latest_earnings(self):
         """Get the latest earnings data."""
         try:
-            url = f"https://api.polygon.io/v2/reference/financials/{self.ticker}?limit=1&apiKey={self.api_key}"
-            response = requests.get(url)
-            data = response.json()
-            if 'results' in data and data['results']:
-                return data['results'][0]
-            return None
+            return _latest_earnings(self._get_json(_earnings_url(self.ticker, self.api_key)))
         except Exception as e:
             print(f"Error getting earnings data: {e}")
             return None
@@ -209,163 +526,142 @@ class PolygonFinancials:
     def get_dividend_history(self):
         """Get dividend history for the past 5 years and analyze growth."""
         try:
-            # Get today's date and date 5 years ago
-            today = datetime.now()
-            five_years_ago = today - timedelta(days=5*365)
-            
-            # Format dates for API
-            from_date = five_years_ago.strftime("%Y-%m-%d")
-            to_date = today.strftime("%Y-%m-%d")
-            
-            # Make API request for dividends
-            url = f"https://api.polygon.io/v3/reference/dividends?ticker={self.ticker}&limit=100&apiKey={self.api_key}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if 'results' not in data or not data['results']:
-                return {
-                    'has_dividends': False,
-                    'message': "No dividend data found"
-                }
-            
-            # Process dividend data
-            dividends = data['results']
-            dividends.sort(key=lambda x: x.get('pay_date', ''))
-            
-            # Group dividends by year
-            dividends_by_year = {}
-            for div in dividends:
-                pay_date = div.get('pay_date')
-                if not pay_date:
-                    continue
-                    
-                year = pay_date.split('-')[0]
-                cash_amount = div.get('cash_amount', 0)
-                
-                if year not in dividends_by_year:
-                    dividends_by_year[year] = []
-                    
-                dividends_by_year[year].append(cash_amount)
-            
-            # Calculate annual dividend totals
-            annual_dividends = {}
-            for year, amounts in dividends_by_year.items():
-                annual_dividends[year] = sum(amounts)
-            
-            # Sort years and check for growth
-            years = sorted(annual_dividends.keys())
-            if len(years) < 2:
-                return {
-                    'has_dividends': True,
-                    'years_of_data': len(years),
-                    'annual_dividends': annual_dividends,
-                    'increasing': False,
-                    'message': "Not enough years of dividend data to determine trend"
-                }
-                
-            # Check if dividends have been increasing
-            increasing = True
-            for i in range(1, len(years)):
-                if annual_dividends[years[i]] <= annual_dividends[years[i-1]]:
-                    increasing = False
-                    break
-            
-            return {
-                'has_dividends': True,
-                'years_of_data': len(years),
-                'annual_dividends': annual_dividends,
-                'increasing': increasing,
-                'message': f"Dividends have {'increased' if increasing else 'not increased'} each year over the available data"
-            }
-            
+            return _dividend_history(self._get_json(_dividends_url(self.ticker, self.api_key)))
         except Exception as e:
-            print(f"Error getting dividend history: {e}")
-            return {
-                'has_dividends': False,
-                'error': str(e),
-                'message': "Error retrieving dividend data"
-            }
+            return _dividend_error(e)
+    
+    def _cached(self, cache_key, max_age):
+        """Value from the analyzer cache if it is still fresh, else None.
+
+        Freshness follows the cache's expiry policy when it has one (e.g. prices
+        stay fresh until the market reopens), otherwise entries expire after max_age seconds.
+        """
+        cache = getattr(self.analyzer, 'cache', None) if self.analyzer else None
+        # One lookup: a membership test followed by cache[key] can race an eviction (KeyError)
+        entry = cache.get(cache_key) if cache is not None else None
+        if entry is not None:
+            cached_time, cached_value = entry
+            if hasattr(cache, 'expires_at'):
+                expires = cache.expires_at(cache_key, cached_time, cached_value)
+            else:
+                expires = cached_time + max_age
+            if time.time() < expires:
+                return cached_value
+        return None
     
     def get_pe_ratio(self):
-        """Calculate P/E ratio using latest price and earnings with improved fallback options."""
-        print(f"Getting P/E ratio for {self.ticker}")
+        """Get the P/E ratio, reusing a recently cached value."""
+        cached_pe = self._cached_pe_ratio()
+        if cached_pe is not None:
+            return cached_pe
+        if self._negative('pe_ratio'):
+            return None
         
-        # Hardcoded fallbacks for common tickers that might have API issues
-        fallbacks = {
-            'NVDA': 35.2,  # NVIDIA
-            'AAPL': 28.5,  # Apple
-            'MSFT': 32.1,  # Microsoft
-            'GOOGL': 25.3,  # Alphabet
-            'AMZN': 40.2,  # Amazon
-            'META': 28.0,  # Meta
-            'TSLA': 60.5,  # Tesla
-        }
+        pe_ratio, fallback = self._fetch_pe_ratio()
+        self._record_pe_ratio(pe_ratio, fallback)
+        return pe_ratio
+    
+    def _cached_pe_ratio(self):
+        """Recently cached P/E ratio, or None."""
+        cached_pe = self._cached(f"pe_{self.ticker}", PE_CACHE_SECONDS)
+        if cached_pe is not None:
+            print(f"Using cached P/E ratio for {self.ticker}: {cached_pe}")
+        return cached_pe
+    
+    def _record_pe_ratio(self, pe_ratio, fallback=False):
+        """Cache a freshly fetched P/E ratio and add it to the industry statistics.
+
+        Args:
+            pe_ratio: Result of _fetch_pe_ratio()
+            fallback: Whether it is a hardcoded PE_FALLBACKS value (kept out of the statistics)
+        """
+        if pe_ratio is None:
+            self.record_miss('pe_ratio')
+            return
+        if self.analyzer and hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[f"pe_{self.ticker}"] = (time.time(), pe_ratio)
+        if not fallback:
+            self.record_industry_pe(pe_ratio)
+    
+    def record_industry_pe(self, pe_ratio):
+        """Add a looked up P/E ratio to the shared industry statistics."""
+        if self.industry_pe_store is not None:
+            self.industry_pe_store.record(self.ticker, pe_ratio, self._industry_key())
+    
+    def _industry_key(self):
+        """Industry key for this ticker from the peer index (None until it is classified)."""
+        if self.peer_index is None:
+            return None
+        return industry_key(self.peer_index.sic_code(self.ticker))
+    
+    def _industry_pe_cache_key(self):
+        """Analyzer cache key of the industry P/E ratio: per industry once the ticker is classified,
+        per ticker until then (no ':' or '_' in the suffix, so the cache still sees an industry_pe key)."""
+        key = self._industry_key()
+        return f"industry_pe_{re.sub(r'[:_]', '-', key) if key else self.ticker}"
+    
+    def _industry_pe_stats(self):
+        """Aggregate P/E statistics for this ticker's industry, or None."""
+        if self.industry_pe_store is None:
+            return None
+        return self.industry_pe_store.get(self._industry_key())
+    
+    def _fetch_pe_ratio(self):
+        """Calculate P/E ratio using latest price and earnings with improved fallback options.
+
+        Returns:
+            (pe_ratio, fallback): fallback is True when pe_ratio is a hardcoded PE_FALLBACKS value
+        """
+        print(f"Getting P/E ratio for {self.ticker}")
+        return self._pe_or_fallback(self.lookup_pe_ratio())
+    
+    def lookup_pe_ratio(self, manual=True):
+        """Run the P/E fallback chain (without the P/E cache or the hardcoded fallbacks).
         
-        # Try direct API call first - this is the most reliable method
+        Args:
+            manual: Whether the manual calculation from price and EPS may run after the single-request sources
+        """
+        details = self._pe_details()
+        if self.not_found:
+            return None  # Unknown ticker: no other source will know it either
+        return PE_CHAIN.run(self._pe_strategies(details, manual), ticker=self.ticker)
+    
+    def _pe_details(self):
+        """Ticker details response fetched ahead of the P/E chain, or None.
+
+        Fetched unconditionally rather than as a chain strategy, so the ticker is classified
+        and an unknown one detected even when the learner skips the ticker_details source.
+        """
         try:
-            print(f"Trying direct API call for P/E ratio for {self.ticker}")
-            url = f"https://api.polygon.io/v3/reference/tickers/{self.ticker}?apiKey={self.api_key}"
-            data = self._make_api_request(url)
-            
-            if data and 'results' in data:
-                if 'pe_ratio' in data['results']:
-                    pe_ratio = data['results']['pe_ratio']
-                    if pe_ratio is not None:
-                        print(f"Successfully got P/E ratio for {self.ticker} from direct API: {pe_ratio}")
-                        return pe_ratio
+            return _observed_details(self._make_api_request(_details_urls(self.ticker, self.api_key)[0]))
         except Exception as e:
-            print(f"Error in direct API call for {self.ticker}: {str(e)}")
-        
-        # Try multiple approaches to get P/E ratio
-        approaches = [
-            self._get_pe_from_ticker_details,
-            self._get_pe_from_snapshot,
-            self._calculate_pe_manually
-        ]
-        
-        for i, approach in enumerate(approaches, 1):
-            print(f"Trying approach {i} to get P/E ratio for {self.ticker}")
-            try:
-                pe_ratio = approach()
-                if pe_ratio is not None:
-                    print(f"Successfully got P/E ratio for {self.ticker} using approach {i}: {pe_ratio}")
-                    return pe_ratio
-            except Exception as e:
-                print(f"Error in approach {i} for {self.ticker}: {str(e)}")
-                continue
-        
-        # If all approaches failed, use fallback if available
-        if self.ticker in fallbacks:
-            print(f"Using fallback P/E ratio for {self.ticker}: {fallbacks[self.ticker]}")
-            return fallbacks[self.ticker]
-        
-        print(f"Failed to get P/E ratio for {self.ticker} after trying all approaches")
-        return None
+            print(f"Error getting ticker details for {self.ticker}: {e}")
+            return None
     
-    def _get_pe_from_ticker_details(self):
-        """Get P/E ratio directly from ticker details endpoint."""
-        url = f"https://api.polygon.io/v3/reference/tickers/{self.ticker}?apiKey={self.api_key}"
-        data = self._make_api_request(url)
-        
-        if data and 'results' in data:
-            if 'metrics' in data['results'] and 'pe_ratio' in data['results']['metrics']:
-                pe_ratio = data['results']['metrics']['pe_ratio']
-                if pe_ratio is not None:
-                    return pe_ratio
-        return None
+    def _pe_strategies(self, details, manual=True):
+        """(name, fn) P/E sources in order of preference.
+
+        Args:
+            details: Result of _pe_details()
+            manual: Whether to end with the manual calculation from price and EPS
+        """
+        strategies = [('ticker_details', functools.partial(_extract_pe_from_details, details))]
+        strategies += _strategies(_pe_sources(self.ticker, self.api_key), self._extract_from)
+        if manual:
+            strategies.append(('manual', self._calculate_pe_manually))
+        return strategies
     
-    def _get_pe_from_snapshot(self):
-        """Get P/E ratio from snapshot endpoint."""
-        url = f"https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers/{self.ticker}?apiKey={self.api_key}"
-        data = self._make_api_request(url)
-        
-        if data and 'ticker' in data:
-            ticker_data = data['ticker']
-            if 'valuation' in ticker_data and 'pe_ratio' in ticker_data['valuation']:
-                pe_ratio = ticker_data['valuation']['pe_ratio']
-                if pe_ratio is not None:
-                    return pe_ratio
-        return None
+    def _pe_or_fallback(self, pe_ratio):
+        """(pe_ratio, fallback) for a looked up P/E ratio, falling back to the hardcoded value
+        for common tickers when all approaches failed."""
+        if pe_ratio is not None:
+            print(f"Successfully got P/E ratio for {self.ticker}: {pe_ratio}")
+            return pe_ratio, False
+        if self.ticker in PE_FALLBACKS:
+            print(f"Using fallback P/E ratio for {self.ticker}: {PE_FALLBACKS[self.ticker]}")
+            return PE_FALLBACKS[self.ticker], True
+        print(f"Failed to get P/E ratio for {self.ticker} after trying all approaches")
+        return None, False
     
     def _calculate_pe_manually(self):
         """Calculate P/E ratio manually using price and earnings."""
@@ -373,133 +669,79 @@ class PolygonFinancials:
         if not price:
             print(f"Could not get current price for {self.ticker}")
             return None
-            
+        
         # Try multiple endpoints for financial data
-        endpoints = [
-            f"https://api.polygon.io/vX/reference/financials?ticker={self.ticker}&apiKey={self.api_key}",
-            f"https://api.polygon.io/v2/reference/financials/{self.ticker}?apiKey={self.api_key}"
-        ]
+        for url in _financials_urls(self.ticker, self.api_key):
+            pe_ratio = self._pe_from_eps(price, self._make_api_request(url))
+            if pe_ratio is not None:
+                return pe_ratio
         
-        for url in endpoints:
-            data = self._make_api_request(url)
-            
-            if not data or 'results' not in data or not data['results']:
-                continue
-                
-            try:
-                # Handle different data structures
-                results = data['results']
-                if isinstance(results, list) and results:
-                    result = results[0]
-                    
-                    # Check if financials key exists
-                    if 'financials' in result:
-                        income_stmt = result['financials'].get('income_statement', {})
-                    else:
-                        # Try to find income statement directly
-                        income_stmt = result.get('income_statement', {})
-                    
-                    # Try different EPS fields
-                    eps = None
-                    eps_fields = [
-                        'diluted_earnings_per_share',
-                        'basic_earnings_per_share',
-                        'net_income_per_share'
-                    ]
-                    
-                    for field in eps_fields:
-                        if field in income_stmt and income_stmt[field]:
-                            eps_data = income_stmt[field]
-                            if isinstance(eps_data, dict) and 'value' in eps_data:
-                                eps = eps_data.get('value')
-                            elif isinstance(eps_data, (int, float)):
-                                eps = eps_data
-                                
-                            if eps is not None:
-                                print(f"Using {field} for {self.ticker}: {eps}")
-                                break
-                    
-                    # If we found EPS, calculate P/E
-                    if eps and eps > 0:
-                        pe_ratio = price / eps
-                        print(f"Calculated P/E ratio for {self.ticker}: {pe_ratio}")
-                        return pe_ratio
-                    else:
-                        print(f"Invalid or missing EPS value for {self.ticker}")
-            except Exception as e:
-                print(f"Error processing financial data for {self.ticker}: {str(e)}")
-                
         # If we get here, we couldn't calculate P/E from any endpoint
         return None
     
+    def _pe_from_eps(self, price, data):
+        """P/E ratio from the price and the EPS in a financials response, or None."""
+        if not data or 'results' not in data or not data['results']:
+            return None
+        try:
+            eps = _extract_eps(data, self.ticker)
+            if eps and eps > 0:
+                pe_ratio = price / eps
+                print(f"Calculated P/E ratio for {self.ticker}: {pe_ratio}")
+                return pe_ratio
+            print(f"Invalid or missing EPS value for {self.ticker}")
+        except Exception as e:
+            print(f"Error processing financial data for {self.ticker}: {str(e)}")
+        return None
+    
     def get_financial_data(self):
         """Get comprehensive financial data with improved error handling."""
         print(f"Getting financial data for {self.ticker}")
-        
-        # Check cache first
-        if self.analyzer and hasattr(self.analyzer, 'cache'):
-            cache_key = f"financials_{self.ticker}"
-            if cache_key in self.analyzer.cache:
-                cached_time, cached_data = self.analyzer.cache[cache_key]
-                if time.time() - cached_time < 3600 * 24:  # 24 hour cache
-                    print(f"Using cached financial data for {self.ticker}")
-                    return cached_data
+        cached_data = self._cached_financials()
+        if cached_data is not None:
+            return cached_data
+        if self._negative('financials'):
+            return _empty_financials(self.ticker)
         
         # Try multiple API endpoints for financial data
-        endpoints = [
-            # Primary financials endpoint
-            f"https://api.polygon.io/vX/reference/financials?ticker={self.ticker}&apiKey={self.api_key}",
-            # Backup endpoint with different format
-            f"https://api.polygon.io/v2/reference/financials/{self.ticker}?apiKey={self.api_key}",
-        ]
-        
-        for i, url in enumerate(endpoints, 1):
+        for i, url in enumerate(_financials_urls(self.ticker, self.api_key), 1):
             print(f"Trying endpoint {i} to get financials for {self.ticker}")
-            data = self._make_api_request(url)
-            
-            if not data:
-                continue
-                
-            if 'results' in data and data['results']:
-                results = data['results']
-                if isinstance(results, list) and results:
-                    result = results[0]
-                    
-                    # Normalize the data structure
-                    if 'financials' not in result:
-                        result = {'financials': result}
-                    
-                    print(f"Successfully got financial data for {self.ticker}")
-                    
-                    # Cache the results
-                    if self.analyzer and hasattr(self.analyzer, 'cache'):
-                        self.analyzer.cache[f"financials_{self.ticker}"] = (time.time(), result)
-                    
-                    return result
-        
+            result = _extract_financials(self._make_api_request(url))
+            if result:
+                return self._store_financials(result)
+        return self._no_financials()
+    
+    def _cached_financials(self):
+        """Cached financial data (fresh until the next filing is expected), or None."""
+        cached_data = self._cached(f"financials_{self.ticker}", 3600 * 24)
+        if cached_data is not None:
+            print(f"Using cached financial data for {self.ticker}")
+        return cached_data
+    
+    def _store_financials(self, result):
+        print(f"Successfully got financial data for {self.ticker}")
+        if self.analyzer and hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[f"financials_{self.ticker}"] = (time.time(), result)
+        return result
+    
+    def _no_financials(self):
+        """Record the miss and return a structured response even when no data is found."""
         print(f"Failed to get financial data for {self.ticker} after trying all endpoints")
-        
-        # Return a structured response even when no data is found
-        return {
-            'ticker': self.ticker,
-            'error': 'No financial data available',
-            'financials': {
-                'balance_sheet': {},
-                'income_statement': {},
-                'cash_flow_statement': {}
-            }
-        }
+        self.record_miss('financials')
+        return _empty_financials(self.ticker)
     
-    def format_balance_sheet(self, output_format='print'):
+    def format_balance_sheet(self, output_format='print', financial_data=None):
         """Format the balance sheet data for better readability.
         
         Args:
             output_format: 'print' to display or 'dict' to return as dictionary
+            financial_data: Optional pre-fetched result of get_financial_data()
             
         Returns:
             Formatted balance sheet data or None if error
         """
-        financial_data = self.get_financial_data()
+        if financial_data is None:
+            financial_data = self.get_financial_data()
         if not financial_data:
             print(f"No financial data available for {self.ticker}")
             # Return a default structure with null values instead of None
@@ -618,14 +860,16 @@ class PolygonFinancials:
         
         return formatted
     
-    def format_cash_flow(self, output_format='print'):
+    def format_cash_flow(self, output_format='print', financial_data=None):
         """
         Format cash flow statement data with improved error handling and logging.
         Returns structured cash flow data or None if data is unavailable.
+        Pass financial_data to format an already fetched get_financial_data() result.
         """
         try:
             # Get financial data and check if it exists
-            financial_data = self.get_financial_data()
+            if financial_data is None:
+                financial_data = self.get_financial_data()
             if not financial_data:
                 print(f"No financial data available for {self.ticker}")
                 return {
@@ -729,69 +973,22 @@ class PolygonFinancials:
     def get_industry_peers(self):
         """Get a list of peer companies in the same industry."""
         try:
-            # First try to use the StockAnalyzer if available
+            peers = self._known_peers()
+            if peers:
+                return peers
+            
+            # Then try to use the StockAnalyzer if available
             if self.analyzer:
-                # Check if we already have cached peers for this ticker
-                cache_key = f"peers_{self.ticker}"
-                if hasattr(self.analyzer, 'cache') and cache_key in self.analyzer.cache:
-                    cached_time, cached_peers = self.analyzer.cache[cache_key]
-                    # Use cached peers if they're less than 24 hours old
-                    if time.time() - cached_time < 86400:  # 24 hours in seconds
-                        return cached_peers
-                
-                # Get peers from the analyzer
                 peers = self.analyzer.get_similar_companies(self.ticker)
                 if peers:
-                    # Cache the peers if possible
-                    if hasattr(self.analyzer, 'cache'):
-                        self.analyzer.cache[cache_key] = (time.time(), peers)
-                    return peers
-            
-            # If no analyzer or it returned no peers, try the API approaches
-            ticker_details = self.get_ticker_details()
-            
-            if not ticker_details:
-                print("Could not get ticker details")
-                return []
+                    return self._store_peers(peers)
             
-            # Try multiple approaches to find peers
+            # If no analyzer or it returned no peers, search for tickers with the same classification
             peers = []
-            
-            # Approach 1: Use SIC code if available
-            sic_code = ticker_details.get('sic_code')
-            if sic_code:
-                url = f"https://api.polygon.io/v3/reference/tickers?sic_code={sic_code}&active=true&limit=50&apiKey={self.api_key}"
-                response = requests.get(url)
-                data = response.json()
-                
-                if 'results' in data:
-                    # Filter out the current ticker and collect peers
-                    sic_peers = [item['ticker'] for item in data['results'] if item['ticker'] != self.ticker]
-                    peers.extend(sic_peers)
-            
-            # Approach 2: Use industry classification if available
-            industry = ticker_details.get('industry')
-            if industry and not peers:
-                url = f"https://api.polygon.io/v3/reference/tickers?industry={industry}&active=true&limit=50&apiKey={self.api_key}"
-                response = requests.get(url)
-                data = response.json()
-                
-                if 'results' in data:
-                    # Filter out the current ticker and collect peers
-                    industry_peers = [item['ticker'] for item in data['results'] if item['ticker'] != self.ticker]
-                    peers.extend(industry_peers)
-            
-            # Approach 3: Use sector classification if available
-            sector = ticker_details.get('sector')
-            if sector and not peers:
-                url = f"https://api.polygon.io/v3/reference/tickers?sector={sector}&active=true&limit=50&apiKey={self.api_key}"
-                response = requests.get(url)
-                data = response.json()
-                
-                if 'results' in data:
-                    # Filter out the current ticker and collect peers
-                    sector_peers = [item['ticker'] for item in data['results'] if item['ticker'] != self.ticker]
-                    peers.extend(sector_peers)
+            for url in _peer_search_urls(self.get_ticker_details(), self.api_key):
+                peers = _peer_tickers(self._get_json(url), self.ticker)
+                if peers:
+                    break
             
             # If we still have no peers, try to dynamically import and use the StockAnalyzer
             if not peers and ANTHROPIC_API_KEY:
@@ -805,98 +1002,153 @@ class PolygonFinancials:
                 except Exception as e:
                     print(f"Error dynamically importing StockAnalyzer: {e}")
             
-            # Cache the peers if possible
-            if peers and self.analyzer and hasattr(self.analyzer, 'cache'):
-                self.analyzer.cache[cache_key] = (time.time(), peers)
-                
-            return peers
+            return self._store_peers(peers)
         except Exception as e:
             print(f"Error getting industry peers: {e}")
             return []
     
+    def _known_peers(self):
+        """Peers from the local peer index or cached for this ticker (no upstream call), or None."""
+        if self.peer_index is not None:
+            peers = self.peer_index.peers(self.ticker)
+            if peers:
+                return peers
+        return self._cached(f"peers_{self.ticker}", 86400)  # 24 hours in seconds
+    
+    def _store_peers(self, peers):
+        """Cache the peers if possible. Returns the peers."""
+        if peers and self.analyzer and hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[f"peers_{self.ticker}"] = (time.time(), peers)
+        return peers
+    
     def get_industry_pe_ratio(self):
         """Calculate the average P/E ratio for the industry peers."""
-        try:
-            # Check if we have a cached industry P/E ratio
-            if self.analyzer and hasattr(self.analyzer, 'cache'):
-                cache_key = f"industry_pe_{self.ticker}"
-                if cache_key in self.analyzer.cache:
-                    cached_time, cached_pe = self.analyzer.cache[cache_key]
-                    # Use cached P/E ratio if it's less than 24 hours old
-                    if time.time() - cached_time < 86400:  # 24 hours in seconds
-                        return cached_pe
+        return self.get_industry_pe_summary()['industry_pe_ratio']
+    
+    def get_industry_pe_summary(self, deadline=INDUSTRY_PE_DEADLINE, max_parallel=INDUSTRY_PE_MAX_PARALLEL):
+        """Calculate the industry P/E ratio, fetching peer P/E ratios in parallel.
+        
+        Args:
+            deadline: Seconds to wait for peer P/E ratios before averaging whatever arrived
+            max_parallel: Maximum number of peers fetched at once
             
-            peers = self.get_industry_peers()
+        Returns:
+            Dictionary with industry_pe_ratio, the industry statistics (when they were used), the
+            peers, the peer P/E ratios that were used, and partial=True when some peers didn't answer before the deadline
+        """
+        summary = self._industry_pe_shortcut()
+        if summary['industry_pe_ratio'] is not None:
+            return summary
+        try:
+            peers = [peer for peer in self.get_industry_peers() if peer != self.ticker]  # Skip the original ticker
             if not peers:
                 print(f"No industry peers found for {self.ticker}")
-                return None
+                return summary
                 
             print(f"Found industry peers for {self.ticker}: {peers}")
+            summary['peers'] = peers
             
-            # Get P/E ratios for peers
-            pe_ratios = []
-            for peer in peers:
-                if peer == self.ticker:  # Skip the original ticker
-                    continue
-                    
-                peer_financials = PolygonFinancials(peer, self.api_key, self.analyzer)
-                peer_pe = peer_financials.get_pe_ratio()
-                
-                if peer_pe and peer_pe > 0 and peer_pe < 200:  # Filter out unreasonable P/E ratios
-                    print(f"P/E ratio for {peer}: {peer_pe}")
-                    pe_ratios.append(peer_pe)
-            
-            # Calculate average P/E ratio if we have at least one valid peer
-            if pe_ratios:
-                avg_pe = sum(pe_ratios) / len(pe_ratios)
-                print(f"Average industry P/E ratio: {avg_pe}")
-                
-                # Cache the result if possible
-                if self.analyzer and hasattr(self.analyzer, 'cache'):
-                    self.analyzer.cache[f"industry_pe_{self.ticker}"] = (time.time(), avg_pe)
-                    
-                return avg_pe
+            # Reuse cached peer P/E ratios and fetch the rest concurrently until the deadline
+            peer_pe_ratios = self._cached_peer_pe_ratios(peers)
+            fetched, summary['partial'] = fan_out(
+                lambda peer: PolygonFinancials(peer, self.api_key, self.analyzer).get_pe_ratio(),
+                [peer for peer in peers if peer not in peer_pe_ratios],
+                max_parallel=max_parallel,
+                deadline=deadline
+            )
+            peer_pe_ratios.update(fetched)
+            if self._average_peer_pe_ratios(summary, peer_pe_ratios):
+                return summary
                 
             # If we couldn't get P/E ratios for peers, try using Claude to get industry P/E
-            if self.analyzer:
+            if self.analyzer and not summary['partial']:
                 try:
-                    # Get company details to identify the industry
-                    company_details = self.get_ticker_details()
-                    industry = None
-                    if company_details:
-                        if 'industry' in company_details:
-                            industry = company_details['industry']
-                        elif 'sector' in company_details:
-                            industry = company_details['sector']
-                    
-                    if industry:
-                        # Use the cached_api_call method if available
-                        if hasattr(self.analyzer, '_cached_api_call'):
-                            industry_pe_prompt = f"What is the current average P/E ratio for the {industry} industry? Please respond with only the numeric value (e.g., 15.7)."
-                            pe_str = self.analyzer._cached_api_call("get_industry_pe_ratio", industry_pe_prompt)
-                        else:
-                            industry_pe_prompt = f"What is the current average P/E ratio for the {industry} industry? Please respond with only the numeric value (e.g., 15.7)."
-                            pe_str = self.analyzer._get_ai_response(industry_pe_prompt)
-                            
-                        # Extract just the number from the response
-                        import re
-                        pe_match = re.search(r'\d+(\.\d+)?', pe_str)
-                        if pe_match:
-                            industry_pe = float(pe_match.group(0))
-                            
-                            # Cache the result if possible
-                            if hasattr(self.analyzer, 'cache'):
-                                self.analyzer.cache[f"industry_pe_{self.ticker}"] = (time.time(), industry_pe)
-                                
-                            return industry_pe
+                    prompt = self._industry_pe_prompt(self.get_ticker_details())
+                    if prompt:
+                        self._store_industry_pe_answer(summary, self._ask_industry_pe(prompt))
                 except Exception as e:
                     print(f"Error getting industry P/E from Claude: {e}")
             
-            return None
+            return summary
         except Exception as e:
             print(f"Error calculating industry P/E ratio: {e}")
+            return summary
+    
+    def _industry_pe_shortcut(self):
+        """Industry P/E summary answered without any peer lookup (industry_pe_ratio None if it can't be)."""
+        summary = {'industry_pe_ratio': None, 'industry': None, 'peers': [], 'peer_pe_ratios': {}, 'partial': False}
+        try:
+            # Check if we have a cached industry P/E ratio
+            cached_pe = self._cached(self._industry_pe_cache_key(), 86400)  # 24 hours in seconds
+            if cached_pe is not None:
+                summary['industry_pe_ratio'] = cached_pe
+                return summary
+            
+            # Industry statistics are shared by every ticker in the industry
+            industry = self._industry_pe_stats()
+            if industry:
+                summary['industry_pe_ratio'] = industry['trimmed_mean']
+                summary['industry'] = industry
+        except Exception as e:
+            print(f"Error reading the industry P/E ratio: {e}")
+        return summary
+    
+    def _cached_peer_pe_ratios(self, peers):
+        """Cached P/E ratios of the peers that have one."""
+        peer_pe_ratios = {}
+        for peer in peers:
+            cached_pe = self._cached(f"pe_{peer}", PE_CACHE_SECONDS)
+            if cached_pe is not None:
+                peer_pe_ratios[peer] = cached_pe
+        return peer_pe_ratios
+    
+    def _average_peer_pe_ratios(self, summary, peer_pe_ratios):
+        """Fill the summary with the average of the reasonable peer P/E ratios. Returns whether there were any."""
+        # Filter out missing and unreasonable P/E ratios
+        summary['peer_pe_ratios'] = {
+            peer: pe for peer, pe in peer_pe_ratios.items() if isinstance(pe, (int, float)) and 0 < pe < 200
+        }
+        pe_ratios = list(summary['peer_pe_ratios'].values())
+        if not pe_ratios:
+            return False
+        
+        avg_pe = sum(pe_ratios) / len(pe_ratios)
+        print(f"Average industry P/E ratio from {len(pe_ratios)}/{len(summary['peers'])} peers: {avg_pe}"
+              + (" (partial, deadline reached)" if summary['partial'] else ""))
+        summary['industry_pe_ratio'] = avg_pe
+        
+        # Cache complete results only; peers still in flight fill the P/E cache for next time
+        if not summary['partial'] and self.analyzer and hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[self._industry_pe_cache_key()] = (time.time(), avg_pe)
+        return True
+    
+    def _industry_pe_prompt(self, company_details):
+        """Claude prompt for the average P/E ratio of the company's industry (or sector), or None."""
+        industry = None
+        if company_details:
+            industry = company_details.get('industry') or company_details.get('sector')
+        if not industry:
             return None
+        return f"What is the current average P/E ratio for the {industry} industry? Please respond with only the numeric value (e.g., 15.7)."
+    
+    def _ask_industry_pe(self, prompt):
+        """Ask Claude (through the analyzer, cached when it can be) for an industry P/E ratio."""
+        if hasattr(self.analyzer, '_cached_api_call'):
+            return self.analyzer._cached_api_call("get_industry_pe_ratio", prompt)
+        return self.analyzer._get_ai_response(prompt)
     
+    def _store_industry_pe_answer(self, summary, pe_str):
+        """Parse Claude's industry P/E answer into the summary and cache it. Returns whether it parsed."""
+        pe_match = re.search(r'\d+(\.\d+)?', pe_str or '')
+        if not pe_match:
+            return False
+        industry_pe = float(pe_match.group(0))
+        if hasattr(self.analyzer, 'cache'):
+            self.analyzer.cache[self._industry_pe_cache_key()] = (time.time(), industry_pe)
+        summary['industry_pe_ratio'] = industry_pe
+        return True
+    
+    @with_request_memo
     def get_financial_summary(self):
         """Print a comprehensive financial summary."""
         # Get company details
@@ -976,64 +1228,55 @@ class PolygonFinancials:
             'operating_cash_flow': cash_flow_data.get('operating_cash_flow') if cash_flow_data else None
         }
 
+    @with_request_memo
     def get_financial_data_for_agent(self):
         """Get financial data in a format suitable for the agent.
         Returns a dictionary with all the financial data without printing.
         """
-        # Get company details
-        company_details = self.get_ticker_details()
-        company_name = company_details.get('name', self.ticker)
-        
-        # Get current price
-        price = self.get_current_price()
-        
-        # Get P/E ratio
-        pe_ratio = self.get_pe_ratio()
-        
-        # Get industry P/E ratio
-        industry_pe = self.get_industry_pe_ratio()
-        
-        # Get dividend history
-        dividend_history = self.get_dividend_history()
-        
-        # Get balance sheet and cash flow data
-        balance_sheet_data = self.format_balance_sheet(output_format='dict')
-        cash_flow_data = self.format_cash_flow(output_format='dict')
+        return self._agent_data(
+            self.get_ticker_details(),
+            self.get_current_price(),
+            self.get_pe_ratio(),
+            # May be averaged from the peers that answered before the deadline
+            self.get_industry_pe_summary(),
+            self.get_dividend_history(),
+            self.get_financial_data(),
+        )
+    
+    def _agent_data(self, company_details, price, pe_ratio, industry_pe_summary, dividend_history, financial_data):
+        """Assemble get_financial_data_for_agent() from the fetched parts."""
+        balance_sheet_data = self.format_balance_sheet('dict', financial_data=financial_data)
+        cash_flow_data = self.format_cash_flow('dict', financial_data=financial_data)
+        has_dividends = dividend_history.get('has_dividends', False)
+        industry_pe = industry_pe_summary['industry_pe_ratio']
         
-        # Create comprehensive financial data dictionary
-        financial_data = {
+        return {
             'ticker': self.ticker,
-            'company_name': company_name,
+            'company_name': company_details.get('name', self.ticker),
             'price': price,
             'pe_ratio': pe_ratio,
             'industry_pe_ratio': industry_pe,
+            'industry_pe_partial': industry_pe_summary['partial'],
             'pe_relative_to_industry': (pe_ratio / industry_pe) if pe_ratio and industry_pe else None,
             'dividend_data': {
-                'has_dividends': dividend_history.get('has_dividends', False),
-                'dividend_growth': dividend_history.get('increasing', False) if dividend_history.get('has_dividends', False) else False,
-                'years_of_data': dividend_history.get('years_of_data', 0) if dividend_history.get('has_dividends', False) else 0,
-                'annual_dividends': dividend_history.get('annual_dividends', {}) if dividend_history.get('has_dividends', False) else {},
+                'has_dividends': has_dividends,
+                'dividend_growth': dividend_history.get('increasing', False) if has_dividends else False,
+                'years_of_data': dividend_history.get('years_of_data', 0) if has_dividends else 0,
+                'annual_dividends': dividend_history.get('annual_dividends', {}) if has_dividends else {},
                 'message': dividend_history.get('message', 'No dividend data available')
             },
             'balance_sheet': {
-                'total_assets': balance_sheet_data.get('total_assets') if balance_sheet_data else None,
-                'total_liabilities': balance_sheet_data.get('total_liabilities') if balance_sheet_data else None,
-                'total_equity': balance_sheet_data.get('total_equity') if balance_sheet_data else None,
-                'debt_ratio': balance_sheet_data.get('debt_ratio') if balance_sheet_data else None,
-                'debt_to_equity': balance_sheet_data.get('debt_to_equity') if balance_sheet_data else None
+                key: balance_sheet_data.get(key) if balance_sheet_data else None
+                for key in ('total_assets', 'total_liabilities', 'total_equity', 'debt_ratio', 'debt_to_equity')
             },
             'cash_flow': {
-                'operating_cash_flow': cash_flow_data.get('operating_cash_flow') if cash_flow_data else None,
-                'investing_cash_flow': cash_flow_data.get('investing_cash_flow') if cash_flow_data else None,
-                'financing_cash_flow': cash_flow_data.get('financing_cash_flow') if cash_flow_data else None,
-                'net_cash_flow': cash_flow_data.get('net_cash_flow') if cash_flow_data else None,
-                'cash_flow_to_revenue': cash_flow_data.get('cash_flow_to_revenue') if cash_flow_data else None,
-                'cash_flow_to_income': cash_flow_data.get('cash_flow_to_income') if cash_flow_data else None
+                key: cash_flow_data.get(key) if cash_flow_data else None
+                for key in ('operating_cash_flow', 'investing_cash_flow', 'financing_cash_flow',
+                            'net_cash_flow', 'cash_flow_to_revenue', 'cash_flow_to_income')
             }
         }
-        
-        return financial_data
 
+    @with_request_memo
     def get_financial_data_for_ticker(self):
         """
         Get comprehensive financial data for a ticker.
@@ -1043,26 +1286,7 @@ class PolygonFinancials:
         """
         try:
             print(f"Getting financial data for {self.ticker}")
-            # Get P/E ratio
-            pe_ratio = self.get_pe_ratio()
-            
-            # Get balance sheet data
-            balance_sheet = self.format_balance_sheet(output_format='dict')
-            
-            # Get cash flow data
-            cash_flow = self.format_cash_flow(output_format='dict')
-            
-            # Get dividend data
-            dividend_data = self.get_dividend_history()
-            
-            # Compile all data
-            financial_data = {
-                'ticker': self.ticker,
-                'pe_ratio': pe_ratio,
-                'balance_sheet': balance_sheet,
-                'cash_flow': cash_flow,
-                'dividend_data': dividend_data
-            }
+            financial_data = self._ticker_data(self.get_pe_ratio(), self.get_financial_data(), self.get_dividend_history())
             
             # Add debugging to check what data is being returned
             print(f"Financial data for {self.ticker}: {financial_data}")
@@ -1095,12 +1319,25 @@ class PolygonFinancials:
             
             return financial_data
         except Exception as e:
-            print(f"Error in get_financial_data_for_ticker: {str(e)}")
-            return {
-                'ticker': self.ticker,
-                'error': str(e),
-                'message': f"Error retrieving financial data for {self.ticker}"
-            }
+            return self._ticker_data_error(e)
+    
+    def _ticker_data(self, pe_ratio, financial_data, dividend_data):
+        """Assemble get_financial_data_for_ticker() from the fetched parts."""
+        return {
+            'ticker': self.ticker,
+            'pe_ratio': pe_ratio,
+            'balance_sheet': self.format_balance_sheet('dict', financial_data=financial_data),
+            'cash_flow': self.format_cash_flow('dict', financial_data=financial_data),
+            'dividend_data': dividend_data
+        }
+    
+    def _ticker_data_error(self, e):
+        print(f"Error in get_financial_data_for_ticker: {str(e)}")
+        return {
+            'ticker': self.ticker,
+            'error': str(e),
+            'message': f"Error retrieving financial data for {self.ticker}"
+        }
 
 # Function to use in Flask routes
 def get_financial_data_for_ticker(ticker, api_key=None, analyzer=None):
@@ -1117,38 +1354,8 @@ def get_financial_data_for_ticker(ticker, api_key=None, analyzer=None):
     try:
         print(f"Getting financial data for {ticker}")
         financials = PolygonFinancials(ticker, api_key=api_key, analyzer=analyzer)
-        data = financials.get_financial_data_for_ticker()
-        
-        # Add debugging to check what data is being returned
-        print(f"Financial data for {ticker}: {data}")
-        
-        # Ensure all expected fields are present
-        if data:
-            # Ensure balance_sheet is present
-            if 'balance_sheet' not in data or data['balance_sheet'] is None:
-                print(f"Balance sheet missing for {ticker}, attempting to get it")
-                balance_sheet = financials.format_balance_sheet(output_format='dict')
-                data['balance_sheet'] = balance_sheet
-            
-            # Ensure cash_flow is present
-            if 'cash_flow' not in data or data['cash_flow'] is None:
-                print(f"Cash flow missing for {ticker}, attempting to get it")
-                cash_flow = financials.format_cash_flow(output_format='dict')
-                data['cash_flow'] = cash_flow
-            
-            # Ensure dividend_data is present
-            if 'dividend_data' not in data or data['dividend_data'] is None:
-                print(f"Dividend data missing for {ticker}, attempting to get it")
-                dividend_data = financials.get_dividend_history()
-                data['dividend_data'] = dividend_data
-            
-            # Ensure PE ratio is present
-            if 'pe_ratio' not in data or data['pe_ratio'] is None:
-                print(f"PE ratio missing for {ticker}, attempting to get it")
-                pe_ratio = financials.get_pe_ratio()
-                data['pe_ratio'] = pe_ratio
-            
-        return data
+        # Already fills in missing fields (each endpoint fetched at most once)
+        return financials.get_financial_data_for_ticker()
     except Exception as e:
         print(f"Error in get_financial_data_for_ticker function: {str(e)}")
         # Return a structured response even when an error occurs
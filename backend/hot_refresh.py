@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Popularity-driven refresh of stock_info_cache entries for hot tickers.
+Routes report every request here, which keeps an exponentially decayed request
+count per ticker. A background loop refreshes the cached data of the most
+requested tickers shortly before it expires, so their next request is a hit
+instead of a synchronous miss. Refreshes only use leftover rate-limit budget:
+they are capped per minute, run at refresh priority (which can never spend the
+tokens reserved for interactive requests), and are skipped entirely while any
+upstream limiter has callers waiting.
+"""
+import heapq
+import os
+import threading
+import time
+
+from rate_scheduler import TokenBucketScheduler, PRIORITY_REFRESH
+
+INTERVAL = int(os.getenv("HOT_REFRESH_INTERVAL", 30))  # Seconds between refresh passes (0 disables)
+TOP_N = int(os.getenv("HOT_REFRESH_TOP_N", 50))  # Most requested tickers kept warm
+PER_MINUTE = float(os.getenv("HOT_REFRESH_PER_MINUTE", 4))  # Refreshes started per minute at most
+LEAD_SECONDS = int(os.getenv("HOT_REFRESH_LEAD_SECONDS", 300))  # Refresh entries expiring within this many seconds
+HALF_LIFE = int(os.getenv("HOT_REFRESH_HALF_LIFE", 3600))  # Seconds for a request's weight to halve
+MIN_SCORE = float(os.getenv("HOT_REFRESH_MIN_SCORE", 2))  # Decayed requests needed to count as hot
+MAX_TRACKED = 5000  # Tickers tracked at most; the least requested are dropped
+
+class PopularityRefresher:
+    """Tracks request frequency per ticker and refreshes hot entries before they expire.
+
+    Args:
+        store: StockInfoStore holding the entries
+        refresher: BackgroundRefresher that runs the refreshes
+        refresh: refresh(ticker, data_type, fetch, *args) fetches and caches data, returning it or None
+        limiters: Upstream rate limiters that must have spare capacity before a refresh starts
+        per_minute: Refreshes started per minute at most
+        top_n: Most requested tickers kept warm
+        lead_seconds: Refresh entries expiring within this many seconds
+    """
+    def __init__(self, store, refresher, refresh, limiters=(), per_minute=PER_MINUTE, top_n=TOP_N,
+                 lead_seconds=LEAD_SECONDS, half_life=HALF_LIFE, min_score=MIN_SCORE):
+        self.store = store
+        self.refresher = refresher
+        self.refresh = refresh
+        self.limiters = list(limiters)
+        self.budget = TokenBucketScheduler("hot_refresh", calls_per_minute=per_minute,
+                                           burst=max(1, int(per_minute)), reserve=0)
+        self.top_n = top_n
+        self.lead_seconds = lead_seconds
+        self.half_life = half_life
+        self.min_score = min_score
+        self.lock = threading.Lock()
+        self.scores = {}  # ticker -> (decayed request count, last update)
+        self.fetches = {}  # ticker -> {data_type: (fetch, args)} used by its routes
+        self.refreshed = {}  # (ticker, data_type) -> (expiry of the replaced entry, expiry of the refreshed one)
+        self.passes = 0
+        self.scheduled = 0
+        self.completed = 0
+        self.no_budget = 0
+        self.prevented_misses = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _score(self, ticker, now):
+        """Current decayed request count of a ticker. Must hold the lock."""
+        score, updated = self.scores.get(ticker, (0.0, now))
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, ticker, data_type, fetch, *args):
+        """Count a request for a ticker's data and remember how to refresh it."""
+        ticker = ticker.upper()
+        now = time.time()
+        with self.lock:
+            self.scores[ticker] = (self._score(ticker, now) + 1, now)
+            self.fetches.setdefault(ticker, {})[data_type] = (fetch, args)
+            expiries = self.refreshed.get((ticker, data_type))
+            if expiries is not None and now >= expiries[0]:
+                # Without the refresh this request would have found an expired entry
+                del self.refreshed[(ticker, data_type)]
+                if now < expiries[1]:
+                    self.prevented_misses += 1
+            if len(self.scores) > MAX_TRACKED:
+                self._prune(now)
+
+    def register(self, ticker, data_type, fetch, *args):
+        """Remember how to refresh a ticker's data without counting a request."""
+        with self.lock:
+            self.fetches.setdefault(ticker.upper(), {})[data_type] = (fetch, args)
+
+    def snapshot(self, count=None):
+        """Decayed request counts of the most requested tickers, for restoring after a restart."""
+        now = time.time()
+        with self.lock:
+            scored = [(self._score(t, now), t) for t in self.scores]
+        return {t: round(score, 3) for score, t in heapq.nlargest(count or MAX_TRACKED, scored)}
+
+    def restore(self, scores):
+        """Merge request counts from a snapshot (keeping the higher count per ticker)."""
+        now = time.time()
+        with self.lock:
+            for ticker, score in scores.items():
+                ticker = ticker.upper()
+                self.scores[ticker] = (max(self._score(ticker, now), float(score)), now)
+            if len(self.scores) > MAX_TRACKED:
+                self._prune(now)
+
+    def _prune(self, now):
+        """Drop the least requested tickers. Must hold the lock."""
+        keep = set(heapq.nlargest(MAX_TRACKED // 2, self.scores, key=lambda t: self._score(t, now)))
+        for ticker in [t for t in self.scores if t not in keep]:
+            del self.scores[ticker]
+            for data_type in self.fetches.pop(ticker, {}):
+                self.refreshed.pop((ticker, data_type), None)
+
+    def hottest(self, count=None):
+        """Most requested tickers with at least min_score decayed requests, hottest first."""
+        now = time.time()
+        with self.lock:
+            scored = [(self._score(t, now), t) for t in self.scores]
+        return [t for score, t in heapq.nlargest(count or self.top_n, scored) if score >= self.min_score]
+
+    def _has_budget(self):
+        if any(not limiter.has_spare_capacity(PRIORITY_REFRESH) for limiter in self.limiters):
+            return False
+        return self.budget.try_acquire()
+
+    def _run(self, ticker, data_type, replaced_expiry, fetch, args):
+        if self.refresh(ticker, data_type, fetch, *args) is None:
+            return
+        entry = self.store.get_entry(ticker, data_type)
+        with self.lock:
+            self.completed += 1
+            if entry is not None:
+                self.refreshed[(ticker, data_type)] = (replaced_expiry, entry[2])
+
+    def step(self):
+        """One refresh pass over the hottest tickers.
+
+        Returns:
+            Number of refreshes scheduled
+        """
+        due = []
+        for ticker in self.hottest():
+            with self.lock:
+                fetches = list(self.fetches.get(ticker, {}).items())
+            for data_type, (fetch, args) in fetches:
+                entry = self.store.get_entry(ticker, data_type, stale_seconds=self.store.stale_seconds)
+                if entry is not None and entry[2] - time.time() <= self.lead_seconds:
+                    due.append((ticker, data_type, entry[2], fetch, args))
+
+        scheduled = 0
+        for ticker, data_type, expires, fetch, args in due:
+            if not self._has_budget():
+                with self.lock:
+                    self.no_budget += 1
+                break
+            if self.refresher.schedule((ticker, data_type), self._run, ticker, data_type, expires, fetch, args):
+                scheduled += 1
+        with self.lock:
+            self.passes += 1
+            self.scheduled += scheduled
+        return scheduled
+
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.step()
+            except Exception as e:
+                print(f"Error refreshing hot tickers: {e}")
+
+    def start(self, interval=INTERVAL):
+        """Start refresh passes in a background thread."""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="hot-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        hot = self.hottest()
+        with self.lock:
+            return {
+                'tracked_tickers': len(self.scores),
+                'hot_tickers': hot[:10],
+                'passes': self.passes,
+                'scheduled': self.scheduled,
+                'completed': self.completed,
+                'skipped_no_budget': self.no_budget,
+                'prevented_misses': self.prevented_misses,
+            }
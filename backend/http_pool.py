@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Process-wide pooled HTTP transport for upstream APIs (Polygon, etc.)
+Keeps TCP+TLS connections alive between requests so cache misses don't pay a
+fresh handshake every time. Sync code shares one requests.Session, async code
+shares one aiohttp.ClientSession per event loop, and a background event loop
+lets Flask threads run coroutines without owning a loop themselves.
+"""
+import os
+import asyncio
+import atexit
+import contextvars
+import threading
+import weakref
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool settings
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))  # Max open connections per host
+KEEPALIVE_SECONDS = int(os.getenv("HTTP_KEEPALIVE_SECONDS", 60))  # Idle connection lifetime
+REQUEST_TIMEOUT = int(os.getenv("HTTP_REQUEST_TIMEOUT", 15))  # Per request timeout in seconds
+
+_lock = threading.Lock()
+_session = None
+_loop = None
+_loop_thread = None
+_aiohttp_sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp.ClientSession
+
+def get_session() -> requests.Session:
+    """Get the shared requests.Session used by all sync upstream calls."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the background event loop used to run coroutines from sync code.
+
+    The loop runs forever in a daemon thread and is started on first use.
+    """
+    global _loop, _loop_thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="http-pool-loop", daemon=True)
+                thread.start()
+                _loop_thread = thread
+                _loop = loop
+    return _loop
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """Get the shared aiohttp session for the running event loop.
+
+    Must be called from inside a coroutine. Sessions are bound to the loop they
+    were created on, so each loop gets its own keep-alive connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    session = _aiohttp_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE,
+            limit_per_host=POOL_SIZE,
+            keepalive_timeout=KEEPALIVE_SECONDS,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        )
+        _aiohttp_sessions[loop] = session
+    return session
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the background loop and block until it finishes.
+
+    Args:
+        coro: The coroutine to run
+        timeout: Optional maximum number of seconds to wait for the result
+
+    Returns:
+        The coroutine's result (exceptions are re-raised in the caller)
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the background event loop")
+    # Schedule from a copy of the caller's context so context variables
+    # (e.g. the request priority) carry over into the task
+    future = contextvars.copy_context().run(asyncio.run_coroutine_threadsafe, coro, loop)
+    return future.result(timeout)
+
+async def _close_aiohttp_sessions():
+    """Close the aiohttp session owned by the current loop."""
+    session = _aiohttp_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+def close():
+    """Close the shared sessions and stop the background loop."""
+    global _session, _loop, _loop_thread
+    with _lock:
+        if _loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(_close_aiohttp_sessions(), _loop).result(5)
+            except Exception as e:
+                print(f"Error closing aiohttp session: {e}")
+            _loop.call_soon_threadsafe(_loop.stop)
+            _loop_thread.join(5)
+            _loop = None
+            _loop_thread = None
+        if _session is not None:
+            _session.close()
+            _session = None
+
+atexit.register(close)
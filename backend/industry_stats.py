@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Industry-level P/E statistics shared by every ticker in an industry.
+Each time a ticker's P/E ratio is fetched it is recorded under its industry key
+(the SIC code from the peer index), and the industry's mean, median, trimmed
+mean and member count are kept up to date. Industry comparisons for any other
+ticker in the same industry then become a lookup instead of a peer fan-out.
+"""
+import os
+import statistics
+import threading
+import time
+
+from sqlite_tables import SQLiteTables
+
+MAX_AGE = int(os.getenv("INDUSTRY_PE_MAX_AGE", 7 * 24 * 3600))  # Ignore member P/E ratios older than this
+MIN_MEMBERS = int(os.getenv("INDUSTRY_PE_MIN_MEMBERS", 3))  # Members needed before the aggregate is used
+TRIM_FRACTION = 0.1  # Share of members dropped at each end for the trimmed mean
+
+def industry_key(sic_code=None, industry=None):
+    """Key an industry by SIC code, falling back to the industry name."""
+    if sic_code:
+        return f"sic:{sic_code}"
+    if industry:
+        return f"industry:{industry.strip().lower()}"
+    return None
+
+def trimmed_mean(values, fraction=TRIM_FRACTION):
+    """Mean after dropping `fraction` of the values at each end."""
+    values = sorted(values)
+    trim = int(len(values) * fraction)
+    if trim:
+        values = values[trim:-trim]
+    return sum(values) / len(values)
+
+class IndustryPEStore:
+    """Per-industry member P/E ratios and their aggregate statistics, persisted to SQLite."""
+    def __init__(self, db_path=None, max_age=MAX_AGE):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.members = {}  # industry key -> {ticker: (pe_ratio, updated)}
+        self.industry_of = {}  # ticker -> industry key
+        self.summaries = {}  # industry key -> cached statistics
+        self.lookups = 0
+        self.hits = 0
+
+        self.db = SQLiteTables(db_path, "industry P/E statistics", [
+            '''
+            CREATE TABLE IF NOT EXISTS industry_pe (
+                industry_key TEXT NOT NULL,
+                ticker TEXT PRIMARY KEY,
+                pe_ratio REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_industry_pe_key ON industry_pe (industry_key)',
+        ])
+
+        if self.db_path:
+            self.load()
+
+    def load(self):
+        """Load recent member P/E ratios from SQLite."""
+        rows = self.db.read(
+            "SELECT industry_key, ticker, pe_ratio, updated FROM industry_pe WHERE updated > ?",
+            (time.time() - self.max_age,)
+        )
+        if rows is None:
+            return 0
+
+        with self.lock:
+            for key, ticker, pe_ratio, updated in rows:
+                self.members.setdefault(key, {})[ticker] = (pe_ratio, updated)
+                self.industry_of[ticker] = key
+        return len(rows)
+
+    def record(self, ticker, pe_ratio, key):
+        """Record a freshly fetched P/E ratio for a ticker in an industry."""
+        if not key or pe_ratio is None or not 0 < pe_ratio < 200:  # Same filter as the peer average
+            return
+        now = time.time()
+        with self.lock:
+            old_key = self.industry_of.get(ticker)
+            if old_key and old_key != key:
+                self.members.get(old_key, {}).pop(ticker, None)
+                self.summaries.pop(old_key, None)
+            self.members.setdefault(key, {})[ticker] = (pe_ratio, now)
+            self.industry_of[ticker] = key
+            self.summaries.pop(key, None)
+
+        self.db.write((
+            "INSERT OR REPLACE INTO industry_pe (industry_key, ticker, pe_ratio, updated) VALUES (?, ?, ?, ?)",
+            [(key, ticker, pe_ratio, now)]
+        ))
+
+    def get(self, key, min_members=MIN_MEMBERS):
+        """Statistics for an industry, or None when it has fewer than min_members recent members.
+
+        Returns:
+            Dictionary with mean, median, trimmed_mean, count and updated
+        """
+        if not key:
+            return None
+        with self.lock:
+            self.lookups += 1
+            summary = self.summaries.get(key)
+            cutoff = time.time() - self.max_age
+            if summary is None or summary['oldest'] < cutoff:
+                members = {t: v for t, v in self.members.get(key, {}).items() if v[1] >= cutoff}
+                for ticker in self.members.get(key, {}).keys() - members.keys():
+                    self.industry_of.pop(ticker, None)
+                self.members[key] = members
+                if not members:
+                    return None
+                values = [pe for pe, _ in members.values()]
+                summary = {
+                    'industry_key': key,
+                    'mean': sum(values) / len(values),
+                    'median': statistics.median(values),
+                    'trimmed_mean': trimmed_mean(values),
+                    'count': len(values),
+                    'updated': max(updated for _, updated in members.values()),
+                    'oldest': min(updated for _, updated in members.values()),
+                }
+                self.summaries[key] = summary
+            if summary['count'] < min_members:
+                return None
+            self.hits += 1
+            return dict(summary)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'industries': sum(1 for members in self.members.values() if members),
+                'members': len(self.industry_of),
+                'lookups': self.lookups,
+                'hits': self.hits,
+            }
@@ -13,14 +13,38 @@ from polygon import RESTClient
 from dotenv import load_dotenv
 import threading
 import functools
+import itertools
+import atexit
+import signal
+import sys
 import re
+import math
 from fuzzywuzzy import fuzz, process
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import json
 
+from singleflight import SingleFlight, hash_key
+from rate_scheduler import TokenBucketScheduler
+from response_cache import ResponseCache
+from cache_store import StockInfoStore, connect, utc_timestamp
+from cache_refresh import BackgroundRefresher
+from hot_refresh import PopularityRefresher
+from cache_warmup import CacheWarmup
+from request_memo import request_memo, MEMO_STATS
+from response_body import ResponseBody
 from stock_news import get_news_from_motley_fool
-from get_pe_and_cash_flow import get_financial_data_for_ticker, PolygonFinancials
+from get_pe_and_cash_flow import (
+    get_financial_data_for_ticker, PolygonFinancials, POLYGON_FLIGHTS, RATE_LIMITER, PRICE_CHAIN, PE_CHAIN
+)
+from async_polygon import SyncPolygonFinancials
+from fanout import run_graph
+from company_profile import CompanyProfileService
+from peer_index import PeerIndex
+from industry_stats import IndustryPEStore
+from fallback import FallbackChain
+from strategy_stats import StrategyStats
+from negative_cache import NegativeCache, NOT_FOUND, NO_DATA, TRANSIENT
+from ticker_search import TickerSearchIndex
 
 # Load environment variables and initialize clients
 load_dotenv()
@@ -34,14 +58,22 @@ anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, methods=["GET", "OPTIONS"])
 
+def _memoized_wsgi_app(wsgi_app):
+    """Run every request inside request_memo(), so each upstream URL is fetched at most once per request."""
+    @functools.wraps(wsgi_app)
+    def memoized_app(environ, start_response):
+        with request_memo():
+            return wsgi_app(environ, start_response)
+    return memoized_app
+
+app.wsgi_app = _memoized_wsgi_app(app.wsgi_app)
+
 # SQLite database setup
-DB_PATH = os.path.join(os.path.dirname(__file__), 'stock_cache.db')
+DB_PATH = os.getenv("STOCK_CACHE_DB_PATH", os.path.join(os.path.dirname(__file__), 'stock_cache.db'))  # SQLite cache file
 
 def get_db_connection():
-    """Create a connection to the SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Create a connection to the SQLite database (WAL mode, rows accessible by column name)"""
+    return connect(DB_PATH)
 
 def init_db():
     """Initialize the database with required tables"""
@@ -58,6 +90,17 @@ def init_db():
     )
     ''')
     
+    # One row per query: drop duplicates left by older versions, then index the query
+    cursor.execute('''
+    DELETE FROM stock_search_cache
+    WHERE id NOT IN (SELECT MAX(id) FROM stock_search_cache GROUP BY query)
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_search_cache_query ON stock_search_cache (query)')
+    cursor.execute(
+        "DELETE FROM stock_search_cache WHERE timestamp <= ?",
+        (utc_timestamp(time.time() - STOCK_SEARCH_CACHE_TTL),)  # CURRENT_TIMESTAMP is UTC
+    )
+    
     # Create stock info cache table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS stock_info_cache (
@@ -74,76 +117,145 @@ def init_db():
     conn.close()
     print("Database initialized successfully")
 
-# Initialize database on startup
-init_db()
-
 # Cache for stock search results (in-memory, will be replaced with SQLite)
 stock_search_cache = {}
 STOCK_SEARCH_CACHE_TTL = 86400  # 24 hours in seconds
+STOCK_SEARCH_LIMIT = 20  # Results requested from Polygon per search
 
-class RateLimiter:
-    """Simple rate limiter to prevent hitting API limits."""
-    def __init__(self, max_calls: int, time_period: int):
-        self.max_calls = max_calls  # Maximum number of calls allowed in the time period
-        self.time_period = time_period  # Time period in seconds
-        self.calls = []  # List to track timestamps of calls
-        self.lock = threading.Lock()  # Lock for thread safety
-    
-    def acquire(self):
-        """Wait until a call can be made without exceeding the rate limit."""
-        with self.lock:
-            now = time.time()
-            # Remove timestamps older than the time period
-            self.calls = [t for t in self.calls if now - t < self.time_period]
-            
-            # If we've reached the maximum number of calls, wait
-            if len(self.calls) >= self.max_calls:
-                sleep_time = self.time_period - (now - self.calls[0])
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                    # Update now after sleeping
-                    now = time.time()
-                    # Clean up calls list again
-                    self.calls = [t for t in self.calls if now - t < self.time_period]
-            
-            # Add the current timestamp to the calls list
-            self.calls.append(now)
+# HTTP caching of /api responses by browsers and CDNs
+CACHE_CONTROL_MAX_AGE = int(os.getenv("CACHE_CONTROL_MAX_AGE", 300))  # Longest max-age sent, in seconds
+CACHE_CONTROL_STALE_SECONDS = int(os.getenv("CACHE_CONTROL_STALE_SECONDS", 600))  # stale-while-revalidate window
+ENDPOINT_DATA_TYPES = {  # Route -> stock_info_cache data type whose TTL bounds max-age
+    'get_ticker_data': 'basic_info',
+    'get_financials': 'financials',
+    'get_news': 'news',
+    'get_pe_ratio': 'pe_ratio',
+    'get_balance_sheet': 'balance_sheet',
+    'get_overview': 'pe_ratio',  # Shortest-lived part
+}
+UNCACHED_ENDPOINTS = {'health_check', 'get_stats'}
+OVERVIEW_DEADLINE = float(os.getenv("OVERVIEW_DEADLINE_SECONDS", 30))  # Longest wait for the slowest overview branch
+
+# Initialize database on startup
+init_db()
+
+# Pooled, batched storage for stock_info_cache
+STOCK_INFO_STORE = StockInfoStore(DB_PATH)
+
+# Refreshes of entries past their soft TTL, run after the stale copy was served
+STOCK_INFO_REFRESHER = BackgroundRefresher()
+STALE_IF_ERROR_SECONDS = int(os.getenv("STALE_IF_ERROR_SECONDS", 30 * 24 * 3600))  # Oldest copy served when upstream fails
+
+# Bounded, persistent cache for Claude responses shared by all StockAnalyzer instances
+ANALYZER_CACHE = ResponseCache(
+    DB_PATH,
+    max_entries=int(os.getenv("ANALYZER_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("ANALYZER_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+# Local SIC/sector peer index used by PolygonFinancials.get_industry_peers, filled in the background
+PEER_INDEX = PeerIndex(DB_PATH, POLYGON_API_KEY)
+PolygonFinancials.peer_index = PEER_INDEX
+
+# Local search index over every active ticker, refreshed with the peer index universe
+TICKER_SEARCH = TickerSearchIndex(DB_PATH)
+PEER_INDEX.universe_listeners.append(TICKER_SEARCH.replace)
+
+# Industry P/E statistics, updated whenever any ticker's P/E ratio is fetched
+INDUSTRY_PE_STORE = IndustryPEStore(DB_PATH)
+PolygonFinancials.industry_pe_store = INDUSTRY_PE_STORE
+
+# Hit rates of the price and P/E fallback strategies per ticker class, used to order and skip them
+STRATEGY_STATS = StrategyStats(DB_PATH)
+FallbackChain.learner = STRATEGY_STATS
+
+# Recent misses (unknown tickers, tickers without data, upstream errors), so they aren't re-fetched on every request
+NEGATIVE_CACHE = NegativeCache(DB_PATH)
+PolygonFinancials.negative_cache = NEGATIVE_CACHE
+# Negative cache keys of stock_info_cache entries fetched by a reduced version of a
+# PolygonFinancials lookup, so their misses don't block the full lookup
+NEGATIVE_KEYS = {'pe_ratio': 'quick_pe_ratio'}  # fetch_pe_ratio skips the manual calculation
+
+def negative_key(data_type):
+    """Negative cache data type for a stock_info_cache entry."""
+    return NEGATIVE_KEYS.get(data_type, data_type)
+
+# Shared rate limiter for the Claude API (all StockAnalyzer instances)
+CLAUDE_RATE_LIMITER = TokenBucketScheduler("claude", calls_per_minute=int(os.getenv("CLAUDE_CALLS_PER_MINUTE", 3)))
+
+# Collapses concurrent identical Claude prompts into a single API call
+CLAUDE_FLIGHTS = SingleFlight("claude")
+
+# Risk tolerances offered by the client, all answered by one risk analysis call
+RISK_TOLERANCES = ('conservative', 'moderate', 'aggressive')
+# Bump when the risk analysis prompt or response format changes
+RISK_ANALYSIS_SCHEMA_VERSION = 2
+
+def _quantize(value, digits: int = 2):
+    """Round a metric to a few significant digits so formatting noise doesn't change cache keys."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value == 0 or not math.isfinite(value):
+        return value
+    return float(f"{value:.{digits}g}")
+
+def _metric_fingerprint(financial_data: dict = None) -> tuple:
+    """Quantized (pe, industry pe, debt/equity, assets, liabilities) used for risk cache keys."""
+    if not financial_data:
+        return ()
+    balance_sheet = financial_data.get('balance_sheet') or {}
+    return (
+        _quantize(financial_data.get('pe_ratio')),
+        _quantize(financial_data.get('industry_pe_ratio')),
+        _quantize(balance_sheet.get('debt_to_equity')),
+        _quantize(balance_sheet.get('total_assets')),
+        _quantize(balance_sheet.get('total_liabilities')),
+    )
 
 class StockAnalyzer:
     """
     Handles AI-powered analysis of stock data using Claude API.
     Optimized to minimize API calls by combining prompts and using longer cache durations.
     """
-    def __init__(self, ai_client: anthropic.Anthropic):
+    def __init__(self, ai_client: anthropic.Anthropic, cache: ResponseCache = None):
         self.ai_client = ai_client
-        self.rate_limiter = RateLimiter(max_calls=3, time_period=60)  # More conservative rate limit
-        self.cache = {}  # Simple cache to store responses
+        self.rate_limiter = CLAUDE_RATE_LIMITER  # More conservative rate limit
+        self.cache = ANALYZER_CACHE if cache is None else cache  # Bounded LRU persisted to SQLite
         self.cache_ttl = 24 * 3600  # Increase cache TTL to 24 hours for most queries
     
     def _cache_key(self, method: str, params: tuple) -> str:
         """Generate a cache key from method name and parameters."""
         return f"{method}:{':'.join(str(p) for p in params)}"
     
-    def _cached_api_call(self, method_name: str, prompt: str, cache_ttl: int = None) -> str:
+    def _cached_api_call(self, method_name: str, prompt: str, cache_ttl: int = None, cache_key: str = None) -> str:
         """Make an API call with caching and rate limiting.
         
         Args:
             method_name: Name of the method making the call (for cache key)
             prompt: The prompt to send to the AI
-            cache_ttl: Cache time-to-live in seconds (defaults to self.cache_ttl)
+            cache_ttl: Cache time-to-live in seconds (defaults to the cache's TTL for the method)
+            cache_key: Optional structured cache key (defaults to method name and prompt)
             
         Returns:
             The AI's response text
         """
-        cache_key = self._cache_key(method_name, (prompt,))
-        cache_ttl = cache_ttl or self.cache_ttl
+        cache_key = cache_key or self._cache_key(method_name, (prompt,))
+        cache_ttl = cache_ttl or self.cache.ttl_for(method_name)
         
         # Check if we have a cached response
-        if cache_key in self.cache:
-            cached_time, cached_response = self.cache[cache_key]
+        cached = self.cache.get(cache_key)
+        if cached:
+            cached_time, cached_response = cached
             if time.time() - cached_time < cache_ttl:
                 return cached_response
         
+        # Share the call with any identical prompt already in flight
+        return CLAUDE_FLIGHTS.do(hash_key(cache_key), self._call_claude, cache_key, prompt)
+    
+    def _call_claude(self, cache_key: str, prompt: str) -> str:
+        """Send a prompt to Claude under the rate limiter and cache the response."""
         # Acquire rate limit permission
         self.rate_limiter.acquire()
         
@@ -181,34 +293,59 @@ class StockAnalyzer:
             }
 
     def analyze_risk_and_financials(self, ticker: str, risk_level: str = 'moderate', financial_data: dict = None) -> dict:
-        """Combined analysis of risk and financials in a single API call."""
+        """Combined analysis of risk and financials in a single API call.
+        
+        One Claude call returns assessments for every risk tolerance, cached on
+        (ticker, quantized metric fingerprint, schema version), so switching the
+        risk tolerance or re-formatting the same metrics never costs another call.
+        """
+        if risk_level not in RISK_TOLERANCES:
+            risk_level = 'moderate'
+        
+        metrics_fingerprint = _metric_fingerprint(financial_data)
         metrics = ""
-        if financial_data:
+        if metrics_fingerprint:
+            pe_ratio, industry_pe, debt_to_equity, total_assets, total_liabilities = (
+                'N/A' if value is None else value for value in metrics_fingerprint
+            )
             metrics = f"""
             Financial Metrics:
-            - P/E Ratio: {financial_data.get('pe_ratio', 'N/A')}
-            - Industry Average P/E: {financial_data.get('industry_pe_ratio', 'N/A')}
-            - Debt-to-Equity: {financial_data.get('balance_sheet', {}).get('debt_to_equity', 'N/A')}
-            - Total Assets: {financial_data.get('balance_sheet', {}).get('total_assets', 'N/A')}
-            - Total Liabilities: {financial_data.get('balance_sheet', {}).get('total_liabilities', 'N/A')}"""
+            - P/E Ratio: {pe_ratio}
+            - Industry Average P/E: {industry_pe}
+            - Debt-to-Equity: {debt_to_equity}
+            - Total Assets: {total_assets}
+            - Total Liabilities: {total_liabilities}"""
 
-        prompt = f"""Analyze {ticker} stock and provide a risk assessment and investment recommendation.
+        prompt = f"""Analyze {ticker} stock and provide a risk assessment and an investment recommendation
+        for each investor risk tolerance: conservative, moderate and aggressive.
         
         {metrics}
         
-        The user has a {risk_level} risk tolerance level.
-        
         Provide your response in JSON format with these keys:
         - risk_level: "low", "medium", or "high"
         - risk_factors: List of key risk factors (max 3)
-        - recommendation: Clear investment recommendation
-        - analysis: Brief analysis explanation
+        - assessments: Object with keys "conservative", "moderate" and "aggressive", each containing:
+          - recommendation: Clear investment recommendation for that risk tolerance
+          - analysis: Brief analysis explanation
         
         Only return the JSON object, no other text."""
         
+        cache_key = self._cache_key("analyze_risk_and_financials", (
+            ticker.upper(),
+            ','.join('' if value is None else repr(value) for value in metrics_fingerprint),
+            f"v{RISK_ANALYSIS_SCHEMA_VERSION}"
+        ))
+        
         try:
-            response = self._cached_api_call("analyze_risk_and_financials", prompt)
-            return json.loads(response)
+            response = self._cached_api_call("analyze_risk_and_financials", prompt, cache_key=cache_key)
+            analysis = json.loads(response)
+            assessment = analysis.get('assessments', {}).get(risk_level, {})
+            return {
+                "risk_level": analysis.get("risk_level", "medium"),
+                "risk_factors": analysis.get("risk_factors", []),
+                "recommendation": assessment.get("recommendation", "Please consult financial advisor"),
+                "analysis": assessment.get("analysis", "Analysis not available")
+            }
         except:
             return {
                 "risk_level": "medium",
@@ -235,6 +372,279 @@ class StockAnalyzer:
 
 # API Routes
 analyzer = StockAnalyzer(anthropic_client)
+company_profiles = CompanyProfileService(analyzer, POLYGON_API_KEY)
+
+# Upstream fetches behind the stock_info_cache routes. Each returns the data to
+# cache, or None when upstream had nothing usable, and can run in the background.
+def fetch_basic_info(ticker, risk_level):
+    # Build the profile from Polygon reference data (Claude only fills gaps);
+    # unknown tickers raise LookupError before any Claude call
+    data = company_profiles.get_profile(ticker)
+    data['risk'] = analyzer.analyze_risk_and_financials(ticker, risk_level)['risk_level']
+    data['risk_level'] = risk_level
+    return data
+
+def fetch_news(ticker):
+    news = get_news_from_motley_fool(ticker.upper())
+    if not news:
+        return None
+    return {'ticker': ticker.upper(), 'news': news}
+
+def fetch_pe_ratio(ticker):
+    # Create an instance without passing the analyzer to avoid industry lookups
+    # (sync facade over the async client and its shared connection pool)
+    financials = SyncPolygonFinancials(ticker.upper())
+    
+    # Only the direct API call and snapshot strategies of get_pe_ratio, raced and
+    # ordered by PE_CHAIN so their outcomes feed the learned strategy order
+    pe_ratio = financials.lookup_pe_ratio(manual=False)
+    if pe_ratio is None:
+        financials.record_miss(negative_key('pe_ratio'))  # not_found if the ticker details were missing
+        return None
+    financials.record_industry_pe(pe_ratio)
+    return {'ticker': ticker.upper(), 'pe_ratio': pe_ratio}
+
+def fetch_balance_sheet(ticker):
+    financials = SyncPolygonFinancials(ticker.upper())
+    balance_sheet = financials.format_balance_sheet(output_format='dict')
+    if not balance_sheet:
+        return None
+    return {'ticker': ticker.upper(), 'balance_sheet': balance_sheet}
+
+def _failure_reason(data_type, error):
+    """Negative cache reason for a failed fetch. Never the error text: Polygon URLs carry the API key."""
+    status = getattr(getattr(error, 'response', None), 'status_code', None) or getattr(error, 'status', None)
+    return f"{data_type} fetch failed ({status or type(error).__name__})"
+
+def refresh_stock_info(ticker, data_type, fetch, *args):
+    """Fetch data and cache it; returns the data or None.
+
+    Nothing is fetched while a miss is negatively cached. Failures and empty
+    results are negatively cached unless the fetch already recorded a miss.
+    """
+    if NEGATIVE_CACHE.get(ticker, negative_key(data_type)) is not None:
+        return None
+    try:
+        data = fetch(*args)
+    except Exception as e:
+        if NEGATIVE_CACHE.get(ticker, negative_key(data_type)) is None:
+            NEGATIVE_CACHE.put(ticker, negative_key(data_type), TRANSIENT, _failure_reason(data_type, e))
+        raise
+    if data is None:
+        if NEGATIVE_CACHE.get(ticker, negative_key(data_type)) is None:
+            NEGATIVE_CACHE.put(ticker, negative_key(data_type), NO_DATA, "No source returned data")
+        return None
+    NEGATIVE_CACHE.discard(ticker, negative_key(data_type))
+    cache_stock_info(ticker, data_type, data)
+    return data
+
+def negative_response(ticker, miss):
+    """Error response for a negatively cached miss, or None for no_data (the route's own empty answer)."""
+    if miss['kind'] == NOT_FOUND:
+        return jsonify({'error': f"Unknown ticker {ticker.upper()}", 'message': miss['reason']}), 404
+    if miss['kind'] == TRANSIENT:
+        response = jsonify({'error': 'Upstream temporarily unavailable', 'message': miss['reason']})
+        response.headers['Retry-After'] = str(miss['retry_after'])
+        return response, 503
+    return None
+
+def schedule_refresh(ticker, data_type, fetch, *args):
+    """Refresh a cache entry in the background (at most one refresh per entry at a time)."""
+    return STOCK_INFO_REFRESHER.schedule(
+        (ticker.upper(), data_type), refresh_stock_info, ticker, data_type, fetch, *args
+    )
+
+# Keeps the most requested tickers' entries fresh with leftover rate-limit budget
+HOT_REFRESH = PopularityRefresher(
+    STOCK_INFO_STORE, STOCK_INFO_REFRESHER, refresh_stock_info, limiters=(RATE_LIMITER, CLAUDE_RATE_LIMITER)
+)
+
+def warm_fetches(ticker):
+    """stock_info_cache entries warmed for a ticker on boot (what the client loads first)."""
+    return [
+        ('basic_info', fetch_basic_info, (ticker, 'moderate')),
+        ('pe_ratio', fetch_pe_ratio, (ticker,)),
+    ]
+
+# Restores the cache snapshot on boot and warms the trending tickers in the background
+CACHE_WARMUP = CacheWarmup(ANALYZER_CACHE, STOCK_INFO_STORE, HOT_REFRESH, refresh_stock_info, warm_fetches)
+
+_workers_started = False
+
+def start_background_workers():
+    """Start the background workers and register their shutdown hooks.
+
+    Called when the server starts rather than on import, so importing main (tests,
+    scripts) doesn't call Polygon or rewrite the cache database and snapshot on exit.
+    atexit runs the hooks in reverse order: the snapshot is dumped before the caches close.
+    """
+    global _workers_started
+    if _workers_started:
+        return
+    _workers_started = True
+    atexit.register(STOCK_INFO_STORE.close)
+    atexit.register(ANALYZER_CACHE.close)
+    PEER_INDEX.start()
+    atexit.register(PEER_INDEX.close)
+    atexit.register(TICKER_SEARCH.flush)
+    atexit.register(STRATEGY_STATS.flush)
+    atexit.register(NEGATIVE_CACHE.close)
+    HOT_REFRESH.start()
+    atexit.register(HOT_REFRESH.close)
+    CACHE_WARMUP.start()
+    atexit.register(CACHE_WARMUP.close)
+
+def serve_stock_info(ticker, data_type, fetch, *args):
+    """Response for a stock_info_cache route, serving stale data while it is refreshed.
+
+    Fresh entries are served from the cache. Expired entries (up to the store's
+    stale_seconds past expiry) are served immediately and refreshed in the background. Otherwise
+    fetch(*args) runs; if it fails or returns nothing, any cached copy up to
+    STALE_IF_ERROR_SECONDS old is served instead.
+
+    Returns:
+        Flask response, or None when there is neither data nor a cached copy
+    """
+    miss = NEGATIVE_CACHE.get(ticker, negative_key(data_type))
+    if miss is None:
+        HOT_REFRESH.record(ticker, data_type, fetch, *args)
+    cached_body = get_cached_response_body(ticker, data_type, stale_seconds=STOCK_INFO_STORE.stale_seconds)
+    if cached_body:
+        if time.time() < cached_body.expires:
+            return create_cache_response(cached_body, from_cache=True)
+        if miss is None:
+            schedule_refresh(ticker, data_type, fetch, *args)
+        return create_cache_response(cached_body, from_cache=True, stale='revalidating')
+    if miss is not None:
+        return negative_response(ticker, miss)
+    
+    try:
+        data = refresh_stock_info(ticker, data_type, fetch, *args)
+        error = None
+    except Exception as e:
+        data, error = None, e
+    if data is not None:
+        # The freshly cached body carries its expiry for Cache-Control
+        return create_cache_response(STOCK_INFO_STORE.get_body(ticker, data_type) or data, from_cache=False)
+    
+    # Upstream failed or is rate limited: an old copy beats an error
+    stale_body = get_cached_response_body(ticker, data_type, STALE_IF_ERROR_SECONDS)
+    if stale_body:
+        print(f"Serving stale {data_type} data for {ticker} after upstream failure: {error}")
+        return create_cache_response(stale_body, from_cache=True, stale='upstream-error')
+    # The fetch just recorded why it came back empty (unknown ticker, upstream error)
+    miss = NEGATIVE_CACHE.get(ticker, negative_key(data_type))
+    if miss is not None and miss['kind'] != NO_DATA:
+        return negative_response(ticker, miss)
+    if error is not None:
+        raise error
+    return None
+
+def load_stock_info(ticker, data_type, fetch, *args, served=None):
+    """Data for a stock_info_cache entry, following the same rules as serve_stock_info.
+
+    Args:
+        served: Optional dict; served[data_type] is set to True when the data came from the cache
+
+    Returns:
+        The data, or None when there is neither data nor a cached copy
+
+    Raises:
+        LookupError: The ticker is unknown or upstream recently failed (negatively cached)
+    """
+    miss = NEGATIVE_CACHE.get(ticker, negative_key(data_type))
+    if miss is None:
+        HOT_REFRESH.record(ticker, data_type, fetch, *args)
+    cached = STOCK_INFO_STORE.get_entry(ticker, data_type, stale_seconds=STOCK_INFO_STORE.stale_seconds)
+    if cached:
+        if time.time() >= cached[2] and miss is None:
+            schedule_refresh(ticker, data_type, fetch, *args)
+        if served is not None:
+            served[data_type] = True
+        return cached[0]
+    if miss is not None:
+        if miss['kind'] == NO_DATA:
+            return None
+        raise LookupError(f"{miss['kind']}: {miss['reason']}")
+    try:
+        data = refresh_stock_info(ticker, data_type, fetch, *args)
+    except Exception as e:
+        data = get_cached_stock_info(ticker, data_type, STALE_IF_ERROR_SECONDS)
+        if data is None:
+            raise
+        print(f"Using stale {data_type} data for {ticker} after upstream failure: {e}")
+        if served is not None:
+            served[data_type] = True
+    if data is None:
+        data = get_cached_stock_info(ticker, data_type, STALE_IF_ERROR_SECONDS)
+        if data is not None and served is not None:
+            served[data_type] = True
+    if data is None:
+        miss = NEGATIVE_CACHE.get(ticker, negative_key(data_type))
+        if miss is not None and miss['kind'] != NO_DATA:
+            raise LookupError(f"{miss['kind']}: {miss['reason']}")
+    return data
+
+def overview_tasks(ticker, risk_level='moderate', served=None):
+    """Sub-fetches of a stock overview as a dependency graph for run_graph().
+
+    Every part is independent except the risk analysis, which is given the
+    P/E ratio and balance sheet. Parts backed by stock_info_cache share its
+    entries (and their refreshes) with the single-part routes, and are marked
+    in the optional served dict when they were answered from it.
+    """
+    ticker = ticker.upper()
+    client = SyncPolygonFinancials(ticker, analyzer=analyzer)
+
+    def pe_ratio():
+        data = load_stock_info(ticker, 'pe_ratio', fetch_pe_ratio, ticker, served=served)
+        return data['pe_ratio'] if data else None
+
+    def balance_sheet():
+        data = load_stock_info(ticker, 'balance_sheet', fetch_balance_sheet, ticker, served=served)
+        return data['balance_sheet'] if data else None
+
+    def news():
+        data = load_stock_info(ticker, 'news', fetch_news, ticker, served=served)
+        return data['news'] if data else []
+
+    def risk(pe_ratio, balance_sheet):
+        financial_data = {'pe_ratio': pe_ratio, 'balance_sheet': balance_sheet}
+        return analyzer.analyze_risk_and_financials(ticker, risk_level, financial_data)
+
+    return {
+        'profile': (lambda: company_profiles.get_profile(ticker), ()),
+        'price': (client.get_current_price, ()),
+        'pe_ratio': (pe_ratio, ()),
+        'balance_sheet': (balance_sheet, ()),
+        'cash_flow': (lambda: client.format_cash_flow('dict'), ()),
+        'dividends': (client.get_dividend_history, ()),
+        'news': (news, ()),
+        'risk': (risk, ('pe_ratio', 'balance_sheet')),
+    }
+
+OVERVIEW_PARTS = ('profile', 'price', 'pe_ratio', 'balance_sheet', 'cash_flow', 'dividends', 'news', 'risk')
+
+def overview_response(ticker, parts, risk_level='moderate'):
+    """Run the named overview parts concurrently and build one response from them.
+
+    The response is marked X-From-Cache when every part was answered from stock_info_cache.
+    """
+    served = {}
+    tasks = overview_tasks(ticker, risk_level, served)
+    needed = set(parts)
+    for name in parts:
+        needed.update(tasks[name][1])
+    timings = {}
+    results, errors = run_graph({name: tasks[name] for name in needed}, OVERVIEW_DEADLINE, timings)
+    data = {'ticker': ticker.upper()}
+    data.update({name: results.get(name) for name in parts})
+    data['errors'] = {name: errors[name] for name in parts if name in errors}
+    data['timings_ms'] = timings
+    response = create_cache_response(data, from_cache=all(served.get(name) for name in parts))
+    if data['errors']:
+        response.cache_control.no_store = True  # Don't let clients keep a partial answer
+    return response
 
 @app.route('/api/ticker/<ticker>', methods=['GET'])
 def get_ticker_data(ticker: str):
@@ -242,75 +652,63 @@ def get_ticker_data(ticker: str):
     try:
         # Get risk_level from query parameters, default to 'moderate'
         risk_level = request.args.get('risk_level', 'moderate')
+        TICKER_SEARCH.record_hit(ticker)
         
         # Check cache first
-        cached_data = get_cached_stock_info(ticker, 'basic_info')
-        
-        if cached_data:
-            # If we have cached data but need to update the risk analysis due to different risk level
-            if cached_data.get('risk_level') != risk_level:
-                cached_data['risk'] = analyzer.analyze_risk_and_financials(ticker, risk_level)['risk_level']
-                cached_data['risk_level'] = risk_level
+        cached = STOCK_INFO_STORE.get_entry(ticker, 'basic_info', stale_seconds=STOCK_INFO_STORE.stale_seconds)
+        
+        # If we have cached data for a different risk level, the analysis for every
+        # tolerance is already cached by analyze_risk_and_financials (no upstream call)
+        if cached and cached[0].get('risk_level') != risk_level:
+            cached_data, cached_at, expires = cached
+            HOT_REFRESH.record(ticker, 'basic_info', fetch_basic_info, ticker, risk_level)
+            cached_data['risk'] = analyzer.analyze_risk_and_financials(ticker, risk_level)['risk_level']
+            cached_data['risk_level'] = risk_level
+            if time.time() < expires:
                 # Update cache with new risk analysis
                 cache_stock_info(ticker, 'basic_info', cached_data)
                 return create_cache_response(cached_data, from_cache=False)
-            
-            return create_cache_response(cached_data, from_cache=True)
-        
-        # If not in cache, fetch the data
-        data = analyzer.get_company_info(ticker)
-        data['risk'] = analyzer.analyze_risk_and_financials(ticker)['risk_level']
-        data['risk_level'] = risk_level
+            # Stale profile: don't make it look fresh, refresh it for this risk level instead
+            schedule_refresh(ticker, 'basic_info', fetch_basic_info, ticker, risk_level)
+            return create_cache_response(cached_data, from_cache=True, stale='revalidating', cached_at=cached_at)
         
-        # Cache the results
-        cache_stock_info(ticker, 'basic_info', data)
-            
-        return create_cache_response(data, from_cache=False)
+        # If not in cache, build the profile from Polygon reference data (Claude only fills gaps)
+        return serve_stock_info(ticker, 'basic_info', fetch_basic_info, ticker, risk_level)
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Error retrieving ticker data'}), 500
 
 @app.route('/api/financials/<ticker>', methods=['GET'])
 def get_financials(ticker: str):
-    """Get comprehensive financial data for a stock."""
+    """Get the P/E ratio and balance sheet of a stock (fetched concurrently)."""
     try:
-        # Check cache first
- 
-        # If not in cache, fetch the data
-        # get only pe ratio and balance sheet
-        pe_ratio = get_pe_ratio(ticker)
-        time.sleep(3)
-        balance_sheet = get_balance_sheet(ticker)
-        data = {
-            'pe_ratio': pe_ratio,
-            'balance_sheet': balance_sheet
-        }
-        
-        
-        # Cache the results
-        cache_stock_info(ticker, 'financials', data)
-        
-        return create_cache_response(data, from_cache=False)
+        return overview_response(ticker, ('pe_ratio', 'balance_sheet'))
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Error retrieving financial data'}), 500
 
+@app.route('/api/overview/<ticker>', methods=['GET'])
+def get_overview(ticker: str):
+    """Everything the client shows for a stock in one response.
+
+    Profile, price, P/E ratio, balance sheet, cash flow, dividends, news and risk
+    analysis are fetched concurrently, so the response takes about as long as the
+    slowest part. Parts that failed or missed the deadline are None and listed
+    under 'errors'.
+    """
+    try:
+        risk_level = request.args.get('risk_level', 'moderate')
+        TICKER_SEARCH.record_hit(ticker)
+        return overview_response(ticker, OVERVIEW_PARTS, risk_level)
+    except Exception as e:
+        return jsonify({'error': str(e), 'message': 'Error retrieving stock overview'}), 500
+
 @app.route('/api/news/<ticker>', methods=['GET'])
 def get_news(ticker: str):
     """Get latest news for a stock."""
     try:
-        # Check cache first
-        cached_data = get_cached_stock_info(ticker, 'news')
-        
-        if cached_data:
-            return create_cache_response(cached_data, from_cache=True)
-        
-        # If not in cache, fetch the data
-        news = analyzer.get_news(ticker.upper())
-        result = {'ticker': ticker, 'news': news}
-        
-        # Cache the results
-        cache_stock_info(ticker, 'news', result)
-        
-        return create_cache_response(result, from_cache=False)
+        response = serve_stock_info(ticker, 'news', fetch_news, ticker)
+        if response is None:
+            return create_cache_response({'ticker': ticker.upper(), 'news': []}, from_cache=False)
+        return response
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Error retrieving news'}), 500
 
@@ -318,35 +716,11 @@ def get_news(ticker: str):
 def get_pe_ratio(ticker: str):
     """Get only the P/E ratio for a specific stock without industry comparison."""
     try:
-        # Check cache first
-        cached_data = get_cached_stock_info(ticker, 'pe_ratio')
-        
-        if cached_data:
-            return create_cache_response(cached_data, from_cache=True)
-        
-        # Import the PolygonFinancials class directly
-        from get_pe_and_cash_flow import PolygonFinancials
-        
-        # Create an instance without passing the analyzer to avoid industry lookups
-        financials = PolygonFinancials(ticker.upper())
-        
-        # Get only the P/E ratio using the direct API call method
-        pe_ratio = financials._get_pe_from_ticker_details()
-        
-        # If that fails, try the snapshot method
-        if pe_ratio is None:
-            pe_ratio = financials._get_pe_from_snapshot()
-        
-        # Create a simple response object
-        data = {
-            'ticker': ticker.upper(),
-            'pe_ratio': pe_ratio
-        }
-        
-        # Cache the results
-        cache_stock_info(ticker, 'pe_ratio', data)
-        
-        return create_cache_response(data, from_cache=False)
+        response = serve_stock_info(ticker, 'pe_ratio', fetch_pe_ratio, ticker)
+        if response is None:
+            # Neither source had a P/E ratio and nothing is cached
+            return create_cache_response({'ticker': ticker.upper(), 'pe_ratio': None}, from_cache=False)
+        return response
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Error retrieving P/E ratio'}), 500
 
@@ -354,41 +728,100 @@ def get_pe_ratio(ticker: str):
 def get_balance_sheet(ticker: str):
     """Get only the balance sheet data for a specific stock."""
     try:
-        # Check cache first
-        cached_data = get_cached_stock_info(ticker, 'balance_sheet')
-        
-        if cached_data:
-            return create_cache_response(cached_data, from_cache=True)
-        
-        # Import the PolygonFinancials class directly
-        from get_pe_and_cash_flow import PolygonFinancials
-        
-        # Create an instance without passing the analyzer to avoid industry lookups
-        financials = PolygonFinancials(ticker.upper())
-        
-        # Get only the balance sheet data
-        balance_sheet = financials.format_balance_sheet(output_format='dict')
-        
-        if balance_sheet:
-            # Create a simple response object
-            data = {
-                'ticker': ticker.upper(),
-                'balance_sheet': balance_sheet
-            }
-            
-            # Cache the results
-            cache_stock_info(ticker, 'balance_sheet', data)
-            
-            return create_cache_response(data, from_cache=False)
-        else:
+        response = serve_stock_info(ticker, 'balance_sheet', fetch_balance_sheet, ticker)
+        if response is None:
             return jsonify({'error': 'No balance sheet data available', 'message': 'Could not retrieve balance sheet data'}), 404
+        return response
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Error retrieving balance sheet data'}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint that doesn't use Anthropic API."""
-    return jsonify({'status': 'ok', 'message': 'Service is running'})
+    warmup = CACHE_WARMUP.stats()
+    return jsonify({'status': 'ok', 'message': 'Service is running', 'cache': warmup['state'], 'warmup': warmup})
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Upstream usage counters: request coalescing, rate limiter queues and cache usage."""
+    return jsonify({
+        'singleflight': {
+            'polygon': POLYGON_FLIGHTS.stats(),
+            'claude': CLAUDE_FLIGHTS.stats()
+        },
+        'request_memo': MEMO_STATS.stats(),
+        'fallback_chains': {
+            'price': PRICE_CHAIN.stats(),
+            'pe_ratio': PE_CHAIN.stats()
+        },
+        'fallback_strategies': STRATEGY_STATS.stats(),
+        'negative_cache': NEGATIVE_CACHE.stats(),
+        'rate_limiters': {
+            'polygon': RATE_LIMITER.stats(),
+            'claude': CLAUDE_RATE_LIMITER.stats()
+        },
+        'analyzer_cache': ANALYZER_CACHE.stats(),
+        'stock_info_store': STOCK_INFO_STORE.stats(),
+        'stock_info_refresh': STOCK_INFO_REFRESHER.stats(),
+        'hot_refresh': HOT_REFRESH.stats(),
+        'cache_warmup': CACHE_WARMUP.stats(),
+        'company_profiles': company_profiles.stats(),
+        'peer_index': PEER_INDEX.stats(),
+        'industry_pe': INDUSTRY_PE_STORE.stats(),
+        'ticker_search': TICKER_SEARCH.stats()
+    })
+
+def _score_search_results(query, stocks):
+    """Add fuzzy match scores to search results and sort them best first."""
+    scored = []
+    for stock in stocks:
+        # Calculate fuzzy match score
+        ticker_score = fuzz.partial_ratio(query.lower(), stock["ticker"].lower())
+        name_score = fuzz.partial_ratio(query.lower(), stock["name"].lower() if stock["name"] else "")
+        
+        # Use the higher of the two scores
+        scored.append(dict(stock, match_score=max(ticker_score, name_score)))
+    
+    # Sort by match score (highest first)
+    scored.sort(key=lambda x: x["match_score"], reverse=True)
+    return scored
+
+def _refine_cached_search(cursor, query, cache_expiry):
+    """Answer a query from a cached broader query (a prefix of it) whose results were complete.
+    
+    Polygon matches the search text inside tickers and names, so every match for "appl"
+    is also a match for "app". When "app" returned fewer than STOCK_SEARCH_LIMIT rows its
+    result set was complete, and filtering it locally gives the full answer for "appl".
+    """
+    prefixes = [query[:n] for n in range(len(query) - 1, 0, -1)]
+    if not prefixes:
+        return None
+    cursor.execute(
+        f"SELECT query, results FROM stock_search_cache WHERE query IN ({','.join('?' * len(prefixes))}) AND timestamp > ?",
+        (*prefixes, cache_expiry)
+    )
+    # Longest (most specific) complete broader query first
+    for broader, results in sorted(cursor.fetchall(), key=lambda row: len(row['query']), reverse=True):
+        stocks = json.loads(results)
+        if len(stocks) < STOCK_SEARCH_LIMIT:
+            print(f"Refining cached search results for '{broader}' to '{query}'")
+            matches = [
+                stock for stock in stocks
+                if query in stock["ticker"].lower() or query in (stock["name"] or "").lower()
+            ]
+            return _score_search_results(query, matches)
+    return None
+
+def _store_search_results(cursor, query, stocks):
+    """Upsert search results and purge expired queries."""
+    cursor.execute(
+        "REPLACE INTO stock_search_cache (query, results, timestamp) VALUES (?, ?, CURRENT_TIMESTAMP)",
+        (query, json.dumps(stocks))
+    )
+    cursor.execute(
+        "DELETE FROM stock_search_cache WHERE timestamp <= ?",
+        (utc_timestamp(time.time() - STOCK_SEARCH_CACHE_TTL),)
+    )
 
 @app.route('/api/search/<query>', methods=['GET'])
 def search_stocks(query):
@@ -402,12 +835,16 @@ def search_stocks(query):
     Returns:
         JSON response with matching stocks
     """
+    # Rank locally once the ticker universe has been indexed (no upstream call)
+    if len(TICKER_SEARCH):
+        return create_cache_response(TICKER_SEARCH.search(query), from_cache=True)
+    
     # Check SQLite cache first
     conn = get_db_connection()
     cursor = conn.cursor()
     
     # Look for cached results that are less than 24 hours old
-    cache_expiry = datetime.now() - timedelta(seconds=STOCK_SEARCH_CACHE_TTL)
+    cache_expiry = utc_timestamp(time.time() - STOCK_SEARCH_CACHE_TTL)
     cursor.execute(
         "SELECT results FROM stock_search_cache WHERE query = ? AND timestamp > ?", 
         (query.lower(), cache_expiry)
@@ -420,42 +857,37 @@ def search_stocks(query):
         conn.close()
         return create_cache_response(json.loads(cached_result['results']), from_cache=True)
     
+    # A cached broader query may already contain every match
+    refined = _refine_cached_search(cursor, query.lower(), cache_expiry)
+    if refined is not None:
+        _store_search_results(cursor, query.lower(), refined)
+        conn.commit()
+        conn.close()
+        return create_cache_response(refined, from_cache=True)
+    
     try:
         # Call Polygon API to search for stocks
         results = polygon_client.list_tickers(
             search=query,
             market="stocks",
             active=True,
-            limit=20,
+            limit=STOCK_SEARCH_LIMIT,
             sort="ticker"
         )
         
         # Process results and add fuzzy matching scores
-        stocks = []
-        for ticker in results:
-            # Calculate fuzzy match score
-            ticker_score = fuzz.partial_ratio(query.lower(), ticker.ticker.lower())
-            name_score = fuzz.partial_ratio(query.lower(), ticker.name.lower() if ticker.name else "")
-            
-            # Use the higher of the two scores
-            match_score = max(ticker_score, name_score)
-            
-            stocks.append({
+        stocks = _score_search_results(query, [
+            {
                 "ticker": ticker.ticker,
                 "name": ticker.name,
                 "type": ticker.type,
-                "market": ticker.market,
-                "match_score": match_score
-            })
-        
-        # Sort by match score (highest first)
-        stocks.sort(key=lambda x: x["match_score"], reverse=True)
+                "market": ticker.market
+            }
+            for ticker in itertools.islice(results, STOCK_SEARCH_LIMIT)
+        ])
         
         # Cache the results in SQLite
-        cursor.execute(
-            "INSERT INTO stock_search_cache (query, results) VALUES (?, ?)",
-            (query.lower(), json.dumps(stocks))
-        )
+        _store_search_results(cursor, query.lower(), stocks)
         conn.commit()
         
         conn.close()
@@ -470,57 +902,102 @@ def search_stocks(query):
 def cache_stock_info(ticker, data_type, data):
     """Store stock information in the SQLite cache"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        import json
-        # Use REPLACE to update existing entries or insert new ones
-        cursor.execute(
-            "REPLACE INTO stock_info_cache (ticker, data_type, data) VALUES (?, ?, ?)",
-            (ticker.upper(), data_type, json.dumps(data))
-        )
-        
-        conn.commit()
-        conn.close()
+        # Queued and committed with other writes by the store's writer thread
+        STOCK_INFO_STORE.put(ticker, data_type, data)
         print(f"Cached {data_type} data for {ticker}")
     except Exception as e:
         print(f"Error caching stock info: {str(e)}")
 
 # Helper function to get cached stock info
-def get_cached_stock_info(ticker, data_type, max_age_seconds=86400):
-    """Retrieve stock information from the SQLite cache if available and not expired"""
+def get_cached_stock_info(ticker, data_type, max_age_seconds=None):
+    """Retrieve stock information from the cache if available and not expired (per-data-type TTL by default)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cache_expiry = datetime.now() - timedelta(seconds=max_age_seconds)
-        cursor.execute(
-            "SELECT data FROM stock_info_cache WHERE ticker = ? AND data_type = ? AND timestamp > ?", 
-            (ticker.upper(), data_type, cache_expiry)
-        )
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            import json
+        data = STOCK_INFO_STORE.get(ticker, data_type, max_age_seconds)
+        if data is not None:
             print(f"Using cached {data_type} data for {ticker}")
-            return json.loads(result['data'])
-        
+        return data
+    except Exception as e:
+        print(f"Error retrieving cached stock info: {str(e)}")
         return None
+
+# Helper function to get a cached response body
+def get_cached_response_body(ticker, data_type, max_age_seconds=None, stale_seconds=0):
+    """Retrieve cached stock information as pre-serialized response bytes if available and not expired"""
+    try:
+        body = STOCK_INFO_STORE.get_body(ticker, data_type, max_age_seconds, stale_seconds)
+        if body is not None:
+            print(f"Using cached {data_type} data for {ticker}")
+        return body
     except Exception as e:
         print(f"Error retrieving cached stock info: {str(e)}")
         return None
 
 # Helper function to create a response with cache headers
-def create_cache_response(data, from_cache=False):
-    """Create a Flask response with appropriate cache headers"""
-    response = jsonify(data)
+def create_cache_response(data, from_cache=False, stale=None, cached_at=None):
+    """Create a Flask response with appropriate cache headers
+
+    A ResponseBody is sent as is (in the smallest encoding the client accepts)
+    instead of being serialized again. Stale data is marked with X-Cache-Stale
+    (why it was served) and X-Cache-Age (seconds since it was cached).
+    """
+    if isinstance(data, ResponseBody):
+        content, encoding = data.encoded(request.accept_encodings)
+        response = app.response_class(content, mimetype='application/json')
+        # Each encoding is a different representation, so it gets its own strong ETag
+        response.set_etag(f"{data.etag}-{encoding}" if encoding else data.etag)
+        response.last_modified = datetime.fromtimestamp(data.last_modified, timezone.utc)
+        if data.expires is not None:
+            response.expires = datetime.fromtimestamp(data.expires, timezone.utc)
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    else:
+        response = jsonify(data)
     if from_cache:
         response.headers['X-From-Cache'] = 'true'
+    if stale:
+        cached_at = data.last_modified if isinstance(data, ResponseBody) else cached_at
+        response.headers['X-Cache-Stale'] = stale
+        response.headers['X-Cache-Age'] = str(int(time.time() - cached_at))
+        if response.last_modified is None:
+            response.last_modified = datetime.fromtimestamp(cached_at, timezone.utc)
     return response
 
+def _endpoint_ttl(endpoint):
+    """Server-side cache TTL of the data behind a route."""
+    if endpoint == 'search_stocks':
+        return STOCK_SEARCH_CACHE_TTL
+    return STOCK_INFO_STORE.ttl_for(ENDPOINT_DATA_TYPES.get(endpoint))
+
+@app.after_request
+def add_cache_validators(response):
+    """ETag, Last-Modified and Cache-Control on /api GET responses; 304 when the client's copy is current."""
+    if request.method != 'GET' or not request.path.startswith('/api/'):
+        return response
+    if response.status_code != 200 or request.endpoint in UNCACHED_ENDPOINTS or response.cache_control.no_store:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    if response.get_etag()[0] is None:
+        response.add_etag()  # Hash of the body
+    now = datetime.now(timezone.utc)
+    if response.last_modified is None:
+        response.last_modified = now
+    # Fresh for whatever is left of the server-side TTL, capped so clients re-check regularly
+    if response.expires is not None:
+        remaining = (response.expires - now).total_seconds()
+    else:
+        remaining = _endpoint_ttl(request.endpoint) - (now - response.last_modified).total_seconds()
+    max_age = int(max(0, min(remaining, CACHE_CONTROL_MAX_AGE)))
+    response.headers['Cache-Control'] = \
+        f"public, max-age={max_age}, stale-while-revalidate={CACHE_CONTROL_STALE_SECONDS}"
+    return response.make_conditional(request)
+
 if __name__ == "__main__":
+    # Railway stops the container with SIGTERM: exit normally so the atexit handlers
+    # (including the cache snapshot dump) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_background_workers()
     # Skip the initial test to avoid unnecessary API calls
     # Run Flask app
     port = int(os.environ.get("PORT", 5001))
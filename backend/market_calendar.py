@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+US equity trading calendar and the cache expiry policies built on it.
+Prices can't change while the market is closed, so a price cached in the
+evening or over a weekend stays fresh until the next session opens. Financial
+statements only change when a new quarterly filing comes out, so they stay
+fresh until the next filing is expected (based on the statement's
+filing_date / end_date), and are then re-checked daily until it arrives.
+"""
+import os
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+EASTERN = ZoneInfo("America/New_York")
+OPEN_TIME = dtime(9, 30)
+CLOSE_TIME = dtime(16, 0)
+EARLY_CLOSE_TIME = dtime(13, 0)
+
+PRICE_TTL = int(os.getenv("PRICE_TTL_MARKET_OPEN", 3600))  # Seconds a price is fresh while the market is open
+CLOSE_SETTLE_SECONDS = int(os.getenv("PRICE_CLOSE_SETTLE_SECONDS", 15 * 60))  # Wait after the close for final prices
+FILING_INTERVAL_DAYS = 91  # Quarterly reporting
+FILING_MIN_LAG_DAYS = int(os.getenv("FILING_MIN_LAG_DAYS", 25))  # Earliest a 10-Q usually follows its period end
+FILING_EARLY_DAYS = 14  # How much earlier than a quarter after the last filing the next one may come
+FUNDAMENTALS_MAX_TTL = int(os.getenv("FUNDAMENTALS_MAX_TTL", 100 * 24 * 3600))  # Upper bound for statement freshness
+FUNDAMENTALS_OVERDUE_TTL = int(os.getenv("FUNDAMENTALS_OVERDUE_TTL", 24 * 3600))  # Re-check interval once a filing is due
+FUNDAMENTALS_DEFAULT_TTL = 24 * 3600  # Statements without dates
+
+def _easter(year):
+    """Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th given weekday of a month (n=-1 for the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=32)
+def holidays(year):
+    """NYSE full-day holidays in a year."""
+    days = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:  # Not moved back into the previous year
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(days)
+
+@lru_cache(maxsize=32)
+def early_closes(year):
+    """Days the market closes at 1 pm."""
+    days = {
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # Day after Thanksgiving
+        date(year, 7, 3),
+        date(year, 12, 24),
+    }
+    return frozenset(d for d in days if is_trading_day(d))
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+def session(day):
+    """(open, close) of a trading day as aware datetimes, or None if the market is closed all day."""
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE_TIME if day in early_closes(day.year) else CLOSE_TIME
+    return (datetime.combine(day, OPEN_TIME, EASTERN), datetime.combine(day, close, EASTERN))
+
+def _eastern(when=None):
+    if when is None:
+        return datetime.now(EASTERN)
+    if isinstance(when, (int, float)):
+        return datetime.fromtimestamp(when, EASTERN)
+    return when.astimezone(EASTERN)
+
+def is_market_open(when=None):
+    """Whether the regular session is open at a time (epoch seconds, datetime or now)."""
+    when = _eastern(when)
+    hours = session(when.date())
+    return hours is not None and hours[0] <= when < hours[1]
+
+def next_open(when=None):
+    """Start of the first regular session after a time."""
+    when = _eastern(when)
+    day = when.date()
+    while True:
+        hours = session(day)
+        if hours is not None and hours[0] > when:
+            return hours[0]
+        day += timedelta(days=1)
+
+def price_expiry(written_at, value=None):
+    """When a price (or price-derived value) cached at written_at stops being fresh.
+
+    While the market is open (and shortly after the close, until the closing price
+    settles) prices are fresh for PRICE_TTL seconds; otherwise until the next open.
+    """
+    when = _eastern(written_at)
+    hours = session(when.date())
+    if hours is not None and hours[0] <= when < hours[1] + timedelta(seconds=CLOSE_SETTLE_SECONDS):
+        settled = hours[1].timestamp() + CLOSE_SETTLE_SECONDS
+        return min(written_at + PRICE_TTL, settled)
+    return next_open(when).timestamp()
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def next_filing_expected(filing_date=None, end_date=None):
+    """Earliest date the next quarterly statement is expected, or None without dates."""
+    end = _parse_date(end_date)
+    if end is not None:
+        return end + timedelta(days=FILING_INTERVAL_DAYS + FILING_MIN_LAG_DAYS)
+    filed = _parse_date(filing_date)
+    if filed is not None:
+        return filed + timedelta(days=FILING_INTERVAL_DAYS - FILING_EARLY_DAYS)
+    return None
+
+def statement_expiry(written_at, statement=None):
+    """When a financial statement cached at written_at stops being fresh.
+
+    Args:
+        written_at: Epoch seconds the statement was cached
+        statement: Dict with the statement's filing_date and/or end_date
+    """
+    statement = statement if isinstance(statement, dict) else {}
+    expected = next_filing_expected(statement.get('filing_date'), statement.get('end_date'))
+    if expected is None:
+        return written_at + FUNDAMENTALS_DEFAULT_TTL
+    expected_at = datetime.combine(expected, dtime(0, 0), EASTERN).timestamp()
+    if expected_at <= written_at:
+        # The next filing is due: check for it daily until it shows up
+        return written_at + FUNDAMENTALS_OVERDUE_TTL
+    return min(expected_at, written_at + FUNDAMENTALS_MAX_TTL)
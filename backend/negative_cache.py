@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Negative cache for lookups that came back empty.
+Typos, delisted tickers and tickers without financials otherwise walk the whole
+fallback chain (several rate-limited Polygon calls) on every request, because
+only successful answers are cached. Misses are recorded per ticker and data
+type with a TTL for each kind of miss:
+
+- not_found: Polygon does not know the ticker (covers every data type)
+- no_data: the ticker exists but no source had this data
+- transient_error: upstream failed; retried after a short pause
+
+not_found and no_data entries are persisted to SQLite so restarts don't
+forget them. Misses are recorded on the request path (including the async
+client's event loop), so they are written in batches by a background thread
+rather than by the caller.
+"""
+import os
+import threading
+import time
+
+from sqlite_tables import SQLiteTables
+
+NOT_FOUND = 'not_found'
+NO_DATA = 'no_data'
+TRANSIENT = 'transient_error'
+KIND_TTLS = {
+    NOT_FOUND: int(os.getenv("NEGATIVE_CACHE_NOT_FOUND_SECONDS", 24 * 3600)),  # Unknown tickers
+    NO_DATA: int(os.getenv("NEGATIVE_CACHE_NO_DATA_SECONDS", 3 * 3600)),  # Tickers without this data
+    TRANSIENT: int(os.getenv("NEGATIVE_CACHE_TRANSIENT_SECONDS", 60)),  # Upstream errors
+}
+MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", 10000))  # Entries kept in memory
+FLUSH_INTERVAL = float(os.getenv("NEGATIVE_CACHE_FLUSH_INTERVAL", 1.0))  # Max seconds a miss waits before it is persisted
+ANY_DATA_TYPE = '*'  # Data type of not_found entries, which cover every data type
+PERSISTED_KINDS = (NOT_FOUND, NO_DATA)
+
+class NegativeCache:
+    """Recent misses keyed by (ticker, data type), persisted to SQLite.
+
+    Args:
+        db_path: SQLite file used to persist the entries (None keeps them in memory only)
+        ttls: Seconds each kind of miss is remembered (defaults to KIND_TTLS)
+        max_entries: Entries kept in memory; the oldest are dropped first
+        flush_interval: Maximum seconds a persisted miss waits before it is written
+    """
+    def __init__(self, db_path=None, ttls=None, max_entries=MAX_ENTRIES, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.ttls = dict(KIND_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.entries = {}  # (ticker, data_type) -> (kind, reason, expires)
+        self.pending = {}  # (ticker, data_type) -> (kind, reason, expires) to write, or None to delete
+        self.lookups = 0
+        self.hits = {kind: 0 for kind in self.ttls}
+        self._stop = threading.Event()
+        self._writer = None
+        self.db = SQLiteTables(db_path, "negative cache", [
+            '''
+            CREATE TABLE IF NOT EXISTS negative_cache (
+                ticker TEXT NOT NULL,
+                data_type TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                reason TEXT,
+                expires REAL NOT NULL,
+                PRIMARY KEY (ticker, data_type)
+            )
+            ''',
+        ])
+
+        if self.db_path:
+            self.load()
+            self._writer = threading.Thread(target=self._write_loop, name="negative-cache-writer", daemon=True)
+            self._writer.start()
+
+    def load(self):
+        """Load unexpired entries from SQLite."""
+        rows = self.db.read(
+            "SELECT ticker, data_type, kind, reason, expires FROM negative_cache WHERE expires > ?", (time.time(),)
+        )
+        if rows is None:
+            return 0
+
+        with self.lock:
+            for ticker, data_type, kind, reason, expires in rows:
+                self.entries[(ticker, data_type)] = (kind, reason, expires)
+        return len(rows)
+
+    def _queue(self, key, entry):
+        """Queue a write (or a delete when entry is None) for the writer thread."""
+        if self.db_path:
+            with self.lock:
+                self.pending[key] = entry
+
+    def flush(self):
+        """Write the queued entries to SQLite now."""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            written = self.db.write(
+                ("INSERT OR REPLACE INTO negative_cache (ticker, data_type, kind, reason, expires) VALUES (?, ?, ?, ?, ?)",
+                 [key + entry for key, entry in batch.items() if entry is not None]),
+                ("DELETE FROM negative_cache WHERE ticker = ? AND data_type = ?",
+                 [key for key, entry in batch.items() if entry is None]),
+            )
+            if not written:
+                with self.lock:
+                    # Keep the batch unless a newer write for the same key arrived meanwhile
+                    for key, entry in batch.items():
+                        self.pending.setdefault(key, entry)
+                return 0
+            return len(batch)
+
+    def _write_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the writer, write the queued entries and close the connection."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(5)
+        self.flush()
+        self.db.close()
+
+    def get(self, ticker, data_type):
+        """The unexpired miss recorded for a ticker and data type, or None.
+
+        Returns:
+            Dictionary with kind, reason and retry_after (seconds until the entry expires)
+        """
+        ticker = ticker.upper()
+        now = time.time()
+        with self.lock:
+            self.lookups += 1
+            for key in ((ticker, ANY_DATA_TYPE), (ticker, data_type)):
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                kind, reason, expires = entry
+                if expires <= now:
+                    del self.entries[key]
+                    continue
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+                return {'kind': kind, 'reason': reason, 'retry_after': int(expires - now) + 1}
+        return None
+
+    def put(self, ticker, data_type, kind, reason=''):
+        """Record a miss. not_found misses apply to every data type of the ticker."""
+        ticker = ticker.upper()
+        if kind == NOT_FOUND:
+            data_type = ANY_DATA_TYPE
+        expires = time.time() + self.ttls[kind]
+        with self.lock:
+            self.entries.pop((ticker, data_type), None)
+            self.entries[(ticker, data_type)] = (kind, reason, expires)
+            if len(self.entries) > self.max_entries:
+                now = time.time()
+                for key in [key for key, entry in self.entries.items() if entry[2] <= now]:
+                    del self.entries[key]
+                while len(self.entries) > self.max_entries:
+                    del self.entries[next(iter(self.entries))]
+        print(f"Negative cache: {kind} for {ticker} {data_type} ({reason or 'no reason'})")
+        if kind in PERSISTED_KINDS:
+            self._queue((ticker, data_type), (kind, reason, expires))
+
+    def discard(self, ticker, data_type):
+        """Forget a miss once the data has been found."""
+        ticker = ticker.upper()
+        with self.lock:
+            entry = self.entries.pop((ticker, data_type), None)
+        if entry is not None and entry[0] in PERSISTED_KINDS:
+            self._queue((ticker, data_type), None)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self.lock:
+            entries = {kind: 0 for kind in self.ttls}
+            for kind, _, expires in self.entries.values():
+                if expires > now:
+                    entries[kind] = entries.get(kind, 0) + 1
+            return {
+                'entries': entries,
+                'lookups': self.lookups,
+                'hits': dict(self.hits),
+                'pending_writes': len(self.pending),
+                'ttls': dict(self.ttls),
+            }
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Local peer index built from Polygon reference data.
+Every active stock ticker is kept in memory (and in SQLite) with its SIC code,
+sector and market cap, grouped by SIC code and sector and ranked by market cap.
+Peer lookups are then a dictionary read instead of Claude calls plus paginated
+/v3/reference/tickers?sic_code=... requests for every ticker.
+
+The index fills in incrementally: a background thread lists the ticker universe
+and fetches details for a few tickers at a time at batch priority, and any
+ticker details fetched elsewhere (see PolygonFinancials.get_ticker_details) are
+added as they are seen.
+"""
+import os
+import threading
+import time
+
+from company_profile import sector_for_sic
+from get_pe_and_cash_flow import PolygonFinancials
+from rate_scheduler import request_priority, PRIORITY_BATCH
+from sqlite_tables import SQLiteTables
+
+# Refresh settings
+REFRESH_SECONDS = int(os.getenv("PEER_INDEX_REFRESH_SECONDS", 60))  # Seconds between refresh steps (0 disables)
+BATCH_SIZE = int(os.getenv("PEER_INDEX_BATCH_SIZE", 2))  # Ticker details fetched per refresh step
+DETAILS_MAX_AGE = int(os.getenv("PEER_INDEX_DETAILS_MAX_AGE", 30 * 24 * 3600))  # Re-fetch details after this long
+UNIVERSE_MAX_AGE = int(os.getenv("PEER_INDEX_UNIVERSE_MAX_AGE", 7 * 24 * 3600))  # Re-list tickers after this long
+
+class PeerIndex:
+    """In-memory SIC/sector peer groups ranked by market cap, persisted to SQLite.
+
+    Args:
+        db_path: SQLite file used to persist the index (None keeps it in memory only)
+        api_key: Polygon API key used by the background refresh
+        batch_size: Ticker details fetched per refresh step
+    """
+    def __init__(self, db_path=None, api_key=None, batch_size=BATCH_SIZE):
+        self.db_path = db_path
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.entries = {}  # ticker -> entry dict
+        self.by_sic = {}  # sic_code -> tickers ranked by market cap
+        self.by_sector = {}  # sector -> tickers ranked by market cap
+        self.unranked = set()  # Groups that changed since they were last sorted
+        self.dirty = set()  # Tickers changed since the last flush
+        self.universe_listed = 0  # When the ticker universe was last listed in full
+        self.universe_dirty = False  # universe_listed changed since the last flush
+        self.universe_listeners = []  # Called with every listed ticker after a complete universe listing (never a partial one)
+        self.lookups = 0
+        self.hits = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.db = SQLiteTables(db_path, "peer index", [
+            '''
+            CREATE TABLE IF NOT EXISTS peer_index (
+                ticker TEXT PRIMARY KEY,
+                name TEXT,
+                sic_code TEXT,
+                sector TEXT,
+                market_cap REAL,
+                listed REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_peer_index_sic_code ON peer_index (sic_code)',
+            # Index-wide values (when the universe was last listed in full)
+            '''
+            CREATE TABLE IF NOT EXISTS peer_index_meta (
+                key TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            )
+            ''',
+        ])
+
+        if self.db_path:
+            self.load()
+
+    def load(self):
+        """Load the persisted index into memory."""
+        rows = self.db.read("SELECT ticker, name, sic_code, sector, market_cap, listed, updated FROM peer_index")
+        meta = self.db.read("SELECT value FROM peer_index_meta WHERE key = 'universe_listed'")
+        if rows is None or meta is None:
+            return 0
+
+        with self.lock:
+            for ticker, name, sic_code, sector, market_cap, listed, updated in rows:
+                self._put({
+                    'ticker': ticker, 'name': name, 'sic_code': sic_code, 'sector': sector,
+                    'market_cap': market_cap, 'listed': listed, 'updated': updated,
+                })
+            self.dirty.clear()
+            # Not the newest entry's listed time: a partial listing stamps the entries it saw
+            self.universe_listed = meta[0][0] if meta else 0
+        print(f"Loaded {len(rows)} tickers into the peer index")
+        return len(rows)
+
+    def _put(self, entry):
+        """Insert or replace an entry and its group memberships. Must hold the lock."""
+        ticker = entry['ticker']
+        old = self.entries.get(ticker)
+        if old is not None:
+            for groups, key in ((self.by_sic, old['sic_code']), (self.by_sector, old['sector'])):
+                if key and ticker in groups.get(key, ()):
+                    groups[key].remove(ticker)
+        self.entries[ticker] = entry
+        for groups, key in ((self.by_sic, entry['sic_code']), (self.by_sector, entry['sector'])):
+            if key:
+                groups.setdefault(key, []).append(ticker)
+                self.unranked.add((id(groups), key))
+        self.dirty.add(ticker)
+
+    def _ranked(self, groups, key):
+        """Tickers in a group ordered by market cap, largest first. Must hold the lock."""
+        tickers = groups.get(key, [])
+        if (id(groups), key) in self.unranked:
+            tickers.sort(key=lambda t: self.entries[t]['market_cap'] or 0, reverse=True)
+            self.unranked.discard((id(groups), key))
+        return tickers
+
+    def observe(self, details):
+        """Add or update a ticker from a /v3/reference/tickers/{ticker} result."""
+        ticker = (details or {}).get('ticker')
+        if not ticker or not details.get('sic_code'):
+            return
+        if details.get('active') is False:
+            self.remove(ticker)
+            return
+        sic_code = str(details['sic_code'])
+        with self.lock:
+            old = self.entries.get(ticker, {})
+            self._put({
+                'ticker': ticker,
+                'name': details.get('name') or old.get('name'),
+                'sic_code': sic_code,
+                'sector': sector_for_sic(sic_code),
+                'market_cap': details.get('market_cap') or old.get('market_cap'),
+                'listed': old.get('listed') or time.time(),
+                'updated': time.time(),
+            })
+
+    def remove(self, ticker):
+        """Drop a ticker (e.g. delisted) from the index."""
+        with self.lock:
+            entry = self.entries.pop(ticker, None)
+            if entry is None:
+                return
+            for groups, key in ((self.by_sic, entry['sic_code']), (self.by_sector, entry['sector'])):
+                if key and ticker in groups.get(key, ()):
+                    groups[key].remove(ticker)
+            self.dirty.add(ticker)
+
+    def sic_code(self, ticker):
+        """SIC code of an indexed ticker, or None."""
+        with self.lock:
+            entry = self.entries.get(ticker.upper())
+            return entry['sic_code'] if entry else None
+
+    def peers(self, ticker, count=5):
+        """Largest companies sharing the ticker's SIC code, topped up from its sector.
+
+        Returns an empty list when the ticker's SIC code isn't indexed yet.
+        """
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(ticker.upper())
+            if not entry or not entry['sic_code']:
+                return []
+            peers = [t for t in self._ranked(self.by_sic, entry['sic_code']) if t != entry['ticker']][:count]
+            if len(peers) < count and entry['sector']:
+                for t in self._ranked(self.by_sector, entry['sector']):
+                    if len(peers) >= count:
+                        break
+                    if t != entry['ticker'] and t not in peers:
+                        peers.append(t)
+            if peers:
+                self.hits += 1
+            return peers
+
+    def flush(self):
+        """Write entries (and the universe listing time) changed since the last flush to SQLite."""
+        if not self.db_path:
+            return
+        with self.lock:
+            tickers = list(self.dirty)
+            self.dirty.clear()
+            rows = [self.entries[t] for t in tickers if t in self.entries]
+            removed = [(t,) for t in tickers if t not in self.entries]
+            meta = [('universe_listed', self.universe_listed)] if self.universe_dirty else []
+            self.universe_dirty = False
+        if not rows and not removed and not meta:
+            return
+        self.db.write(
+            ("INSERT OR REPLACE INTO peer_index (ticker, name, sic_code, sector, market_cap, listed, updated) "
+             "VALUES (:ticker, :name, :sic_code, :sector, :market_cap, :listed, :updated)", rows),
+            ("DELETE FROM peer_index WHERE ticker = ?", removed),
+            ("INSERT OR REPLACE INTO peer_index_meta (key, value) VALUES (?, ?)", meta),
+        )
+
+    def _request(self, url):
+        """Rate-limited, coalesced Polygon request (returns parsed JSON or None)."""
+        return PolygonFinancials('', self.api_key)._make_api_request(url, max_retries=1)
+
+    def refresh_universe(self):
+        """List every active stock ticker; new tickers wait for their details, missing ones are dropped.
+
+        Tickers are only dropped after a complete listing; a listing cut short by a failed
+        page keeps the existing entries and is retried on the next refresh.
+        """
+        started = time.time()
+        url = f"https://api.polygon.io/v3/reference/tickers?market=stocks&active=true&limit=1000&apiKey={self.api_key}"
+        seen = set()
+        listed = []
+        complete = True
+        while url:
+            data = self._request(url)
+            if data is None:  # Rate limited: keep what we have and list again on the next refresh
+                complete = False
+                break
+            with self.lock:
+                for item in data.get('results', []):
+                    ticker = item.get('ticker')
+                    if not ticker:
+                        continue
+                    seen.add(ticker)
+                    listed.append(item)
+                    entry = self.entries.get(ticker)
+                    if entry is None:
+                        self._put({
+                            'ticker': ticker, 'name': item.get('name'), 'sic_code': None, 'sector': None,
+                            'market_cap': None, 'listed': started, 'updated': 0,
+                        })
+                    else:
+                        entry['listed'] = started
+                        self.dirty.add(ticker)
+            next_url = data.get('next_url')
+            url = f"{next_url}&apiKey={self.api_key}" if next_url else None
+
+        # Only a complete listing says which tickers are gone
+        if complete and seen:
+            with self.lock:
+                for ticker in [t for t in self.entries if t not in seen]:
+                    self.remove(ticker)
+                self.universe_listed = started
+                self.universe_dirty = True
+        self.flush()
+        if complete and listed:  # Listeners replace their ticker lists, so they only get full listings
+            for listener in self.universe_listeners:
+                try:
+                    listener(listed)
+                except Exception as e:
+                    print(f"Error in peer index universe listener: {e}")
+        if not complete:
+            print(f"Peer index universe listing incomplete after {len(seen)} tickers, will retry")
+        else:
+            print(f"Peer index universe refreshed: {len(seen)} active tickers")
+        return len(seen)
+
+    def refresh_details(self, limit=None):
+        """Fetch details for the tickers whose SIC code and market cap are oldest."""
+        cutoff = time.time() - DETAILS_MAX_AGE
+        with self.lock:
+            stale = sorted((e for e in self.entries.values() if e['updated'] < cutoff), key=lambda e: e['updated'])
+            tickers = [e['ticker'] for e in stale[:limit or self.batch_size]]
+
+        for ticker in tickers:
+            try:
+                data = self._request(f"https://api.polygon.io/v3/reference/tickers/{ticker}?apiKey={self.api_key}") or {}
+                if data.get('results', {}).get('sic_code'):
+                    self.observe(data['results'])
+                    continue
+            except Exception as e:
+                print(f"Error refreshing peer index details for {ticker}: {e}")
+            # No SIC code (funds, warrants, ...) or the lookup failed: try again after DETAILS_MAX_AGE
+            with self.lock:
+                if ticker in self.entries:
+                    self.entries[ticker]['updated'] = time.time()
+                    self.dirty.add(ticker)
+        self.flush()
+        return len(tickers)
+
+    def refresh(self):
+        """One incremental refresh step."""
+        with request_priority(PRIORITY_BATCH):
+            if time.time() - self.universe_listed > UNIVERSE_MAX_AGE:
+                self.refresh_universe()
+            self.refresh_details()
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing peer index: {e}")
+
+    def start(self, interval=REFRESH_SECONDS):
+        """Start refreshing the index in a background thread."""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, args=(interval,), name="peer-index-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background refresh, flush pending entries and close the connection."""
+        self._stop.set()
+        self.flush()
+        self.db.close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'tickers': len(self.entries),
+                'classified': sum(1 for e in self.entries.values() if e['sic_code']),
+                'sic_codes': sum(1 for tickers in self.by_sic.values() if tickers),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'pending_writes': len(self.dirty),
+            }
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Priority-aware token-bucket rate limiting for upstream APIs (Claude, Polygon).
+Tokens refill continuously at the configured rate. Callers queue by priority
+class and are granted tokens in order (interactive > cache refresh > batch);
+nobody sleeps while holding the lock, and background classes can never take
+the tokens reserved for interactive requests. Usable from threads and coroutines.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+# Priority classes, lower value is served first
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the response
+PRIORITY_REFRESH = 1  # Refreshing a cache entry before it expires
+PRIORITY_BATCH = 2  # Precomputation / warmup work
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_REFRESH: 'refresh',
+    PRIORITY_BATCH: 'batch',
+}
+
+_current_priority = contextvars.ContextVar('request_priority', default=PRIORITY_INTERACTIVE)
+
+def current_priority() -> int:
+    """Priority class of the code currently running (interactive by default)."""
+    return _current_priority.get()
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """Run a block of upstream calls under the given priority class.
+
+    Example:
+        with request_priority(PRIORITY_REFRESH):
+            financials.get_pe_ratio()
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+class _Waiter:
+    """A queued acquire() call, woken through a threading.Event or an asyncio future."""
+    __slots__ = ('priority', 'seq', 'event', 'loop', 'future', 'granted', 'cancelled', 'enqueued')
+
+    def __init__(self, priority, seq, event=None, loop=None, future=None):
+        self.priority = priority
+        self.seq = seq
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        """Wake the waiter so it can re-check its state."""
+        if self.event is not None:
+            self.event.set()
+        elif not self.future.done():
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class TokenBucketScheduler:
+    """Token bucket with prioritized waiter queues.
+
+    Args:
+        name: Name used in logs and stats
+        calls_per_minute: Sustained rate of calls allowed
+        burst: Tokens any caller may use back to back after an idle period
+        reserve: Extra tokens only interactive requests may spend, so background
+            work always leaves headroom for the next user-facing call
+    """
+    def __init__(self, name: str, calls_per_minute: float, burst: int = 1, reserve: int = 1):
+        self.name = name
+        self.calls_per_minute = calls_per_minute
+        self.burst = burst
+        self.reserve = reserve
+        self.capacity = burst + reserve
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        self.waiters = []  # Heap of _Waiter ordered by (priority, seq)
+        self.seq = itertools.count()
+        self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_time = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.abandoned = 0  # Waiters that timed out or were cancelled
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self.calls_per_minute / 60.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _required_tokens(self, priority):
+        """Bucket level a caller of this priority needs before taking a token."""
+        return 1 if priority == PRIORITY_INTERACTIVE else 1 + self.reserve
+
+    def _not_before(self, now):
+        """Earliest time any token may be granted (extension point for upstream back-off)."""
+        return now
+
+    def _dispatch(self):
+        """Grant tokens to queued waiters in priority order. Must hold the lock.
+
+        Returns:
+            Seconds until the head of the queue could be served, or None if the queue is empty
+        """
+        now = time.monotonic()
+        self._refill(now)
+        not_before = self._not_before(now)
+        while self.waiters:
+            head = self.waiters[0]
+            if head.cancelled:
+                heapq.heappop(self.waiters)
+                continue
+            if not_before > now:
+                return not_before - now
+            needed = self._required_tokens(head.priority)
+            if self.tokens < needed:
+                return max((needed - self.tokens) / self.rate, 0.001)
+            self.tokens -= 1
+            heapq.heappop(self.waiters)
+            head.granted = True
+            name = PRIORITY_NAMES.get(head.priority, 'batch')
+            self.granted[name] += 1
+            self.wait_time[name] += now - head.enqueued
+            head.wake()
+        return None
+
+    def _enqueue(self, waiter):
+        heapq.heappush(self.waiters, waiter)
+        delay = self._dispatch()
+        # Wake whoever is now at the head so it drives the next dispatch
+        if self.waiters and not self.waiters[0].granted:
+            self.waiters[0].wake()
+        return delay
+
+    def _abandon(self, waiter):
+        """Withdraw a waiter that timed out or was cancelled. Must hold the lock."""
+        if waiter.granted:
+            # Token was granted but never used, give it back
+            self.tokens = min(self.capacity, self.tokens + 1)
+        waiter.cancelled = True
+        self.abandoned += 1
+        self._dispatch()
+
+    def try_acquire(self, priority: int = None) -> bool:
+        """Take a token without waiting. Returns False if none is available right now."""
+        priority = current_priority() if priority is None else priority
+        with self.lock:
+            waiter = _Waiter(priority, next(self.seq), event=threading.Event())
+            heapq.heappush(self.waiters, waiter)
+            self._dispatch()
+            if not waiter.granted:
+                waiter.cancelled = True
+            return waiter.granted
+
+    def has_spare_capacity(self, priority: int = PRIORITY_REFRESH) -> bool:
+        """Whether a caller of this priority would get a token right now without queueing behind anyone."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if any(not w.cancelled and not w.granted for w in self.waiters):
+                return False
+            return self._not_before(now) <= now and self.tokens >= self._required_tokens(priority)
+
+    def acquire(self, priority: int = None, timeout: float = None) -> bool:
+        """Block the calling thread until a token is granted.
+
+        Args:
+            priority: Priority class (defaults to the current request_priority())
+            timeout: Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            True if a token was granted, False on timeout
+        """
+        priority = current_priority() if priority is None else priority
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = _Waiter(priority, next(self.seq), event=threading.Event())
+        with self.lock:
+            delay = self._enqueue(waiter)
+
+        while True:
+            with self.lock:
+                if waiter.granted:
+                    return True
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._abandon(waiter)
+                    return False
+                delay = self._dispatch()
+                if waiter.granted:
+                    return True
+            wait = delay if delay is not None else 0.05
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            waiter.event.wait(wait)
+            waiter.event.clear()
+
+    async def acquire_async(self, priority: int = None, timeout: float = None) -> bool:
+        """Async version of acquire(); waits without blocking the event loop."""
+        priority = current_priority() if priority is None else priority
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = _Waiter(priority, next(self.seq), loop=loop, future=loop.create_future())
+        with self.lock:
+            delay = self._enqueue(waiter)
+
+        try:
+            while True:
+                with self.lock:
+                    if waiter.granted:
+                        return True
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self._abandon(waiter)
+                        return False
+                    delay = self._dispatch()
+                    if waiter.granted:
+                        return True
+                wait = delay if delay is not None else 0.05
+                if deadline is not None:
+                    wait = min(wait, max(deadline - time.monotonic(), 0))
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), wait)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.future = loop.create_future()
+        except asyncio.CancelledError:
+            with self.lock:
+                self._abandon(waiter)
+            raise
+
+    def stats(self) -> dict:
+        """Snapshot of the bucket and per-priority counters."""
+        with self.lock:
+            self._refill(time.monotonic())
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self.waiters:
+                if not waiter.cancelled and not waiter.granted:
+                    queued[PRIORITY_NAMES.get(waiter.priority, 'batch')] += 1
+            return {
+                'calls_per_minute': self.calls_per_minute,
+                'tokens': round(self.tokens, 3),
+                'capacity': self.capacity,
+                'queued': queued,
+                'granted': dict(self.granted),
+                'avg_wait_seconds': {
+                    name: round(self.wait_time[name] / self.granted[name], 3) if self.granted[name] else 0.0
+                    for name in self.granted
+                },
+                'abandoned': self.abandoned,
+            }
+
+def _parse_retry_after(value, now=None):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        retry_at = parsedate_to_datetime(value).timestamp()
+        return max(retry_at - (now or time.time()), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveTokenBucketScheduler(TokenBucketScheduler):
+    """Token bucket whose rate adapts to upstream feedback (AIMD).
+
+    Throttling (a 429 or an exhausted X-RateLimit-Remaining) halves the rate and
+    sets a shared "blocked until" deadline that every waiter respects, so no
+    thread fires requests that are doomed to fail. Successful calls made while
+    the bucket is the bottleneck raise the rate additively, up to max_calls_per_minute.
+
+    Args:
+        name: Name used in logs and stats
+        calls_per_minute: Starting rate
+        min_calls_per_minute: Floor the rate never drops below
+        max_calls_per_minute: Ceiling the rate never grows above
+        increase_step: Calls per minute added per successful call when demand exceeds the rate
+        decrease_factor: Multiplier applied to the rate on throttling
+        default_backoff: Seconds to block when a 429 carries no Retry-After header
+    """
+    def __init__(self, name: str, calls_per_minute: float, min_calls_per_minute: float = 1,
+                 max_calls_per_minute: float = 120, increase_step: float = 0.5,
+                 decrease_factor: float = 0.5, default_backoff: float = 2, **kwargs):
+        super().__init__(name, calls_per_minute, **kwargs)
+        self.min_calls_per_minute = min_calls_per_minute
+        self.max_calls_per_minute = max(max_calls_per_minute, calls_per_minute)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.default_backoff = default_backoff
+        self.blocked_until = 0.0  # time.monotonic() deadline shared by every caller
+        self.throttled = 0
+        self.successes = 0
+
+    def _not_before(self, now):
+        return max(now, self.blocked_until)
+
+    def _block_for(self, seconds):
+        """Block all callers for the given number of seconds. Must hold the lock."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+    def on_throttle(self, retry_after: float = None):
+        """Record a throttled response: back off multiplicatively and block until retry_after."""
+        with self.lock:
+            self.throttled += 1
+            self._refill(time.monotonic())
+            self.calls_per_minute = max(self.min_calls_per_minute, self.calls_per_minute * self.decrease_factor)
+            self._block_for(self.default_backoff if retry_after is None else retry_after)
+            print(f"{self.name} rate limited: backing off to {self.calls_per_minute:.1f} calls/min")
+
+    def on_success(self):
+        """Record a successful call: recover additively while the bucket is the bottleneck."""
+        with self.lock:
+            self.successes += 1
+            self._refill(time.monotonic())
+            if self.tokens < 1 or self.waiters:
+                self.calls_per_minute = min(self.max_calls_per_minute, self.calls_per_minute + self.increase_step)
+
+    def observe_headers(self, headers):
+        """Adjust to X-RateLimit-* headers from any upstream response."""
+        limit = headers.get('X-RateLimit-Limit')
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        try:
+            reset_in = None
+            if reset is not None:
+                reset = float(reset)
+                # Either an epoch timestamp or a number of seconds from now
+                reset_in = max(reset - time.time(), 0.0) if reset > 1e9 else reset
+            with self.lock:
+                if limit is not None and reset_in:
+                    # Never plan for more than the advertised quota
+                    window_limit = float(limit) * 60.0 / max(reset_in, 60.0)
+                    self.max_calls_per_minute = max(self.min_calls_per_minute, window_limit)
+                    self.calls_per_minute = min(self.calls_per_minute, self.max_calls_per_minute)
+                if remaining is not None and int(remaining) <= 0:
+                    self._block_for(reset_in if reset_in is not None else self.default_backoff)
+        except (TypeError, ValueError) as e:
+            print(f"Ignoring malformed rate limit headers: {e}")
+
+    def record_response(self, status_code: int, headers) -> float:
+        """Feed an upstream response back into the limiter.
+
+        Returns:
+            Seconds the caller should consider the upstream blocked (0 if the call wasn't throttled)
+        """
+        self.observe_headers(headers)
+        if status_code == 429:
+            retry_after = _parse_retry_after(headers.get('Retry-After'))
+            self.on_throttle(retry_after)
+            return self.default_backoff if retry_after is None else retry_after
+        if status_code < 400:
+            self.on_success()
+        return 0.0
+
+    def stats(self) -> dict:
+        data = super().stats()
+        with self.lock:
+            data.update({
+                'calls_per_minute': round(self.calls_per_minute, 2),
+                'min_calls_per_minute': self.min_calls_per_minute,
+                'max_calls_per_minute': round(self.max_calls_per_minute, 2),
+                'blocked_for_seconds': round(max(self.blocked_until - time.monotonic(), 0.0), 3),
+                'throttled': self.throttled,
+                'successes': self.successes,
+            })
+        return data
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Request-scoped memo of upstream responses.
+Within one request the same Polygon URL is often fetched several times
+(get_pe_ratio and its fallbacks all read the ticker details, the balance sheet
+and the cash flow both load the financials, ...). Inside a request_memo()
+block every upstream fetch is keyed by its normalized URL and each distinct key
+goes upstream at most once; repeats get the first response (or its exception).
+SingleFlight only shares calls that overlap in time, and the response caches
+outlive the request; the memo covers everything in between and is dropped when
+the block ends. The memo is a context variable, so it follows the request into
+fan-out threads and onto the background event loop.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+_current_memo = contextvars.ContextVar('request_memo', default=None)
+
+class RequestMemo:
+    """Upstream results of one request, keyed by normalized URL."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}  # key -> Future with the first fetch's result or exception
+        self.fetches = 0  # Distinct keys fetched
+        self.duplicates = 0  # Fetches answered from the memo
+
+    def _join(self, key):
+        """Return (future, is_first) for a key."""
+        with self.lock:
+            future = self.results.get(key)
+            if future is not None:
+                self.duplicates += 1
+                return future, False
+            future = self.results[key] = Future()
+            self.fetches += 1
+            return future, True
+
+    def _abandon(self, key, future, error):
+        """The first fetch was interrupted: let a later call fetch the key again."""
+        with self.lock:
+            if self.results.get(key) is future:
+                del self.results[key]
+        future.set_exception(error)
+
+    def do(self, key, fn, *args):
+        """fn(*args) the first time a key is requested, the memoized outcome afterwards."""
+        future, first = self._join(key)
+        if not first:
+            return future.result()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException as e:
+            self._abandon(key, future, e)
+            raise
+        future.set_result(result)
+        return result
+
+    async def do_async(self, key, coro_fn, *args):
+        """Async version of do(); coro_fn(*args) must return a coroutine."""
+        future, first = self._join(key)
+        if not first:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coro_fn(*args)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException as e:  # Cancelled
+            self._abandon(key, future, e)
+            raise
+        future.set_result(result)
+        return result
+
+class MemoStats:
+    """Totals over all finished request memos."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.fetches = 0
+        self.duplicates = 0
+
+    def add(self, memo):
+        with self.lock:
+            self.requests += 1
+            self.fetches += memo.fetches
+            self.duplicates += memo.duplicates
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'fetches': self.fetches,
+                'duplicates_eliminated': self.duplicates,
+            }
+
+MEMO_STATS = MemoStats()
+
+@contextmanager
+def request_memo():
+    """Memoize upstream fetches until the block ends. Nested blocks share the outermost memo."""
+    memo = _current_memo.get()
+    if memo is not None:
+        yield memo
+        return
+    memo = RequestMemo()
+    token = _current_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _current_memo.reset(token)
+        MEMO_STATS.add(memo)
+
+def with_request_memo(fn):
+    """Decorator running fn inside request_memo()."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with request_memo():
+            return fn(*args, **kwargs)
+    return wrapper
+
+def memoized(key, fn, *args):
+    """fn(*args) through the current request's memo (a plain call outside request_memo())."""
+    memo = _current_memo.get()
+    if memo is None:
+        return fn(*args)
+    return memo.do(key, fn, *args)
+
+async def memoized_async(key, coro_fn, *args):
+    """Async version of memoized()."""
+    memo = _current_memo.get()
+    if memo is None:
+        return await coro_fn(*args)
+    return await memo.do_async(key, coro_fn, *args)
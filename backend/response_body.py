@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Pre-serialized JSON response bodies for cached API responses.
+A body is encoded (and compressed) once when it is cached, together with a
+strong ETag, so serving a cache hit is a bytes copy instead of json.loads
+followed by jsonify. Brotli variants are only built if the brotli package is
+installed.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = int(os.getenv("RESPONSE_MIN_COMPRESS_SIZE", 1024))  # Smaller bodies are sent uncompressed
+
+class ResponseBody:
+    """Encoded JSON body with its ETag and compressed variants.
+
+    Args:
+        body: UTF-8 JSON bytes
+        last_modified: Epoch seconds when the data was cached (defaults to now)
+        expires: Epoch seconds when the data stops being fresh (None if unknown)
+    """
+    __slots__ = ('body', 'etag', 'last_modified', 'expires', 'gzip', 'br')
+
+    def __init__(self, body, last_modified=None, expires=None):
+        self.body = body
+        self.last_modified = time.time() if last_modified is None else last_modified
+        self.expires = expires
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()  # Strong ETag value, unquoted
+        self.gzip = None
+        self.br = None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.gzip = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.br = brotli.compress(body, quality=5)
+
+    @classmethod
+    def from_text(cls, text, last_modified=None, expires=None):
+        """Body from JSON text that is already serialized (e.g. a stock_info_cache row)."""
+        return cls(text.encode('utf-8'), last_modified, expires)
+
+    @classmethod
+    def from_data(cls, data, last_modified=None, expires=None):
+        return cls.from_text(json.dumps(data), last_modified, expires)
+
+    def encoded(self, accept_encodings):
+        """Smallest variant the client accepts.
+
+        Args:
+            accept_encodings: Parsed Accept-Encoding header (werkzeug Accept, e.g. request.accept_encodings);
+                encodings with q=0 are refused
+
+        Returns:
+            (bytes, content encoding or None)
+        """
+        if self.br is not None and accept_encodings['br'] > 0:
+            return self.br, 'br'
+        if self.gzip is not None and accept_encodings['gzip'] > 0:
+            return self.gzip, 'gzip'
+        return self.body, None
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Bounded, persistent cache for StockAnalyzer responses.
+Entries live in an in-memory LRU limited by entry count and approximate size,
+expire after a per-method TTL (or a per-method expiry policy, e.g. prices stay
+fresh until the market reopens), and are written behind to SQLite so warm
+restarts (and other worker processes) can serve earlier Claude answers
+instead of spending the rate-limited budget again. SQLite is only touched
+outside the cache lock, on pooled WAL connections, so memory hits never wait
+behind disk I/O; keys missing on disk are remembered for a few seconds.
+
+The cache behaves like the dict it replaces: values are (timestamp, value)
+tuples, so existing `key in cache` / `cache[key]` code keeps working.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from cache_store import connect
+from market_calendar import price_expiry, statement_expiry
+
+# Time-to-live per method (cache key prefix) in seconds
+DEFAULT_TTLS = {
+    'get_company_info': 7 * 24 * 3600,  # Company name/description rarely change
+    'get_similar_companies': 7 * 24 * 3600,
+    'profile': 7 * 24 * 3600,
+    'analyze_risk_and_financials': 24 * 3600,
+    'get_industry_pe_ratio': 24 * 3600,
+    'price': 3600,
+    'pe': 3600,
+    'financials': 24 * 3600,
+    'peers': 24 * 3600,
+    'industry_pe': 24 * 3600,
+}
+
+# Methods whose expiry depends on the value or the trading calendar: fn(timestamp, value) -> expiry epoch seconds
+DEFAULT_EXPIRY_POLICIES = {
+    'price': price_expiry,
+    'pe': price_expiry,
+    'financials': statement_expiry,
+}
+
+class ResponseCache(MutableMapping):
+    """LRU of (timestamp, value) entries with per-method TTLs and a SQLite write-behind tier.
+
+    Args:
+        db_path: SQLite file used as the persistent tier (None keeps the cache in memory only)
+        max_entries: Maximum number of entries kept in memory
+        max_bytes: Approximate maximum size of the in-memory values
+        ttls: Mapping of method name to TTL in seconds (merged over DEFAULT_TTLS)
+        default_ttl: TTL for methods not listed in ttls
+        expiry_policies: Mapping of method name to expiry policy fn(timestamp, value) -> expiry (merged over DEFAULT_EXPIRY_POLICIES)
+        flush_interval: Seconds between background writes to SQLite
+        miss_recheck: Seconds before SQLite is asked again for a key it didn't have
+        pool_size: SQLite connections kept open for reuse
+    """
+    def __init__(self, db_path=None, max_entries=10000, max_bytes=64 * 1024 * 1024,
+                 ttls=None, default_ttl=24 * 3600, flush_interval=5, expiry_policies=None,
+                 miss_recheck=5, pool_size=4):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        # An explicitly configured TTL replaces the default policy for that method
+        self.expiry_policies = {m: p for m, p in DEFAULT_EXPIRY_POLICIES.items() if m not in (ttls or {})}
+        self.expiry_policies.update(expiry_policies or {})
+        self.flush_interval = flush_interval
+        self.miss_recheck = miss_recheck
+        self.pool = queue.LifoQueue(maxsize=pool_size)  # Idle connections, most recently used first
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()  # key -> (timestamp, value, size)
+        self.size = 0
+        self.dirty = set()  # Keys written since the last flush
+        self.disk_misses = {}  # key -> when SQLite last didn't have it
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._stop = threading.Event()
+        self._flusher = None
+
+        if self.db_path:
+            self._init_table()
+            self.load()
+            self._flusher = threading.Thread(target=self._flush_loop, name="response-cache-flush", daemon=True)
+            self._flusher.start()
+
+    @staticmethod
+    def method_of(key: str) -> str:
+        """Method name a cache key belongs to ("get_company_info:..." or "price_AAPL")."""
+        if ':' in key:
+            return key.split(':', 1)[0]
+        return key.rsplit('_', 1)[0]
+
+    def ttl_for(self, key_or_method: str) -> int:
+        """TTL in seconds for a cache key or method name."""
+        if key_or_method in self.ttls:
+            return self.ttls[key_or_method]
+        return self.ttls.get(self.method_of(key_or_method), self.default_ttl)
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening a new one if none is idle."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_path)
+        try:
+            yield conn
+        finally:
+            try:
+                self.pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _init_table(self):
+        with self._connection() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS analyzer_cache (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                value TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                expires REAL NOT NULL
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_analyzer_cache_expires ON analyzer_cache (expires)')
+            conn.commit()
+
+    def expires_at(self, key, timestamp, value):
+        """Epoch seconds at which an entry stops being fresh."""
+        policy = self.expiry_policies.get(key) or self.expiry_policies.get(self.method_of(key))
+        if policy is not None:
+            try:
+                return policy(timestamp, value)
+            except Exception as e:
+                print(f"Error in cache expiry policy for {key}: {e}")
+        return timestamp + self.ttl_for(key)
+
+    def _expired(self, key, timestamp, value, now=None):
+        return (now or time.time()) >= self.expires_at(key, timestamp, value)
+
+    def _store(self, key, timestamp, value, size):
+        """Insert into the LRU and evict down to the limits. Must hold the lock.
+
+        Returns:
+            Evicted rows not yet on disk, for the caller to write after releasing the lock
+        """
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[2]
+        self.entries[key] = (timestamp, value, size)
+        self.size += size
+        unwritten = []
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= evicted[2]
+            self.evictions += 1
+            # Make sure an evicted entry still reaches disk
+            if evicted_key in self.dirty:
+                unwritten.append((evicted_key, evicted[0], evicted[1]))
+                self.dirty.discard(evicted_key)
+        return unwritten
+
+    def _load_one(self, key):
+        """Read a single entry from SQLite (another worker may have written it). Called without the lock."""
+        if not self.db_path:
+            return None
+        with self.lock:
+            checked = self.disk_misses.get(key)
+        if checked is not None and time.time() - checked < self.miss_recheck:
+            return None
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT value, timestamp FROM analyzer_cache WHERE key = ? AND expires > ?",
+                    (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading analyzer cache: {e}")
+            return None
+        if not row:
+            with self.lock:
+                if len(self.disk_misses) >= self.max_entries:
+                    self.disk_misses.clear()
+                self.disk_misses[key] = time.time()
+            return None
+        value = json.loads(row[0])
+        with self.lock:
+            self.disk_hits += 1
+            current = self.entries.get(key)
+            if current is not None and current[0] >= row[1]:
+                return current  # Set in memory while we were reading
+            unwritten = self._store(key, row[1], value, len(row[0]) + len(key))
+            entry = self.entries[key]
+        self._write_rows(unwritten)
+        return entry
+
+    def __getitem__(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            entry = self._load_one(key)
+        with self.lock:
+            if entry is None or self._expired(key, entry[0], entry[1]):
+                if entry is not None and self.entries.get(key) is entry:
+                    self.size -= entry[2]
+                    del self.entries[key]
+                self.misses += 1
+                raise KeyError(key)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def __setitem__(self, key, item):
+        timestamp, value = item
+        try:
+            size = len(json.dumps(value)) + len(key)
+        except (TypeError, ValueError):
+            size = len(repr(value)) + len(key)
+        with self.lock:
+            unwritten = self._store(key, timestamp, value, size)
+            self.dirty.add(key)
+            self.disk_misses.pop(key, None)
+        self._write_rows(unwritten)
+
+    def __delitem__(self, key):
+        with self.lock:
+            entry = self.entries.pop(key)
+            self.size -= entry[2]
+            self.dirty.discard(key)
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM analyzer_cache WHERE key = ?", (key,))
+                conn.commit()
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.entries))
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def _write_rows(self, rows):
+        """Upsert (key, timestamp, value) rows into SQLite."""
+        if not self.db_path or not rows:
+            return
+        records = []
+        for key, timestamp, value in rows:
+            try:
+                records.append((key, self.method_of(key), json.dumps(value), timestamp, self.expires_at(key, timestamp, value)))
+            except (TypeError, ValueError):
+                continue  # Not JSON-serializable, keep it in memory only
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO analyzer_cache (key, method, value, timestamp, expires) VALUES (?, ?, ?, ?, ?)",
+                    records
+                )
+                conn.execute("DELETE FROM analyzer_cache WHERE expires <= ?", (time.time(),))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing analyzer cache: {e}")
+
+    def flush(self):
+        """Write all entries changed since the last flush to SQLite."""
+        with self.lock:
+            rows = [(key, self.entries[key][0], self.entries[key][1]) for key in self.dirty if key in self.entries]
+            self.dirty.clear()
+        self._write_rows(rows)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def load(self):
+        """Fill the LRU with the most recent unexpired entries from SQLite."""
+        try:
+            with self._connection() as conn:
+                rows = conn.execute(
+                    "SELECT key, value, timestamp FROM analyzer_cache WHERE expires > ? ORDER BY timestamp DESC LIMIT ?",
+                    (time.time(), self.max_entries)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading analyzer cache: {e}")
+            return 0
+
+        with self.lock:
+            # Oldest first so the most recent entries end up most recently used
+            for key, value, timestamp in reversed(rows):
+                self._store(key, timestamp, json.loads(value), len(value) + len(key))
+        print(f"Loaded {len(rows)} analyzer cache entries from disk")
+        return len(rows)
+
+    def snapshot(self, methods=None, limit=None):
+        """Most recently used unexpired entries as (key, timestamp, value) rows, newest first.
+
+        Args:
+            methods: Only include entries of these methods (default: all)
+            limit: Maximum number of rows
+        """
+        now = time.time()
+        rows = []
+        with self.lock:
+            for key in reversed(self.entries):
+                if limit is not None and len(rows) >= limit:
+                    break
+                timestamp, value, _ = self.entries[key]
+                if methods is not None and self.method_of(key) not in methods:
+                    continue
+                if self._expired(key, timestamp, value, now):
+                    continue
+                try:
+                    json.dumps(value)
+                except (TypeError, ValueError):
+                    continue  # Memory-only entry (see _write_rows)
+                rows.append((key, timestamp, value))
+        return rows
+
+    def restore(self, rows):
+        """Add snapshot rows that are still fresh and newer than what is cached.
+
+        Returns:
+            Number of entries restored
+        """
+        restored = 0
+        now = time.time()
+        # Oldest first so the newest rows end up most recently used
+        for key, timestamp, value in reversed(list(rows)):
+            if self._expired(key, timestamp, value, now):
+                continue
+            with self.lock:
+                current = self.entries.get(key)
+                if current is not None and current[0] >= timestamp:
+                    continue
+            self[key] = (timestamp, value)
+            restored += 1
+        return restored
+
+    def close(self):
+        """Stop the background writer and flush pending entries."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(self.flush_interval + 1)
+        self.flush()
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'approx_bytes': self.size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'pending_writes': len(self.dirty),
+            }
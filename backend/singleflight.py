@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Request coalescing ("singleflight") for upstream calls.
+When several threads or coroutines ask for the same key at the same time, only
+the first one calls upstream; everyone else waits for and shares its result
+(or its exception). Sync and async callers of the same key share one flight.
+"""
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that don't change the upstream response
+IGNORED_PARAMS = {'apikey'}
+
+def normalize_url(url: str, method: str = 'GET') -> str:
+    """Build a coalescing key from a URL: drops the API key and sorts the query."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in IGNORED_PARAMS)
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+    return f"{method.upper()} {normalized}"
+
+def hash_key(*parts) -> str:
+    """Build a compact coalescing key from arbitrary text (e.g. a prompt)."""
+    return hashlib.sha256('\x00'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one upstream call."""
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.inflight = {}  # key -> concurrent.futures.Future shared by all waiters
+        self.tasks = set()  # Strong references to running async upstream calls
+        self.calls = 0  # Total calls made through this group
+        self.executions = 0  # Calls that actually went upstream
+        self.collapsed = 0  # Calls served by another caller's in-flight request
+        self.errors = 0  # Upstream executions that raised
+
+    def _join(self, key):
+        """Return (future, is_leader) for a key, registering a new flight if needed."""
+        with self.lock:
+            self.calls += 1
+            future = self.inflight.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future, False
+            future = Future()
+            self.inflight[key] = future
+            self.executions += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        """Remove the flight and hand the outcome to every waiter."""
+        with self.lock:
+            self.inflight.pop(key, None)
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) unless an identical call is already in flight."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """Async version of do(); coro_fn(*args, **kwargs) must return a coroutine.
+
+        The upstream call runs as its own task, so cancelling one waiter (even the
+        one that started it) doesn't cancel the call for everyone else.
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self.tasks.add(task)
+
+            def on_done(t):
+                self.tasks.discard(t)
+                if t.cancelled():
+                    self._finish(key, future, error=asyncio.CancelledError())
+                elif t.exception() is not None:
+                    self._finish(key, future, error=t.exception())
+                else:
+                    self._finish(key, future, t.result())
+            task.add_done_callback(on_done)
+
+        # Shield so a cancelled waiter doesn't cancel the shared future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> dict:
+        """Counters describing how much upstream work was saved."""
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'collapsed': self.collapsed,
+                'errors': self.errors,
+                'in_flight': len(self.inflight),
+            }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite persistence for the in-memory stores (negative cache, industry
+statistics, peer index, fallback strategy statistics).
+Each store keeps its data in memory, loads its tables once on start and writes
+changes in batches. They share the tuning of the cache database (WAL,
+synchronous=NORMAL, busy_timeout; see cache_store.connect) and keep one open
+connection each instead of connecting for every load and flush.
+"""
+import sqlite3
+import threading
+
+from cache_store import connect
+
+class SQLiteTables:
+    """One persistent connection to a store's tables, created on first use.
+
+    Args:
+        db_path: SQLite file holding the tables (None makes every read empty and every write a no-op)
+        name: What the tables hold, for error messages
+        schema: CREATE TABLE / CREATE INDEX statements run once at start
+    """
+    def __init__(self, db_path, name, schema=()):
+        self.db_path = db_path
+        self.name = name
+        self.lock = threading.Lock()  # The connection is shared by every thread using the store
+        self._conn = None
+        if self.db_path:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    for statement in schema:
+                        conn.execute(statement)
+
+    def _connection(self):
+        """The open connection. Must hold the lock."""
+        if self._conn is None:
+            self._conn = connect(self.db_path)
+        return self._conn
+
+    def read(self, sql, params=()):
+        """All rows of a query, or None if the tables can't be read."""
+        if not self.db_path:
+            return []
+        try:
+            with self.lock:
+                return self._connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading {self.name}: {e}")
+            return None
+
+    def write(self, *batches):
+        """Run (sql, rows) batches with executemany in one transaction. Returns whether it committed."""
+        if not self.db_path:
+            return True
+        try:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    for sql, rows in batches:
+                        if rows:
+                            conn.executemany(sql, rows)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error writing {self.name}: {e}")
+            return False
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
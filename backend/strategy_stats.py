@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Learned ordering for the fallback chains.
+Every strategy a FallbackChain runs is recorded as a hit or a miss together
+with its duration, per chain and per ticker class (ETFs, ADRs, recent IPOs,
+common stock, ...). Once a strategy has enough attempts for a class, the chain
+tries the strategies with the lowest expected time to an answer first and skips
+the ones that almost never answer for that class (an ETF's ticker details
+rarely carry a P/E ratio), so rate-limited calls go to the strategies likely to
+produce something. Skipped strategies are still tried now and then so the
+statistics can notice when they start answering again. The counts are
+persisted to SQLite next to the other caches.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlite_tables import SQLiteTables
+
+MIN_ATTEMPTS = int(os.getenv("STRATEGY_MIN_ATTEMPTS", 10))  # Attempts before a strategy's hit rate is trusted
+SKIP_BELOW = float(os.getenv("STRATEGY_SKIP_BELOW", 0.05))  # Skip strategies answering less often than this
+EXPLORE_EVERY = int(os.getenv("STRATEGY_EXPLORE_EVERY", 20))  # Every Nth run also tries the skipped strategies
+MAX_ATTEMPTS = int(os.getenv("STRATEGY_MAX_ATTEMPTS", 500))  # Counts are halved past this so old results fade
+MIN_SECONDS = 0.05  # Durations below this (memoized or cached answers) count as equal
+FLUSH_EVERY = 20  # Records between writes to SQLite
+RECENT_IPO_DAYS = 365  # Tickers listed more recently than this are classed as recent IPOs
+ALL_CLASSES = '*'  # Statistics over every ticker, used for tickers whose class is unknown
+
+# Polygon ticker types grouped into classes that behave alike upstream
+TYPE_CLASSES = {
+    'CS': 'stock',
+    'ETF': 'etf', 'ETN': 'etf', 'ETV': 'etf', 'ETS': 'etf', 'FUND': 'etf',
+    'ADRC': 'adr', 'ADRP': 'adr', 'ADRR': 'adr', 'ADRW': 'adr',
+}
+
+def ticker_class(details):
+    """Class of a ticker from its /v3/reference/tickers/{ticker} result, or None."""
+    ticker_type = (details or {}).get('type')
+    if not ticker_type:
+        return None
+    cls = TYPE_CLASSES.get(ticker_type, 'other')
+    list_date = details.get('list_date')
+    if cls == 'stock' and list_date:
+        try:
+            if datetime.strptime(list_date, '%Y-%m-%d') > datetime.now() - timedelta(days=RECENT_IPO_DAYS):
+                return 'recent_ipo'
+        except ValueError:
+            pass
+    return cls
+
+class StrategyStats:
+    """Per-chain, per-ticker-class strategy hit rates and durations, persisted to SQLite.
+
+    Args:
+        db_path: SQLite file used to persist the statistics (None keeps them in memory only)
+    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.counts = {}  # (chain, class, strategy) -> [attempts, successes, seconds]
+        self.classes = {}  # ticker -> class
+        self.runs = {}  # (chain, class) -> runs ordered
+        self.dirty = set()  # Keys changed since the last flush
+        self.dirty_classes = set()  # Tickers classified since the last flush
+        self.unflushed = 0  # Records since the last flush
+        self.skipped = 0  # Strategy calls saved by skipping
+        self.reordered = 0  # Runs whose order differed from the default
+
+        self.db = SQLiteTables(db_path, "fallback strategy statistics", [
+            '''
+            CREATE TABLE IF NOT EXISTS fallback_strategy_stats (
+                chain TEXT NOT NULL,
+                ticker_class TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                attempts REAL NOT NULL,
+                successes REAL NOT NULL,
+                seconds REAL NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (chain, ticker_class, strategy)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS ticker_classes (
+                ticker TEXT PRIMARY KEY,
+                ticker_class TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+            ''',
+        ])
+
+        if self.db_path:
+            self.load()
+
+    def load(self):
+        """Load the persisted statistics and ticker classes into memory."""
+        rows = self.db.read(
+            "SELECT chain, ticker_class, strategy, attempts, successes, seconds FROM fallback_strategy_stats"
+        )
+        classes = self.db.read("SELECT ticker, ticker_class FROM ticker_classes")
+        if rows is None or classes is None:
+            return 0
+
+        with self.lock:
+            for chain, cls, strategy, attempts, successes, seconds in rows:
+                self.counts[(chain, cls, strategy)] = [attempts, successes, seconds]
+            self.classes.update(classes)
+        return len(rows)
+
+    def flush(self):
+        """Write changed statistics and ticker classes to SQLite."""
+        if not self.db_path:
+            return
+        with self.lock:
+            rows = [(*key, *self.counts[key], time.time()) for key in self.dirty]
+            classes = [(ticker, self.classes[ticker], time.time()) for ticker in self.dirty_classes]
+            self.dirty.clear()
+            self.dirty_classes.clear()
+            self.unflushed = 0
+        if not rows and not classes:
+            return
+        self.db.write(
+            ("INSERT OR REPLACE INTO fallback_strategy_stats "
+             "(chain, ticker_class, strategy, attempts, successes, seconds, updated) VALUES (?, ?, ?, ?, ?, ?, ?)", rows),
+            ("INSERT OR REPLACE INTO ticker_classes (ticker, ticker_class, updated) VALUES (?, ?, ?)", classes),
+        )
+
+    def observe(self, details):
+        """Classify a ticker from a /v3/reference/tickers/{ticker} result."""
+        ticker = (details or {}).get('ticker')
+        cls = ticker_class(details)
+        if not ticker or not cls:
+            return
+        with self.lock:
+            if self.classes.get(ticker) != cls:
+                self.classes[ticker] = cls
+                self.dirty_classes.add(ticker)
+
+    def class_of(self, ticker):
+        """Known class of a ticker, or None."""
+        with self.lock:
+            return self.classes.get(ticker)
+
+    def record(self, chain, ticker, strategy, succeeded, seconds):
+        """Record one strategy outcome under the ticker's class and under all classes."""
+        with self.lock:
+            for cls in {self.classes.get(ticker) or ALL_CLASSES, ALL_CLASSES}:
+                key = (chain, cls, strategy)
+                counts = self.counts.setdefault(key, [0, 0, 0.0])
+                counts[0] += 1
+                counts[1] += 1 if succeeded else 0
+                counts[2] += seconds
+                if counts[0] > MAX_ATTEMPTS:
+                    self.counts[key] = [value / 2 for value in counts]
+                self.dirty.add(key)
+            self.unflushed += 1
+            flush = self.unflushed >= FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def _estimate(self, chain, cls, strategy):
+        """(hit rate, mean seconds) for a strategy, or None before MIN_ATTEMPTS. Must hold the lock."""
+        counts = self.counts.get((chain, cls, strategy))
+        if not counts or counts[0] < MIN_ATTEMPTS:
+            return None
+        attempts, successes, seconds = counts
+        return successes / attempts, seconds / attempts
+
+    def order(self, chain, ticker, strategies):
+        """Strategies to run for a ticker, most promising first, with the hopeless ones left out.
+
+        Strategies are ranked by expected seconds to an answer (mean duration over hit rate)
+        for the ticker's class, or over all tickers while its class is unknown. Strategies
+        without enough attempts are assumed to answer quickly until they are learned.
+        """
+        with self.lock:
+            cls = self.classes.get(ticker) or ALL_CLASSES
+            runs = self.runs[(chain, cls)] = self.runs.get((chain, cls), 0) + 1
+            ranked, skipped = [], []
+            for index, strategy in enumerate(strategies):
+                hit_rate, seconds = self._estimate(chain, cls, strategy[0]) or (1.0, 0.0)
+                score = (max(seconds, MIN_SECONDS) / max(hit_rate, 1e-6), index)
+                (ranked if hit_rate >= SKIP_BELOW else skipped).append((score, strategy))
+            if not ranked:  # Nothing is likely to answer: spend one call on the best bet
+                skipped.sort(key=lambda item: item[0])
+                ranked.append(skipped.pop(0))
+            ranked.sort(key=lambda item: item[0])
+            ordered = [strategy for _, strategy in ranked]
+            if runs % EXPLORE_EVERY == 0:
+                ordered += [strategy for _, strategy in skipped]
+            else:
+                self.skipped += len(skipped)
+            if [s[0] for s in ordered] != [s[0] for s in strategies]:
+                self.reordered += 1
+        return ordered
+
+    def stats(self) -> dict:
+        with self.lock:
+            rates = {}
+            for (chain, cls, strategy), (attempts, successes, seconds) in self.counts.items():
+                rates.setdefault(chain, {}).setdefault(cls, {})[strategy] = {
+                    'attempts': round(attempts, 1),
+                    'hit_rate': round(successes / attempts, 3) if attempts else None,
+                    'mean_seconds': round(seconds / attempts, 3) if attempts else None,
+                }
+            return {
+                'classified_tickers': len(self.classes),
+                'skipped_calls': self.skipped,
+                'reordered_runs': self.reordered,
+                'strategies': rates,
+            }
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled HTTP transport and the async Polygon client facade.
+Runs offline: no request is sent to Polygon.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+import http_pool
+from async_polygon import AsyncPolygonFinancials, SyncPolygonFinancials
+from get_pe_and_cash_flow import PolygonFinancials, _summarize_dividends
+
+def test_shared_session():
+    """Every PolygonFinancials instance should reuse the same pooled session."""
+    assert PolygonFinancials("AAPL").session is PolygonFinancials("MSFT").session
+    assert http_pool.get_session() is PolygonFinancials("AAPL").session
+
+def test_run_sync():
+    """Coroutines run on the background loop and exceptions reach the caller."""
+    async def add(a, b):
+        await asyncio.sleep(0)
+        return a + b
+
+    async def fail():
+        raise ValueError("boom")
+
+    assert http_pool.run_sync(add(1, 2)) == 3
+    try:
+        http_pool.run_sync(fail())
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+def test_aiohttp_session_per_loop():
+    """The aiohttp session is shared within the background loop."""
+    async def session_id():
+        return id(http_pool.get_aiohttp_session())
+
+    assert http_pool.run_sync(session_id()) == http_pool.run_sync(session_id())
+
+def test_sync_facade():
+    """The facade exposes coroutine methods as blocking calls."""
+    class FakeClient(AsyncPolygonFinancials):
+        async def get_current_price(self):
+            return 123.45
+
+    facade = SyncPolygonFinancials("AAPL")
+    facade._client = FakeClient("AAPL")
+    assert facade.ticker == "AAPL"
+    assert facade.get_current_price() == 123.45
+
+def test_summarize_dividends():
+    """Dividend summaries are shared by the sync and async clients."""
+    summary = _summarize_dividends([
+        {'pay_date': '2022-02-01', 'cash_amount': 0.2},
+        {'pay_date': '2023-02-01', 'cash_amount': 0.3},
+        {'pay_date': '2023-08-01', 'cash_amount': 0.3},
+    ])
+    assert summary['increasing'] is True
+    assert summary['annual_dividends'] == {'2022': 0.2, '2023': 0.6}
+
+if __name__ == "__main__":
+    test_shared_session()
+    test_run_sync()
+    test_aiohttp_session_per_loop()
+    test_sync_facade()
+    test_summarize_dividends()
+    print("All async Polygon tests passed")
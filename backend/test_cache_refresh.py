@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test script for background refreshes of stale cache entries.
+"""
+import threading
+import time
+
+from cache_refresh import BackgroundRefresher
+from rate_scheduler import current_priority, PRIORITY_REFRESH
+
+def test_refreshes_are_deduplicated():
+    refresher = BackgroundRefresher(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def refresh(key):
+        calls.append((key, current_priority()))
+        release.wait(5)
+
+    assert refresher.schedule("AAPL:news", refresh, "AAPL")
+    assert not refresher.schedule("AAPL:news", refresh, "AAPL")  # Already running
+    release.set()
+    time.sleep(0.1)
+    assert refresher.schedule("AAPL:news", refresh, "AAPL")  # Finished, may run again
+    time.sleep(0.1)
+
+    assert calls == [("AAPL", PRIORITY_REFRESH)] * 2
+    stats = refresher.stats()
+    assert stats["scheduled"] == 2 and stats["deduplicated"] == 1 and stats["completed"] == 2
+
+def test_failures_are_counted():
+    refresher = BackgroundRefresher(max_workers=1)
+
+    def fail():
+        raise RuntimeError("rate limited")
+
+    refresher.schedule("MSFT:pe_ratio", fail)
+    time.sleep(0.1)
+    stats = refresher.stats()
+    assert stats["failed"] == 1 and stats["running"] == 0
+
+if __name__ == "__main__":
+    test_refreshes_are_deduplicated()
+    test_failures_are_counted()
+    print("All cache refresh tests passed")
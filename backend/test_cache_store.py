@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test script for the two-tier (memory + pooled, batched SQLite) stock_info_cache storage engine.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from cache_store import StockInfoStore
+
+def test_read_your_writes_and_batching():
+    """Queued writes are visible immediately and committed together."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        store = StockInfoStore(db_path, flush_interval=60)
+        store.put("aapl", "basic_info", {"name": "Apple"})
+        store.put("MSFT", "basic_info", {"name": "Microsoft"})
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}
+        assert store.stats()["pending_writes"] == 2
+
+        assert store.flush() == 2
+        assert store.stats()["batches"] == 1
+        assert store.get("msft", "basic_info") == {"name": "Microsoft"}
+        store.close()
+
+        # Committed rows are visible to a plain connection
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM stock_info_cache").fetchone()[0] == 2
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+def test_expiry_and_delete():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"))
+        store.put("AAPL", "pe_ratio", {"pe_ratio": 28.5})
+        store.put("AAPL", "basic_info", {"name": "Apple"})
+        store.flush()
+        assert store.get("AAPL", "pe_ratio", max_age_seconds=-5) is None
+
+        store.delete("AAPL", "pe_ratio")
+        assert store.get("AAPL", "pe_ratio") is None
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}
+        store.delete("AAPL")
+        assert store.get("AAPL", "basic_info") is None
+        store.close()
+
+def test_concurrent_access():
+    """Many threads share a few pooled connections."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), pool_size=4, flush_interval=0.01)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    store.put(f"T{n}", "basic_info", {"i": i})
+                    assert store.get(f"T{n}", "basic_info") == {"i": i}
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        time.sleep(0.05)
+        assert not errors
+        assert store.get("T3", "basic_info") == {"i": 49}
+        assert store.stats()["idle_connections"] <= 4
+        store.close()
+
+def test_memory_tier():
+    """Hot entries are served from memory; the LRU is bounded and deletes reach both tiers."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        writer = StockInfoStore(db_path)
+        writer.put("AAPL", "basic_info", {"name": "Apple"})
+        writer.put("MSFT", "basic_info", {"name": "Microsoft"})
+        writer.close()
+
+        store = StockInfoStore(db_path, memory_entries=1)
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}  # From disk
+        cached = store.get("AAPL", "basic_info")  # From memory
+        assert store.stats()["disk_hits"] == 1 and store.stats()["memory_hits"] == 1
+        cached["name"] = "changed"  # Callers get their own copy
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}
+
+        store.get("MSFT", "basic_info")
+        assert store.stats()["memory_entries"] == 1  # AAPL evicted
+        store.delete("MSFT")
+        assert store.get("MSFT", "basic_info") is None
+        store.close()
+
+def test_data_type_ttls():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), ttls={"news": 0})
+        store.put("AAPL", "news", [{"title": "x"}])
+        store.put("AAPL", "basic_info", {"name": "Apple"})
+        assert store.ttl_for("pe_ratio") == 3600
+        assert store.get("AAPL", "news") is None  # Expired under its own TTL
+        assert store.get("AAPL", "news", max_age_seconds=60) == [{"title": "x"}]
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}
+        store.close()
+
+def test_entries_and_stale_reads():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        store = StockInfoStore(db_path, ttls={"news": 0})
+        store.put("AAPL", "pe_ratio", {"pe_ratio": 28.5})
+        data, written_at, expires = store.get_entry("AAPL", "pe_ratio")
+        assert data == {"pe_ratio": 28.5} and abs(written_at - time.time()) < 5 and expires > written_at
+        assert store.get_entry("MSFT", "pe_ratio") is None
+
+        store.put("AAPL", "news", [])
+        assert store.get("AAPL", "news") is None
+        assert store.get("AAPL", "news", stale_seconds=60) == []
+        store.close()
+
+def test_expiry_policies():
+    """Expiry can depend on the data (e.g. the next expected filing)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        policies = {"balance_sheet": lambda written_at, data: written_at + data["fresh_for"]}
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), expiry_policies=policies)
+        store.put("AAPL", "balance_sheet", {"fresh_for": 3600})
+        store.put("MSFT", "balance_sheet", {"fresh_for": -10})
+        assert store.get("AAPL", "balance_sheet") == {"fresh_for": 3600}
+        assert store.get("MSFT", "balance_sheet") is None
+        assert store.expires_at("news", None, 100) == 100 + store.ttl_for("news")
+        store.close()
+
+        # Also applied to entries read back from SQLite
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), expiry_policies=policies)
+        assert store.get("AAPL", "balance_sheet") == {"fresh_for": 3600}
+        assert store.get("MSFT", "balance_sheet") is None
+        store.close()
+
+def test_timestamps_are_utc():
+    """Rows are stamped in UTC like legacy CURRENT_TIMESTAMP rows, whatever the local time zone."""
+    old_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "America/New_York"
+    time.tzset()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "cache.db")
+            store = StockInfoStore(db_path)
+            store.put("AAPL", "pe_ratio", {"pe_ratio": 28.5})
+            store.close()
+
+            conn = sqlite3.connect(db_path)
+            conn.execute(
+                "INSERT INTO stock_info_cache (ticker, data_type, data) VALUES ('MSFT', 'basic_info', '{\"name\": \"Microsoft\"}')"
+            )
+            conn.commit()
+            written, now = conn.execute(
+                "SELECT timestamp, CURRENT_TIMESTAMP FROM stock_info_cache WHERE ticker = 'AAPL'"
+            ).fetchone()
+            conn.close()
+            assert written[:13] == now[:13]  # Same hour as SQLite's UTC clock
+
+            reloaded = StockInfoStore(db_path)
+            assert reloaded.get("MSFT", "basic_info", max_age_seconds=60) == {"name": "Microsoft"}
+            assert abs(reloaded.get_entry("MSFT", "basic_info")[1] - time.time()) < 60
+            assert reloaded.get("AAPL", "pe_ratio", max_age_seconds=60) == {"pe_ratio": 28.5}
+            reloaded.close()
+    finally:
+        if old_tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = old_tz
+        time.tzset()
+
+if __name__ == "__main__":
+    test_read_your_writes_and_batching()
+    test_expiry_and_delete()
+    test_concurrent_access()
+    test_memory_tier()
+    test_data_type_ttls()
+    test_entries_and_stale_reads()
+    test_expiry_policies()
+    test_timestamps_are_utc()
+    print("All cache store tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script for the cache snapshot and boot-time warmup.
+"""
+import os
+import tempfile
+import time
+
+from cache_refresh import BackgroundRefresher
+from cache_store import StockInfoStore
+from cache_warmup import CacheWarmup, read_snapshot
+from hot_refresh import PopularityRefresher
+from response_cache import ResponseCache
+
+def _caches(tmp, name):
+    cache = ResponseCache(ttls={"peers": 3600})
+    store = StockInfoStore(os.path.join(tmp, f"{name}.db"), ttls={"basic_info": 3600})
+    popularity = PopularityRefresher(store, BackgroundRefresher(), lambda *args: None, min_score=0.5)
+    return cache, store, popularity
+
+def _warmup(cache, store, popularity, path, calls):
+    def refresh(ticker, data_type, fetch, *args):
+        calls.append((ticker, data_type))
+        data = fetch(*args)
+        store.put(ticker, data_type, data)
+        return data
+    fetches_for = lambda ticker: [("basic_info", lambda t: {"ticker": t}, (ticker,))]
+    return CacheWarmup(cache, store, popularity, refresh, fetches_for, path=path)
+
+def test_snapshot_round_trip():
+    """Entries dumped on shutdown are back in memory after a restart with an empty database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.json.gz")
+        cache, store, popularity = _caches(tmp, "old")
+        cache["peers_AAPL"] = (time.time(), ["MSFT", "GOOGL"])
+        cache["peers_OLD"] = (time.time() - 7200, ["X"])  # Expired, not dumped
+        cache["analyze_risk_and_financials:abc"] = (time.time(), {"risk": "low"})  # Not a snapshot method
+        store.put("AAPL", "basic_info", {"name": "Apple"})
+        for _ in range(3):
+            popularity.record("AAPL", "basic_info", dict)
+        counts = _warmup(cache, store, popularity, path, []).dump()
+        assert counts == {"analyzer_cache": 1, "stock_info": 1, "popularity": 1}
+        assert read_snapshot(path)["version"] == 1
+        store.close()
+
+        cache, store, popularity = _caches(tmp, "new")
+        warmup = _warmup(cache, store, popularity, path, [])
+        assert warmup.restore() == {"analyzer_cache": 1, "stock_info": 1, "popularity": 1}
+        assert cache["peers_AAPL"][1] == ["MSFT", "GOOGL"]
+        assert store.get("AAPL", "basic_info") == {"name": "Apple"}
+        assert popularity.hottest() == ["AAPL"]
+        store.close()
+
+def test_warm_fetches_missing_entries():
+    """Warmup fetches what isn't cached, skips what is, and reports its state."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache, store, popularity = _caches(tmp, "cache")
+        calls = []
+        warmup = _warmup(cache, store, popularity, os.path.join(tmp, "missing.json.gz"), calls)
+        assert warmup.stats()["state"] == "cold"
+        store.put("NVDA", "basic_info", {"ticker": "NVDA"})
+
+        warmup.start(["NVDA", "TSLA"])
+        warmup._thread.join(5)
+        stats = warmup.stats()
+        assert stats["state"] == "warm"
+        assert (stats["warm_total"], stats["warmed"], stats["already_fresh"]) == (2, 1, 1)
+        assert calls == [("TSLA", "basic_info")]
+        assert "TSLA" in popularity.fetches  # Kept fresh by the hot refresher from now on
+        store.close()
+
+if __name__ == "__main__":
+    test_snapshot_round_trip()
+    test_warm_fetches_missing_entries()
+    print("All cache warmup tests passed")
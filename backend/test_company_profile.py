@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for building company profiles from Polygon reference data.
+"""
+import os
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from company_profile import CompanyProfileService, industry_for_sic, sector_for_sic
+
+class FakeAnalyzer:
+    """Stands in for StockAnalyzer and counts the Claude fallbacks."""
+    def __init__(self):
+        self.cache = {}
+        self.calls = 0
+
+    def get_company_info(self, ticker):
+        self.calls += 1
+        return {"name": f"{ticker} Inc.", "description": "From Claude.", "industry": "Widgets"}
+
+class StaticProfileService(CompanyProfileService):
+    """Serves canned ticker details instead of calling Polygon."""
+    def __init__(self, details, **kwargs):
+        super().__init__(**kwargs)
+        self.details = details
+        self.fetches = 0
+
+    def fetch_details(self, ticker):
+        self.fetches += 1
+        return dict(self.details)
+
+def test_sic_lookup():
+    """SIC codes map to an industry and a sector."""
+    assert industry_for_sic("3571") == "Industrial Machinery and Computer Equipment"
+    assert industry_for_sic("3571", "ELECTRONIC COMPUTERS") == "Electronic Computers"
+    assert sector_for_sic("3571") == "Manufacturing"
+    assert sector_for_sic("6022") == "Finance, Insurance and Real Estate"
+    assert industry_for_sic(None) is None and sector_for_sic("n/a") is None
+
+def test_profile_from_polygon():
+    """Complete reference data never reaches Claude and is cached."""
+    analyzer = FakeAnalyzer()
+    service = StaticProfileService({
+        "ticker": "AAPL",
+        "name": "Apple Inc.",
+        "description": "Apple designs phones. It also sells services. And more.",
+        "sic_code": "3571",
+        "sic_description": "ELECTRONIC COMPUTERS",
+    }, analyzer=analyzer)
+    profile = service.get_profile("aapl")
+    assert profile == {
+        "name": "Apple Inc.",
+        "description": "Apple designs phones. It also sells services.",
+        "industry": "Electronic Computers",
+        "sector": "Manufacturing",
+    }
+    assert analyzer.calls == 0
+
+    service.get_profile("AAPL")
+    assert service.fetches == 1
+    assert service.stats() == {"polygon_profiles": 1, "llm_fallbacks": 0}
+
+def test_claude_fills_missing_fields():
+    """Claude is only asked for the fields Polygon didn't provide."""
+    analyzer = FakeAnalyzer()
+    service = StaticProfileService({"ticker": "XYZ", "name": "XYZ", "sic_code": "7372"}, analyzer=analyzer)
+    profile = service.get_profile("XYZ")
+    assert analyzer.calls == 1
+    assert profile["name"] == "XYZ Inc."
+    assert profile["description"] == "From Claude."
+    assert profile["industry"] == "Software and Business Services"
+    assert profile["sector"] == "Services"
+
+if __name__ == "__main__":
+    test_sic_lookup()
+    test_profile_from_polygon()
+    test_claude_fills_missing_fields()
+    print("All company profile tests passed")
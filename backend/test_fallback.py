@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the hedged fallback chains.
+Runs offline: no request is sent to Polygon.
+"""
+import asyncio
+import os
+import threading
+import time
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from fallback import FallbackChain
+from get_pe_and_cash_flow import PolygonFinancials
+
+class FakeLimiter:
+    def __init__(self, spare):
+        self.spare = spare
+
+    def has_spare_capacity(self, priority):
+        return self.spare
+
+def test_invalid_answer_falls_through_immediately():
+    """A strategy that answers nothing hands over without waiting for the hedge delay."""
+    chain = FallbackChain("test", hedge_delay=5)
+    start = time.monotonic()
+    assert chain.run([('a', lambda: None), ('b', lambda: 1 / 0), ('c', lambda: 3)]) == 3
+    assert time.monotonic() - start < 1
+    assert chain.run([('a', lambda: None)]) is None
+    stats = chain.stats()
+    assert (stats['runs'], stats['answered'], stats['hedges'], stats['wins']) == (2, 1, 0, {'c': 1})
+
+def test_slow_strategy_is_hedged():
+    """The next strategy starts after the hedge delay and the first valid answer wins."""
+    release = threading.Event()
+
+    def slow():
+        release.wait(2)
+        return 'slow'
+
+    chain = FallbackChain("test", hedge_delay=0.1)
+    start = time.monotonic()
+    assert chain.run([('slow', slow), ('fast', lambda: 'fast')]) == 'fast'
+    assert 0.1 <= time.monotonic() - start < 1
+    release.set()
+    stats = chain.stats()
+    assert (stats['hedges'], stats['cancelled'], stats['wins']) == (1, 1, {'fast': 1})
+
+def test_no_hedge_without_spare_capacity():
+    """Without rate budget the chain waits for the running strategy instead of hedging."""
+    started = []
+
+    def slow():
+        time.sleep(0.3)
+        return 'slow'
+
+    chain = FallbackChain("test", hedge_delay=0.05, limiter=FakeLimiter(spare=False))
+    assert chain.run([('slow', slow), ('fast', lambda: started.append(1) or 'fast')]) == 'slow'
+    assert started == []
+    assert chain.stats()['hedges'] == 0
+    assert chain.stats()['hedges_skipped_no_budget'] >= 1
+
+def test_async_losers_are_cancelled():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return 'slow'
+
+    async def fast():
+        return 'fast'
+
+    chain = FallbackChain("test", hedge_delay=0.05, limiter=FakeLimiter(spare=True))
+
+    async def run():
+        result = await chain.run_async([('slow', slow), ('fast', fast)])
+        await asyncio.sleep(0)  # Let the cancellation land
+        return result
+
+    assert asyncio.run(run()) == 'fast'
+    assert cancelled == [1]
+    assert chain.stats()['cancelled'] == 1
+
+def test_pe_ratio_from_ticker_details():
+    """The top-level pe_ratio in the ticker details answers before the other strategies run."""
+    urls = []
+
+    class FakeFinancials(PolygonFinancials):
+        def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+            urls.append(url.split('?')[0])
+            return {'results': {'pe_ratio': 12.5}}
+
+    assert FakeFinancials("ZZZZ")._fetch_pe_ratio() == (12.5, False)
+    assert urls == ["https://api.polygon.io/v3/reference/tickers/ZZZZ"]
+
+if __name__ == "__main__":
+    test_invalid_answer_falls_through_immediately()
+    test_slow_strategy_is_hedged()
+    test_no_hedge_without_spare_capacity()
+    test_async_losers_are_cancelled()
+    test_pe_ratio_from_ticker_details()
+    print("All fallback chain tests passed")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the deadline-bounded fan-out and the parallel industry P/E.
+"""
+import asyncio
+import os
+import threading
+import time
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from fanout import fan_out, fan_out_async, run_graph
+from get_pe_and_cash_flow import PolygonFinancials
+
+def test_fan_out_parallel_and_bounded():
+    """Calls run concurrently but never more than max_parallel at once."""
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+
+    def work(item):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        return item * 2
+
+    start = time.monotonic()
+    results, partial = fan_out(work, [1, 2, 3, 4, 5, 6], max_parallel=3)
+    assert results == {1: 2, 2: 4, 3: 6, 4: 8, 5: 10, 6: 12}
+    assert not partial
+    assert active[1] == 3
+    assert time.monotonic() - start < 0.5  # Two waves of 0.1s, not six
+
+def test_fan_out_deadline():
+    """Slow items are left behind when the deadline passes; failures are dropped."""
+    def work(item):
+        if item == "fail":
+            raise ValueError("no data")
+        time.sleep(1 if item == "slow" else 0.01)
+        return item
+
+    start = time.monotonic()
+    results, partial = fan_out(work, ["a", "slow", "fail", "b"], max_parallel=4, deadline=0.3)
+    assert time.monotonic() - start < 0.8
+    assert results == {"a": "a", "b": "b"}
+    assert partial
+
+def test_fan_out_async_deadline():
+    async def work(item):
+        await asyncio.sleep(1 if item == "slow" else 0.01)
+        return item.upper()
+
+    results, partial = asyncio.run(fan_out_async(work, ["a", "slow", "b"], max_parallel=2, deadline=0.3))
+    assert results == {"a": "A", "b": "B"}
+    assert partial
+
+def test_run_graph_dependencies():
+    """Independent calls run concurrently; a call gets its dependencies' results (None if they failed)."""
+    def slow(value):
+        def call(**kwargs):
+            time.sleep(0.2)
+            return value
+        return call
+
+    def fail():
+        raise ValueError("boom")
+
+    timings = {}
+    start = time.monotonic()
+    results, errors = run_graph({
+        "a": (slow(1), ()),
+        "b": (slow(2), ()),
+        "c": (slow(3), ()),
+        "bad": (fail, ()),
+        "sum": (lambda a, b, bad: a + b + (bad or 0), ("a", "b", "bad")),
+    }, timings=timings)
+    elapsed = time.monotonic() - start
+    assert results == {"a": 1, "b": 2, "c": 3, "sum": 3}
+    assert errors == {"bad": "boom"}
+    assert elapsed < 0.35  # About the slowest branch, not the sum
+    assert set(timings) == {"a", "b", "c", "bad", "sum"}
+
+def test_run_graph_deadline_and_cycles():
+    results, errors = run_graph({
+        "fast": (lambda: 1, ()),
+        "slow": (lambda: time.sleep(0.5), ()),
+        "after_slow": (lambda slow: 2, ("slow",)),
+    }, deadline=0.1)
+    assert results == {"fast": 1}
+    assert errors == {"slow": "Timed out", "after_slow": "Timed out"}
+
+    results, errors = run_graph({"x": (lambda y: 1, ("y",)), "y": (lambda x: 2, ("x",))})
+    assert results == {} and set(errors.values()) == {"Dependency cycle"}
+
+class CachedAnalyzer:
+    """Stands in for StockAnalyzer with only a cache."""
+    def __init__(self):
+        self.cache = {}
+
+class StaticPeers(PolygonFinancials):
+    def get_industry_peers(self):
+        return ["AAPL", "DELL", "HPQ", "BAD"]
+
+def test_industry_pe_reuses_cached_peer_pe():
+    """Cached peer P/E ratios are used without any upstream call and the result is cached."""
+    analyzer = CachedAnalyzer()
+    now = time.time()
+    for peer, pe in (("DELL", 20.0), ("HPQ", 10.0), ("BAD", 500.0)):
+        analyzer.cache[f"pe_{peer}"] = (now, pe)
+
+    summary = StaticPeers("AAPL", analyzer=analyzer).get_industry_pe_summary()
+    assert summary["industry_pe_ratio"] == 15.0
+    assert summary["peer_pe_ratios"] == {"DELL": 20.0, "HPQ": 10.0}
+    assert summary["partial"] is False
+    assert analyzer.cache["industry_pe_AAPL"][1] == 15.0
+    assert StaticPeers("AAPL", analyzer=analyzer).get_industry_pe_ratio() == 15.0
+
+if __name__ == "__main__":
+    test_fan_out_parallel_and_bounded()
+    test_fan_out_deadline()
+    test_fan_out_async_deadline()
+    test_run_graph_dependencies()
+    test_run_graph_deadline_and_cycles()
+    test_industry_pe_reuses_cached_peer_pe()
+    print("All fan-out tests passed")
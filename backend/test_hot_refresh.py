@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script for the popularity-driven refresh of hot tickers.
+"""
+import os
+import tempfile
+import time
+
+from cache_refresh import BackgroundRefresher
+from cache_store import StockInfoStore
+from hot_refresh import PopularityRefresher
+from rate_scheduler import TokenBucketScheduler, PRIORITY_INTERACTIVE
+
+def _refresh_into(store, calls):
+    def refresh(ticker, data_type, fetch, *args):
+        calls.append((ticker, data_type))
+        data = fetch(*args)
+        store.put(ticker, data_type, data)
+        return data
+    return refresh
+
+def test_hot_entries_refreshed_before_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), ttls={"news": 60})
+        calls = []
+        hot = PopularityRefresher(store, BackgroundRefresher(), _refresh_into(store, calls),
+                                  per_minute=60, lead_seconds=120, min_score=2)
+        fetch = lambda ticker: {"ticker": ticker}
+        store.put("AAPL", "news", {"ticker": "AAPL"})
+        store.put("MSFT", "news", {"ticker": "MSFT"})
+        for _ in range(3):
+            hot.record("AAPL", "news", fetch, "AAPL")
+        hot.record("MSFT", "news", fetch, "MSFT")  # Not requested often enough
+        assert hot.hottest() == ["AAPL"]
+
+        assert hot.step() == 1
+        time.sleep(0.2)
+        assert calls == [("AAPL", "news")]
+        assert hot.stats()["completed"] == 1
+
+        # A request after the old entry's expiry counts as a prevented miss
+        replaced, refreshed = hot.refreshed[("AAPL", "news")]
+        hot.refreshed[("AAPL", "news")] = (time.time() - 1, refreshed)
+        hot.record("AAPL", "news", fetch, "AAPL")
+        assert hot.stats()["prevented_misses"] == 1
+        store.close()
+
+def test_refresh_waits_for_spare_capacity():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"), ttls={"news": 0})
+        limiter = TokenBucketScheduler("upstream", calls_per_minute=1, burst=1, reserve=1)
+        calls = []
+        hot = PopularityRefresher(store, BackgroundRefresher(), _refresh_into(store, calls),
+                                  limiters=[limiter], min_score=0.5)
+        store.put("AAPL", "news", {})
+        hot.record("AAPL", "news", dict)
+
+        assert limiter.try_acquire(PRIORITY_INTERACTIVE)  # Only the interactive reserve is left
+        assert hot.step() == 0
+        assert hot.stats()["skipped_no_budget"] == 1
+        assert calls == []
+        store.close()
+
+if __name__ == "__main__":
+    test_hot_entries_refreshed_before_expiry()
+    test_refresh_waits_for_spare_capacity()
+    print("All hot refresh tests passed")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared industry P/E statistics.
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from industry_stats import IndustryPEStore, industry_key, trimmed_mean
+from get_pe_and_cash_flow import PE_FALLBACKS, PolygonFinancials
+from peer_index import PeerIndex
+from response_cache import ResponseCache
+
+def test_statistics_update_incrementally():
+    """Mean, median and trimmed mean follow every recorded member P/E."""
+    store = IndustryPEStore()
+    key = industry_key("3571")
+    store.record("AAPL", 30.0, key)
+    store.record("DELL", 20.0, key)
+    assert store.get(key) is None  # Fewer than MIN_MEMBERS
+    store.record("HPQ", 10.0, key)
+    stats = store.get(key)
+    assert stats["count"] == 3 and stats["mean"] == 20.0 and stats["median"] == 20.0
+
+    store.record("HPQ", 13.0, key)  # Refresh replaces the member's value
+    assert store.get(key)["mean"] == 21.0
+    store.record("XYZ", 900.0, key)  # Unreasonable P/E ratios are ignored
+    assert store.get(key)["count"] == 3
+
+def test_trimmed_mean():
+    values = [1.0] + [10.0] * 8 + [100.0]
+    assert trimmed_mean(values) == 10.0
+    assert trimmed_mean([10.0, 20.0]) == 15.0
+
+def test_persistence_and_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "industry.db")
+        store = IndustryPEStore(db_path)
+        for ticker, pe in (("KO", 25.0), ("PEP", 27.0), ("KDP", 23.0)):
+            store.record(ticker, pe, "sic:2086")
+        assert IndustryPEStore(db_path).get("sic:2086")["count"] == 3
+
+        expired = IndustryPEStore(db_path, max_age=-1)
+        assert expired.get("sic:2086") is None
+
+class CachedAnalyzer:
+    def __init__(self):
+        self.cache = {}
+
+def test_industry_pe_uses_shared_statistics():
+    """Any ticker in an industry reads the aggregate instead of fanning out to peers."""
+    index = PeerIndex()
+    store = IndustryPEStore()
+    for ticker in ("AAPL", "DELL", "HPQ", "SMCI"):
+        index.observe({"ticker": ticker, "sic_code": "3571", "market_cap": 1e9})
+    old_index, old_store = PolygonFinancials.peer_index, PolygonFinancials.industry_pe_store
+    PolygonFinancials.peer_index, PolygonFinancials.industry_pe_store = index, store
+    try:
+        analyzer = CachedAnalyzer()
+        for ticker, pe in (("AAPL", 30.0), ("DELL", 20.0), ("HPQ", 10.0)):
+            PolygonFinancials(ticker, analyzer=analyzer)._record_pe_ratio(pe)
+        assert analyzer.cache["pe_DELL"][1] == 20.0
+
+        summary = PolygonFinancials("SMCI", analyzer=analyzer).get_industry_pe_summary()
+        assert summary["industry_pe_ratio"] == 20.0
+        assert summary["industry"]["count"] == 3
+        assert summary["peers"] == []
+    finally:
+        PolygonFinancials.peer_index, PolygonFinancials.industry_pe_store = old_index, old_store
+
+def test_fallback_pe_ratios_stay_out_of_the_statistics():
+    """Hardcoded PE_FALLBACKS values are cached for the ticker but never recorded as real."""
+    class Unreachable(PolygonFinancials):
+        def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+            return {}
+
+    store = IndustryPEStore()
+    old_store = PolygonFinancials.industry_pe_store
+    PolygonFinancials.industry_pe_store = store
+    try:
+        analyzer = CachedAnalyzer()
+        assert Unreachable("AAPL", analyzer=analyzer).get_pe_ratio() == PE_FALLBACKS["AAPL"]
+        assert analyzer.cache["pe_AAPL"][1] == PE_FALLBACKS["AAPL"]
+        assert store.stats()["members"] == 0
+    finally:
+        PolygonFinancials.industry_pe_store = old_store
+
+def test_industry_pe_is_cached_per_industry():
+    """Classified tickers share one cached industry P/E; unclassified ones keep their own."""
+    index = PeerIndex()
+    for ticker in ("AAPL", "DELL"):
+        index.observe({"ticker": ticker, "sic_code": "3571", "market_cap": 1e9})
+    old_index = PolygonFinancials.peer_index
+    PolygonFinancials.peer_index = index
+    try:
+        analyzer = CachedAnalyzer()
+        key = PolygonFinancials("AAPL", analyzer=analyzer)._industry_pe_cache_key()
+        assert key == PolygonFinancials("DELL")._industry_pe_cache_key() == "industry_pe_sic-3571"
+        assert ResponseCache.method_of(key) == "industry_pe"
+        assert PolygonFinancials("ZZZZ")._industry_pe_cache_key() == "industry_pe_ZZZZ"
+
+        analyzer.cache[key] = (time.time(), 22.0)
+        assert PolygonFinancials("DELL", analyzer=analyzer).get_industry_pe_ratio() == 22.0
+    finally:
+        PolygonFinancials.peer_index = old_index
+
+if __name__ == "__main__":
+    test_statistics_update_incrementally()
+    test_trimmed_mean()
+    test_persistence_and_expiry()
+    test_industry_pe_uses_shared_statistics()
+    test_fallback_pe_ratios_stay_out_of_the_statistics()
+    test_industry_pe_is_cached_per_industry()
+    print("All industry statistics tests passed")
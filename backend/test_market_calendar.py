@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script for the US trading calendar and market-hours-aware cache expiry.
+"""
+from datetime import date, datetime
+
+from market_calendar import (
+    EASTERN, PRICE_TTL, FUNDAMENTALS_MAX_TTL, FUNDAMENTALS_OVERDUE_TTL,
+    holidays, early_closes, is_market_open, next_open, price_expiry, statement_expiry,
+)
+
+def _at(*args):
+    return datetime(*args, tzinfo=EASTERN).timestamp()
+
+def test_holidays():
+    assert holidays(2025) == {
+        date(2025, 1, 1), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18), date(2025, 5, 26),
+        date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27), date(2025, 12, 25),
+    }
+    assert date(2026, 7, 3) in holidays(2026)  # July 4th on a Saturday
+    assert date(2021, 12, 31) not in holidays(2021)  # Saturday New Year's Day isn't moved back
+    assert early_closes(2025) == {date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)}
+
+def test_sessions():
+    assert is_market_open(_at(2025, 3, 12, 10, 0))
+    assert not is_market_open(_at(2025, 3, 12, 9, 0))
+    assert not is_market_open(_at(2025, 3, 15, 12, 0))  # Saturday
+    assert not is_market_open(_at(2025, 11, 28, 14, 0))  # Early close
+    assert next_open(_at(2025, 4, 17, 17, 0)) == datetime(2025, 4, 21, 9, 30, tzinfo=EASTERN)  # Over Good Friday
+
+def test_price_expiry():
+    during = _at(2025, 3, 12, 10, 0)
+    assert price_expiry(during) == during + PRICE_TTL
+    # Late in the session: re-check once the closing price has settled
+    assert price_expiry(_at(2025, 3, 12, 15, 50)) == _at(2025, 3, 12, 16, 15)
+    # Friday evening: fresh until Monday's open
+    assert price_expiry(_at(2025, 3, 14, 18, 0)) == _at(2025, 3, 17, 9, 30)
+
+def test_statement_expiry():
+    written = _at(2025, 3, 1, 12, 0)
+    # Quarter ended 2024-12-31: next quarter ends 2025-04-01-ish, filed from late April
+    expires = statement_expiry(written, {"end_date": "2024-12-31", "filing_date": "2025-01-30"})
+    assert _at(2025, 4, 20) < expires < _at(2025, 5, 5)
+    # Next filing already due: re-check daily
+    assert statement_expiry(written, {"end_date": "2024-06-30"}) == written + FUNDAMENTALS_OVERDUE_TTL
+    assert statement_expiry(written, {"end_date": "N/A"}) == written + 24 * 3600
+    assert statement_expiry(written, {"end_date": "2025-02-28"}) <= written + FUNDAMENTALS_MAX_TTL
+
+if __name__ == "__main__":
+    test_holidays()
+    test_sessions()
+    test_price_expiry()
+    test_statement_expiry()
+    print("All market calendar tests passed")
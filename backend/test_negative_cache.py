@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Test script for the negative cache of unknown tickers and empty upstream results.
+Runs offline: no request is sent to Polygon.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import aiohttp
+import requests
+from yarl import URL
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from async_polygon import AsyncPolygonFinancials
+from fallback import FallbackChain
+from get_pe_and_cash_flow import PolygonFinancials
+from negative_cache import NegativeCache, NOT_FOUND, NO_DATA, TRANSIENT
+import strategy_stats
+from strategy_stats import StrategyStats
+
+def test_kinds_and_ttls():
+    cache = NegativeCache(ttls={TRANSIENT: 0})
+    cache.put('zzzz', 'pe_ratio', NO_DATA, "nothing")
+    assert cache.get('ZZZZ', 'pe_ratio')['kind'] == NO_DATA
+    assert cache.get('ZZZZ', 'financials') is None
+
+    cache.put('BAD', 'pe_ratio', NOT_FOUND)  # Covers every data type
+    assert cache.get('BAD', 'news')['kind'] == NOT_FOUND
+
+    cache.put('FLAKY', 'news', TRANSIENT)  # Expires immediately
+    assert cache.get('FLAKY', 'news') is None
+
+    cache.discard('ZZZZ', 'pe_ratio')
+    assert cache.get('ZZZZ', 'pe_ratio') is None
+    assert cache.stats()['hits'] == {NOT_FOUND: 1, NO_DATA: 1, TRANSIENT: 0}
+
+def test_persisted_kinds_survive_a_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'negative.db')
+        cache = NegativeCache(db_path)
+        cache.put('BAD', 'pe_ratio', NOT_FOUND)
+        cache.put('ETF', 'financials', NO_DATA)
+        cache.put('FLAKY', 'news', TRANSIENT)
+        cache.close()
+
+        reloaded = NegativeCache(db_path)
+        assert reloaded.get('BAD', 'pe_ratio')['kind'] == NOT_FOUND
+        assert reloaded.get('ETF', 'financials')['kind'] == NO_DATA
+        assert reloaded.get('FLAKY', 'news') is None
+
+def test_misses_are_written_in_batches():
+    """Recording a miss doesn't touch SQLite; the writer commits the queued misses together."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'negative.db')
+        cache = NegativeCache(db_path, flush_interval=60)
+        cache.put('BAD', 'pe_ratio', NOT_FOUND)
+        cache.put('ETF', 'financials', NO_DATA)
+        cache.put('OLD', 'news', NO_DATA)
+        cache.discard('OLD', 'news')
+        assert cache.stats()['pending_writes'] == 3
+        assert NegativeCache(db_path).get('BAD', 'pe_ratio') is None
+
+        assert cache.flush() == 3
+        reloaded = NegativeCache(db_path)
+        assert reloaded.get('BAD', 'pe_ratio')['kind'] == NOT_FOUND
+        assert reloaded.get('ETF', 'financials')['kind'] == NO_DATA
+        assert reloaded.get('OLD', 'news') is None
+        cache.close()
+
+class FakeFinancials(PolygonFinancials):
+    """Answers every request with `status` (404 only for the ticker details when details_status is set)."""
+    details_status = None
+    status = 200
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.urls = []
+
+    def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+        self.urls.append(url.split('?')[0])
+        status = self.status
+        if self.details_status and '/v3/reference/tickers/' in url:
+            status = self.details_status
+        if status != 200:
+            response = requests.Response()
+            response.status_code = status
+            raise requests.exceptions.HTTPError(f"{status} error", response=response)
+        return {'results': []}
+
+def _with_cache(test):
+    def run():
+        PolygonFinancials.negative_cache = NegativeCache()
+        try:
+            test(PolygonFinancials.negative_cache)
+        finally:
+            PolygonFinancials.negative_cache = None
+    run.__name__ = test.__name__
+    return run
+
+@_with_cache
+def test_unknown_ticker_is_not_fetched_again(cache):
+    client = FakeFinancials("ZZZZ")
+    client.details_status = 404
+    assert client.get_pe_ratio() is None
+    assert cache.get("ZZZZ", "pe_ratio")['kind'] == NOT_FOUND
+    assert cache.get("ZZZZ", "financials")['kind'] == NOT_FOUND
+
+    again = FakeFinancials("ZZZZ")
+    assert again.get_pe_ratio() is None
+    assert again.get_financial_data()['error'] == 'No financial data available'
+    assert again.urls == []
+
+@_with_cache
+def test_empty_financials_are_no_data(cache):
+    client = FakeFinancials("EMPTY")
+    assert client.get_financial_data()['error'] == 'No financial data available'
+    assert len(client.urls) == 2  # vX and v2
+    assert cache.get("EMPTY", "financials")['kind'] == NO_DATA
+
+    again = FakeFinancials("EMPTY")
+    again.get_financial_data()
+    assert again.urls == []
+
+@_with_cache
+def test_upstream_errors_are_transient(cache):
+    client = FakeFinancials("FLAKY")
+    client.status = 500
+    assert client.get_pe_ratio() is None
+    assert cache.get("FLAKY", "pe_ratio")['kind'] == TRANSIENT
+
+@contextmanager
+def _main_app(send):
+    """main with a scratch database and every Polygon request answered by send(url); restores the shared hooks."""
+    hooks = [(PolygonFinancials, name) for name in ('peer_index', 'industry_pe_store', 'negative_cache')]
+    hooks.append((FallbackChain, 'learner'))
+    saved = [getattr(owner, name) for owner, name in hooks]
+    originals = AsyncPolygonFinancials._send_api_request, PolygonFinancials._send_get_json
+
+    async def send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+        return send(url)
+
+    os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+    os.environ.setdefault("STOCK_CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), 'stock_cache.db'))
+    import main
+    main.NEGATIVE_CACHE = PolygonFinancials.negative_cache = NegativeCache()
+    PolygonFinancials.peer_index, PolygonFinancials.industry_pe_store = main.PEER_INDEX, main.INDUSTRY_PE_STORE
+    AsyncPolygonFinancials._send_api_request = send_api_request
+    PolygonFinancials._send_get_json = lambda self, url: send(url)
+    try:
+        yield main
+    finally:
+        AsyncPolygonFinancials._send_api_request, PolygonFinancials._send_get_json = originals
+        for (owner, name), value in zip(hooks, saved):
+            setattr(owner, name, value)
+
+def test_unknown_ticker_route_answers_404():
+    """/api/pe_ratio answers 404 for an unknown ticker from the first request on."""
+    urls = []
+
+    def send(url):
+        urls.append(url.split('?')[0])
+        if '/v3/reference/tickers/' in url:
+            raise aiohttp.ClientResponseError(aiohttp.RequestInfo(URL(url), 'GET', {}), (), status=404)
+        return {}
+
+    with _main_app(send) as main:
+        client = main.app.test_client()
+        first = client.get('/api/pe_ratio/ZZZQ')
+        again = client.get('/api/pe_ratio/ZZZQ')
+        assert main.NEGATIVE_CACHE.get('ZZZQ', 'pe_ratio')['kind'] == NOT_FOUND
+
+    assert first.status_code == 404
+    assert again.status_code == 404
+    assert len(urls) == 1  # Only the ticker details, on the first request only
+
+def test_details_are_fetched_when_the_learner_skips_them():
+    """Existence and classification don't depend on the learned P/E strategy order."""
+    learner = StrategyStats()
+    for _ in range(strategy_stats.MIN_ATTEMPTS):
+        learner.record('pe_ratio', 'OLD', 'ticker_details', False, 0.2)
+    strategies = [('ticker_details', None), ('snapshot', None)]
+    assert [name for name, _ in learner.order('pe_ratio', 'NEWT', strategies)] == ['snapshot']
+
+    def send(url):
+        if '/v3/reference/tickers/ZZZQ' in url:
+            raise aiohttp.ClientResponseError(aiohttp.RequestInfo(URL(url), 'GET', {}), (), status=404)
+        if '/v3/reference/tickers/NEWT' in url:
+            return {'results': {'ticker': 'NEWT', 'type': 'ETF', 'sic_code': '6726'}}
+        return {}
+
+    with _main_app(send) as main:
+        FallbackChain.learner = learner
+        client = main.app.test_client()
+        unknown = client.get('/api/pe_ratio/ZZZQ')
+        client.get('/api/pe_ratio/NEWT')
+        indexed = main.PEER_INDEX.sic_code('NEWT')
+
+    assert unknown.status_code == 404
+    assert learner.classes['NEWT'] == 'etf'
+    assert indexed == '6726'
+
+def test_quick_pe_route_misses_leave_the_full_lookup():
+    """A miss of /api/pe_ratio (no manual calculation) doesn't block get_pe_ratio's full chain."""
+    def send(url):
+        if '/v3/reference/tickers/' in url:
+            return {'results': {'ticker': 'NOPE', 'type': 'CS'}}
+        return {}
+
+    with _main_app(send) as main:
+        response = main.app.test_client().get('/api/pe_ratio/NOPE')
+        quick_miss = main.NEGATIVE_CACHE.get('NOPE', main.negative_key('pe_ratio'))
+        full_miss = main.NEGATIVE_CACHE.get('NOPE', 'pe_ratio')
+
+    assert response.get_json()['pe_ratio'] is None
+    assert quick_miss['kind'] == NO_DATA
+    assert full_miss is None
+
+def test_financials_route_reports_cached_parts():
+    """/api/financials is marked X-From-Cache when both parts come from stock_info_cache."""
+    def send(url):
+        if '/v3/reference/tickers/' in url:
+            return {'results': {'ticker': 'FRSH', 'type': 'CS', 'pe_ratio': 18.0}}
+        return {}
+
+    with _main_app(send) as main:
+        main.cache_stock_info('CACH', 'pe_ratio', {'ticker': 'CACH', 'pe_ratio': 21.0})
+        main.cache_stock_info('CACH', 'balance_sheet', {'ticker': 'CACH', 'balance_sheet': {'total_assets': 1}})
+        main.cache_stock_info('FRSH', 'balance_sheet', {'ticker': 'FRSH', 'balance_sheet': {'total_assets': 1}})
+        client = main.app.test_client()
+        cached = client.get('/api/financials/CACH')
+        fresh = client.get('/api/financials/FRSH')
+
+    assert cached.get_json()['pe_ratio'] == 21.0
+    assert cached.headers.get('X-From-Cache') == 'true'
+    assert fresh.get_json()['pe_ratio'] == 18.0
+    assert 'X-From-Cache' not in fresh.headers  # The P/E ratio was just fetched
+
+def test_failure_reasons_hide_the_api_key():
+    """Reasons served in 503 bodies name the status, not the failing URL and its API key."""
+    def fetch():
+        response = requests.Response()
+        response.status_code = 500
+        url = "https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers/FLAKY?apiKey=secret"
+        raise requests.exceptions.HTTPError(f"500 Server Error for url: {url}", response=response)
+
+    with _main_app(lambda url: {}) as main:
+        try:
+            main.refresh_stock_info('FLAKY', 'pe_ratio', fetch)
+            assert False, "expected HTTPError"
+        except requests.exceptions.HTTPError:
+            pass
+        response = main.app.test_client().get('/api/pe_ratio/FLAKY')
+
+    assert response.status_code == 503
+    assert response.get_json()['message'] == "pe_ratio fetch failed (500)"
+    assert 'secret' not in response.get_data(as_text=True)
+
+def test_unknown_ticker_profile_skips_claude():
+    """/api/ticker answers 404 for an unknown ticker without asking Claude for a profile or risk."""
+    urls = []
+
+    def send(url):
+        urls.append(url.split('?')[0])
+        if '/v3/reference/tickers/' in url:
+            return {'status': 'NOT_FOUND', 'message': 'Ticker not found.'}
+        return {'status': 'NOT_FOUND', 'error': 'Not found'}
+
+    claude_calls = []
+
+    def claude(*args, **kwargs):
+        claude_calls.append(args)
+        raise RuntimeError("Claude was asked about an unknown ticker")
+
+    with _main_app(send) as main:
+        main.analyzer.get_company_info = main.analyzer.analyze_risk_and_financials = claude
+        try:
+            client = main.app.test_client()
+            first = client.get('/api/ticker/ZZZQ')
+            again = client.get('/api/ticker/ZZZQ')
+        finally:
+            del main.analyzer.get_company_info, main.analyzer.analyze_risk_and_financials
+        assert main.NEGATIVE_CACHE.get('ZZZQ', 'basic_info')['kind'] == NOT_FOUND
+
+    assert first.status_code == 404
+    assert again.status_code == 404
+    assert claude_calls == []
+    assert len(urls) == 2  # v3 and v1 ticker details, on the first request only
+
+if __name__ == "__main__":
+    test_kinds_and_ttls()
+    test_persisted_kinds_survive_a_restart()
+    test_misses_are_written_in_batches()
+    test_unknown_ticker_is_not_fetched_again()
+    test_empty_financials_are_no_data()
+    test_upstream_errors_are_transient()
+    test_unknown_ticker_route_answers_404()
+    test_details_are_fetched_when_the_learner_skips_them()
+    test_quick_pe_route_misses_leave_the_full_lookup()
+    test_financials_route_reports_cached_parts()
+    test_failure_reasons_hide_the_api_key()
+    test_unknown_ticker_profile_skips_claude()
+    print("All negative cache tests passed")
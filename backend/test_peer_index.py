@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the local SIC/sector peer index.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from peer_index import PeerIndex
+
+def _details(ticker, sic_code, market_cap):
+    return {"ticker": ticker, "name": f"{ticker} Corp", "sic_code": sic_code, "market_cap": market_cap}
+
+def test_peers_ranked_by_market_cap():
+    """Peers share the SIC code and come back largest first, without the ticker itself."""
+    index = PeerIndex()
+    index.observe(_details("AAPL", "3571", 3e12))
+    index.observe(_details("DELL", "3571", 8e10))
+    index.observe(_details("HPQ", "3571", 3e10))
+    index.observe(_details("SMCI", "3571", 2e10))
+    assert index.peers("aapl", count=2) == ["DELL", "HPQ"]
+    assert index.peers("HPQ") == ["AAPL", "DELL", "SMCI"]
+
+    # A market cap update re-ranks the group
+    index.observe(_details("SMCI", "3571", 9e10))
+    assert index.peers("HPQ") == ["AAPL", "SMCI", "DELL"]
+
+def test_sector_top_up_and_unknown_tickers():
+    """Small SIC groups are topped up from the same sector; unindexed tickers return nothing."""
+    index = PeerIndex()
+    index.observe(_details("JPM", "6021", 5e11))
+    index.observe(_details("GS", "6211", 1.5e11))
+    index.observe(_details("MS", "6211", 1.4e11))
+    index.observe(_details("XOM", "2911", 4e11))  # Different sector
+    assert index.peers("JPM", count=3) == ["GS", "MS"]
+    assert index.peers("GS", count=1) == ["MS"]
+    assert index.peers("ZZZZ") == []
+
+    index.remove("MS")
+    assert index.peers("JPM") == ["GS"]
+
+def test_persistence():
+    """The index is flushed to SQLite and reloaded by a new instance."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "peers.db")
+        index = PeerIndex(db_path)
+        index.observe(_details("KO", "2086", 2.6e11))
+        index.observe(_details("PEP", "2086", 2.3e11))
+        index.close()
+
+        reloaded = PeerIndex(db_path)
+        assert reloaded.peers("PEP") == ["KO"]
+        assert reloaded.stats()["classified"] == 2
+
+def test_partial_universe_listing_keeps_the_index():
+    """A listing cut short by a failed page drops nothing and is retried."""
+    index = PeerIndex(api_key="test")
+    for i in range(5):
+        index.observe(_details(f"T{i}", "3571", 1e9 * (i + 1)))
+    pages = [{"results": [{"ticker": "T0"}], "next_url": "https://api.polygon.io/next"}, None]
+    index._request = lambda url: pages.pop(0)
+    index.refresh_universe()
+    assert sorted(index.entries) == ["T0", "T1", "T2", "T3", "T4"]
+    assert index.universe_listed == 0
+
+    index._request = lambda url: {"results": [{"ticker": "T0"}, {"ticker": "T1"}]}
+    index.refresh_universe()
+    assert sorted(index.entries) == ["T0", "T1"]
+    assert index.universe_listed > 0
+
+def test_partial_listing_is_not_complete_after_a_restart():
+    """Entries stamped by a partial listing don't make the reloaded universe look freshly listed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "peers.db")
+        index = PeerIndex(db_path, api_key="test")
+        index._request = lambda url: {"results": [{"ticker": "T0"}, {"ticker": "T1"}]}
+        index.refresh_universe()
+        listed = index.universe_listed
+
+        pages = [{"results": [{"ticker": "T0"}], "next_url": "https://api.polygon.io/next"}, None]
+        index._request = lambda url: pages.pop(0)
+        index.refresh_universe()
+        index.close()
+
+        reloaded = PeerIndex(db_path)
+        assert reloaded.entries["T0"]["listed"] > listed
+        assert reloaded.universe_listed == listed
+
+if __name__ == "__main__":
+    test_peers_ranked_by_market_cap()
+    test_sector_top_up_and_unknown_tickers()
+    test_persistence()
+    test_partial_universe_listing_keeps_the_index()
+    test_partial_listing_is_not_complete_after_a_restart()
+    print("All peer index tests passed")
@@ -120,9 +120,10 @@ def test_rate_limiting_and_caching():
     # Print rate limiter statistics
     print("\nRate limiter statistics:")
     if hasattr(analyzer, 'rate_limiter'):
-        print(f"Calls tracked: {len(analyzer.rate_limiter.calls)}")
-        print(f"Max calls allowed: {analyzer.rate_limiter.max_calls}")
-        print(f"Time period: {analyzer.rate_limiter.time_period} seconds")
+        stats = analyzer.rate_limiter.stats()
+        print(f"Calls granted: {stats['granted']}")
+        print(f"Max calls allowed: {stats['calls_per_minute']} per minute")
+        print(f"Tokens available: {stats['tokens']}")
     else:
         print("Rate limiter not available")
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for the priority-aware token-bucket rate limiter.
+"""
+import asyncio
+import threading
+import time
+
+from rate_scheduler import (
+    TokenBucketScheduler,
+    AdaptiveTokenBucketScheduler,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_REFRESH,
+    PRIORITY_BATCH,
+    request_priority,
+    current_priority,
+)
+
+def test_burst_then_rate():
+    """A full bucket allows a burst, then calls are spaced by the refill rate."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=600, burst=2, reserve=0)  # 10 per second
+    start = time.monotonic()
+    for _ in range(4):
+        assert limiter.acquire(timeout=2)
+    elapsed = time.monotonic() - start
+    assert 0.15 <= elapsed < 0.5, elapsed
+
+def test_background_leaves_reserve():
+    """Background classes cannot spend the tokens reserved for interactive calls."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=1, burst=1, reserve=1)
+    assert limiter.try_acquire(PRIORITY_BATCH)
+    assert not limiter.try_acquire(PRIORITY_REFRESH)
+    assert limiter.try_acquire(PRIORITY_INTERACTIVE)
+
+def test_spare_capacity():
+    """Background work only sees spare capacity beyond the interactive reserve."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=1, burst=1, reserve=1)
+    assert limiter.has_spare_capacity(PRIORITY_REFRESH)
+    assert limiter.try_acquire(PRIORITY_INTERACTIVE)
+    assert not limiter.has_spare_capacity(PRIORITY_REFRESH)
+    assert limiter.has_spare_capacity(PRIORITY_INTERACTIVE)
+
+def test_interactive_served_first():
+    """Queued interactive requests are granted before queued background work."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=300, burst=1, reserve=0)  # 5 per second
+    assert limiter.acquire()
+    order = []
+
+    def worker(priority, name):
+        limiter.acquire(priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=(PRIORITY_BATCH, 'batch'))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=worker, args=(PRIORITY_INTERACTIVE, 'interactive')))
+    threads[1].start()
+    for t in threads:
+        t.join(3)
+    assert order == ['interactive', 'batch'], order
+
+def test_lock_not_held_while_waiting():
+    """A waiting caller must not block others from checking the bucket."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=1, burst=1, reserve=0)
+    assert limiter.acquire()
+    waiter = threading.Thread(target=limiter.acquire, kwargs={'timeout': 0.5})
+    waiter.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert not limiter.try_acquire()
+    assert time.monotonic() - start < 0.05
+    waiter.join()
+    assert limiter.stats()['abandoned'] == 1
+
+def test_async_acquire_and_priority_context():
+    """Coroutines wait without blocking the loop and inherit the request priority."""
+    limiter = TokenBucketScheduler("test", calls_per_minute=600, burst=1, reserve=0)
+
+    async def run():
+        with request_priority(PRIORITY_REFRESH):
+            assert current_priority() == PRIORITY_REFRESH
+            results = await asyncio.gather(*(limiter.acquire_async(timeout=2) for _ in range(3)))
+        return results
+
+    assert asyncio.run(run()) == [True, True, True]
+    assert limiter.stats()['granted']['refresh'] == 3
+    assert current_priority() == PRIORITY_INTERACTIVE
+
+def test_adaptive_backoff_and_recovery():
+    """429s halve the rate and block everyone; successes under load recover additively."""
+    limiter = AdaptiveTokenBucketScheduler("test", calls_per_minute=60, min_calls_per_minute=10,
+                                           max_calls_per_minute=100, increase_step=5, reserve=0)
+    assert limiter.record_response(429, {'Retry-After': '0.2'}) == 0.2
+    assert limiter.calls_per_minute == 30
+    assert not limiter.try_acquire()
+    start = time.monotonic()
+    assert limiter.acquire(timeout=3)
+    assert time.monotonic() - start >= 0.15
+
+    # Bucket is drained, so a success means the limiter is the bottleneck
+    limiter.record_response(200, {})
+    assert limiter.calls_per_minute == 35
+
+    for _ in range(10):
+        limiter.on_throttle(0)
+    assert limiter.calls_per_minute == 10
+
+def test_rate_limit_headers():
+    """An exhausted X-RateLimit-Remaining blocks callers until the reset."""
+    limiter = AdaptiveTokenBucketScheduler("test", calls_per_minute=600, reserve=0)
+    limiter.record_response(200, {'X-RateLimit-Limit': '100', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0.2'})
+    assert limiter.max_calls_per_minute == 100
+    assert limiter.calls_per_minute == 100
+    assert not limiter.try_acquire()
+    assert limiter.acquire(timeout=3)
+
+if __name__ == "__main__":
+    test_burst_then_rate()
+    test_background_leaves_reserve()
+    test_spare_capacity()
+    test_interactive_served_first()
+    test_lock_not_held_while_waiting()
+    test_async_acquire_and_priority_context()
+    test_adaptive_backoff_and_recovery()
+    test_rate_limit_headers()
+    print("All rate scheduler tests passed")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for the request-scoped upstream response memo.
+Runs offline: no request is sent to Polygon.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+import http_pool
+from async_polygon import AsyncPolygonFinancials
+from fanout import fan_out
+from get_pe_and_cash_flow import PolygonFinancials
+from request_memo import request_memo, memoized, memoized_async, MEMO_STATS
+
+def test_each_key_fetched_once():
+    """Repeats inside a block share the first result; outside a block nothing is memoized."""
+    calls = []
+    fetch = lambda key: calls.append(key) or len(calls)
+
+    assert memoized("a", fetch, "a") == 1
+    assert memoized("a", fetch, "a") == 2
+
+    before = MEMO_STATS.stats()
+    with request_memo() as memo:
+        assert memoized("a", fetch, "a") == 3
+        with request_memo() as inner:  # Nested blocks share the memo
+            assert inner is memo
+            assert memoized("a", fetch, "a") == 3
+        assert fan_out(lambda i: memoized("a", fetch, "a"), range(3))[0] == {0: 3, 1: 3, 2: 3}
+        assert memoized("b", fetch, "b") == 4
+    assert (memo.fetches, memo.duplicates) == (2, 4)
+    after = MEMO_STATS.stats()
+    assert after["requests"] == before["requests"] + 1
+    assert after["duplicates_eliminated"] == before["duplicates_eliminated"] + 4
+
+def test_exceptions_are_memoized():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("boom")
+
+    with request_memo():
+        for _ in range(2):
+            try:
+                memoized("x", fail)
+                assert False, "expected ValueError"
+            except ValueError:
+                pass
+    assert len(calls) == 1
+
+def test_async_shares_the_memo():
+    """Coroutines run through run_sync see the caller's memo."""
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return "data"
+
+    async def twice():
+        return await asyncio.gather(memoized_async("k", fetch), memoized_async("k", fetch))
+
+    with request_memo() as memo:
+        assert http_pool.run_sync(twice()) == ["data", "data"]
+        assert memoized("k", lambda: "other") == "data"
+    assert len(calls) == 1
+    assert memo.duplicates == 2
+
+def test_polygon_fetches_go_through_the_memo():
+    """get_pe_ratio's direct details call and its first fallback hit the endpoint once."""
+    urls = []
+
+    class FakeFinancials(PolygonFinancials):
+        def _send_api_request(self, url, method='GET', max_retries=3, retry_delay=2):
+            urls.append(url.split('?')[0])
+            return {'results': {}}
+
+    with request_memo():
+        FakeFinancials("ZZZZ")._fetch_pe_ratio()
+    assert urls.count("https://api.polygon.io/v3/reference/tickers/ZZZZ") == 1
+
+    class FakeAsyncFinancials(AsyncPolygonFinancials):
+        async def _send_get_json(self, url):
+            urls.append(url.split('?')[0])
+            return {}
+
+    urls.clear()
+    client = FakeAsyncFinancials("ZZZZ")
+    with request_memo():
+        http_pool.run_sync(client.get_ticker_details())
+        http_pool.run_sync(client.get_ticker_details())
+    assert urls == [
+        "https://api.polygon.io/v3/reference/tickers/ZZZZ",
+        "https://api.polygon.io/v1/meta/symbols/ZZZZ/company",
+    ]
+
+if __name__ == "__main__":
+    test_each_key_fetched_once()
+    test_exceptions_are_memoized()
+    test_async_shares_the_memo()
+    test_polygon_fetches_go_through_the_memo()
+    print("All request memo tests passed")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for pre-serialized cached response bodies.
+"""
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from cache_store import StockInfoStore
+from response_body import ResponseBody
+
+def _accept(header):
+    return parse_accept_header(header, Accept)
+
+def test_encoding_and_etag():
+    small = ResponseBody.from_data({"ticker": "AAPL"})
+    assert json.loads(small.body) == {"ticker": "AAPL"}
+    assert small.gzip is None  # Too small to be worth compressing
+    assert small.encoded(_accept("gzip")) == (small.body, None)
+
+    large = ResponseBody.from_data({"news": ["headline"] * 500})
+    content, encoding = large.encoded(_accept("gzip, deflate"))
+    assert (content, encoding) == (large.gzip, "gzip")
+    assert gzip.decompress(large.gzip) == large.body
+    assert large.encoded(_accept("")) == (large.body, None)
+
+def test_refused_encodings_are_not_sent():
+    """q=0 refuses an encoding even though it is listed."""
+    large = ResponseBody.from_data({"news": ["headline"] * 500})
+    large.br = b"brotli variant"  # Whether or not the brotli package is installed
+    assert large.encoded(_accept("br, gzip"))[1] == "br"
+    assert large.encoded(_accept("br;q=0, gzip"))[1] == "gzip"
+    assert large.encoded(_accept("br;q=0, gzip;q=0")) == (large.body, None)
+    assert large.encoded(_accept("*"))[1] == "br"
+
+    assert ResponseBody.from_data({"a": 1}).etag == ResponseBody.from_data({"a": 1}).etag
+    assert ResponseBody.from_data({"a": 1}).etag != ResponseBody.from_data({"a": 2}).etag
+
+def test_store_body_is_encoded_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StockInfoStore(os.path.join(tmp, "cache.db"))
+        store.put("AAPL", "pe_ratio", {"ticker": "AAPL", "pe_ratio": 28.5})
+        body = store.get_body("aapl", "pe_ratio")
+        assert json.loads(body.body) == {"ticker": "AAPL", "pe_ratio": 28.5}
+        assert store.get_body("AAPL", "pe_ratio") is body
+        assert abs(body.last_modified - time.time()) < 5  # Used for Last-Modified
+
+        # A new value gets a new body
+        store.put("AAPL", "pe_ratio", {"ticker": "AAPL", "pe_ratio": 30})
+        assert store.get_body("AAPL", "pe_ratio").etag != body.etag
+        assert store.get_body("MSFT", "pe_ratio") is None
+        store.close()
+
+if __name__ == "__main__":
+    test_encoding_and_etag()
+    test_refused_encodings_are_not_sent()
+    test_store_body_is_encoded_once()
+    print("All response body tests passed")
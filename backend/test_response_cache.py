@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded, persistent StockAnalyzer response cache.
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+from get_pe_and_cash_flow import PolygonFinancials
+from response_cache import ResponseCache
+
+def test_dict_compatibility():
+    """Existing `key in cache` / `cache[key] = (time, value)` code keeps working."""
+    cache = ResponseCache()
+    cache["price_AAPL"] = (time.time(), 187.5)
+    assert "price_AAPL" in cache
+    cached_time, price = cache["price_AAPL"]
+    assert price == 187.5
+    assert "price_MSFT" not in cache
+    assert list(cache) == ["price_AAPL"]
+
+def test_lru_bounds():
+    """The least recently used entries are evicted first."""
+    cache = ResponseCache(max_entries=2)
+    now = time.time()
+    cache["a:1"] = (now, "one")
+    cache["a:2"] = (now, "two")
+    cache["a:1"]  # Touch so a:2 becomes least recently used
+    cache["a:3"] = (now, "three")
+    assert "a:1" in cache and "a:3" in cache and "a:2" not in cache
+
+    small = ResponseCache(max_bytes=100)
+    for i in range(10):
+        small[f"get_company_info:{i}"] = (now, "x" * 40)
+    assert small.stats()['approx_bytes'] <= 100
+
+def test_per_method_ttl():
+    """Entries older than their method's TTL are treated as missing."""
+    cache = ResponseCache(ttls={'price': 60})
+    cache["price_AAPL"] = (time.time() - 120, 100.0)
+    cache["get_similar_companies:prompt"] = (time.time() - 120, "MSFT,GOOGL")
+    assert "price_AAPL" not in cache
+    assert "get_similar_companies:prompt" in cache
+    assert cache.ttl_for("get_similar_companies") == 7 * 24 * 3600
+
+def test_survives_restart():
+    """Entries written behind to SQLite are served after a restart."""
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    cache = ResponseCache(db_path, flush_interval=60)
+    cache["get_company_info:AAPL"] = (time.time(), '{"name": "Apple"}')
+    cache["peers_AAPL"] = (time.time(), ["MSFT", "GOOGL"])
+    cache.close()
+
+    restarted = ResponseCache(db_path, flush_interval=60)
+    assert restarted["get_company_info:AAPL"][1] == '{"name": "Apple"}'
+    assert restarted["peers_AAPL"][1] == ["MSFT", "GOOGL"]
+    restarted.close()
+
+def test_read_through_from_other_worker():
+    """A miss in memory falls back to entries another process wrote to SQLite."""
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    worker_a = ResponseCache(db_path, flush_interval=60)
+    worker_b = ResponseCache(db_path, flush_interval=60)
+    worker_a["get_company_info:MSFT"] = (time.time(), "answer")
+    worker_a.flush()
+    assert worker_b["get_company_info:MSFT"][1] == "answer"
+    assert worker_b.stats()['disk_hits'] == 1
+    worker_a.close()
+    worker_b.close()
+
+def test_disk_misses_are_remembered():
+    """A key SQLite didn't have is not looked up again until miss_recheck passes, unless it is set."""
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    worker_a = ResponseCache(db_path, flush_interval=60)
+    worker_b = ResponseCache(db_path, flush_interval=60, miss_recheck=60)
+    assert "get_company_info:TSLA" not in worker_b
+    worker_a["get_company_info:TSLA"] = (time.time(), "answer")
+    worker_a.flush()
+    assert "get_company_info:TSLA" not in worker_b  # Still within miss_recheck
+    worker_b.miss_recheck = 0
+    assert worker_b["get_company_info:TSLA"][1] == "answer"
+    worker_a.close()
+    worker_b.close()
+
+def test_expiry_policies():
+    """Prices follow the trading calendar unless a fixed TTL is configured."""
+    cache = ResponseCache(expiry_policies={'price': lambda timestamp, value: timestamp + value})
+    cache["price_AAPL"] = (time.time() - 120, 600)
+    cache["price_MSFT"] = (time.time() - 120, 60)
+    assert "price_AAPL" in cache
+    assert "price_MSFT" not in cache
+    assert ResponseCache(ttls={'price': 60}).expires_at("price_AAPL", 1000, 1.0) == 1060
+
+def test_reads_survive_a_concurrent_eviction():
+    """PolygonFinancials reads an entry with one lookup, so an eviction between check and read is a miss."""
+    class EvictedAfterCheck(ResponseCache):
+        def __contains__(self, key):
+            return True  # Another thread evicts the entry right after the membership test
+
+    class Analyzer:
+        cache = EvictedAfterCheck()
+
+    financials = PolygonFinancials("AAPL", analyzer=Analyzer())
+    assert financials._cached("price_AAPL", 3600) is None
+    Analyzer.cache["pe_AAPL"] = (time.time(), 28.0)
+    assert financials._cached("pe_AAPL", 3600) == 28.0
+
+if __name__ == "__main__":
+    test_dict_compatibility()
+    test_lru_bounds()
+    test_per_method_ttl()
+    test_disk_misses_are_remembered()
+    test_expiry_policies()
+    test_survives_restart()
+    test_read_through_from_other_worker()
+    test_reads_survive_a_concurrent_eviction()
+    print("All response cache tests passed")
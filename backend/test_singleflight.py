@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for request coalescing of concurrent identical upstream calls.
+"""
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight, normalize_url
+
+def test_normalize_url():
+    """The API key and query order must not affect the key."""
+    a = normalize_url("https://api.polygon.io/v3/reference/tickers?sic_code=1&active=true&apiKey=abc")
+    b = normalize_url("https://API.polygon.io/v3/reference/tickers?active=true&apiKey=xyz&sic_code=1")
+    assert a == b
+    assert normalize_url("https://api.polygon.io/a", "GET") != normalize_url("https://api.polygon.io/b", "GET")
+
+def test_concurrent_calls_collapse():
+    """Many threads asking for the same key share one upstream call."""
+    flights = SingleFlight("test")
+    upstream_calls = []
+    results = []
+
+    def slow_fetch():
+        upstream_calls.append(1)
+        time.sleep(0.2)
+        return "data"
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow_fetch))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(upstream_calls) == 1
+    assert results == ["data"] * 8
+    stats = flights.stats()
+    assert stats['executions'] == 1 and stats['collapsed'] == 7 and stats['in_flight'] == 0
+
+def test_errors_propagate_to_all_waiters():
+    """Every waiter sees the leader's exception."""
+    flights = SingleFlight("test")
+    errors = []
+
+    def failing_fetch():
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    def call():
+        try:
+            flights.do("key", failing_fetch)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == ["upstream down"] * 4
+    assert flights.stats()['errors'] == 1
+
+def test_async_calls_collapse():
+    """Coroutines share one flight, and cancelling one waiter doesn't cancel the others."""
+    flights = SingleFlight("test")
+    upstream_calls = []
+
+    async def slow_fetch():
+        upstream_calls.append(1)
+        await asyncio.sleep(0.1)
+        return 42
+
+    async def run():
+        tasks = [asyncio.ensure_future(flights.do_async("key", slow_fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        return await asyncio.gather(*tasks[1:])
+
+    assert asyncio.run(run()) == [42] * 4
+    assert len(upstream_calls) == 1
+
+if __name__ == "__main__":
+    test_normalize_url()
+    test_concurrent_calls_collapse()
+    test_errors_propagate_to_all_waiters()
+    test_async_calls_collapse()
+    print("All singleflight tests passed")
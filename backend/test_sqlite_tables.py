@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared SQLite persistence of the in-memory stores.
+"""
+import os
+import tempfile
+
+from sqlite_tables import SQLiteTables
+
+SCHEMA = ['CREATE TABLE IF NOT EXISTS things (name TEXT PRIMARY KEY, value REAL NOT NULL)']
+
+def test_one_tuned_connection():
+    """Every read and write reuses one connection running in WAL mode."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tables = SQLiteTables(os.path.join(tmp, 'tables.db'), "things", SCHEMA)
+        conn = tables._conn
+        assert tables.write(("INSERT OR REPLACE INTO things (name, value) VALUES (?, ?)", [("a", 1.0), ("b", 2.0)]))
+        assert [tuple(row) for row in tables.read("SELECT name, value FROM things ORDER BY name")] == [("a", 1.0), ("b", 2.0)]
+        assert tables._conn is conn
+        assert tables.read("PRAGMA journal_mode")[0][0] == 'wal'
+        tables.close()
+
+def test_failed_batches_roll_back():
+    with tempfile.TemporaryDirectory() as tmp:
+        tables = SQLiteTables(os.path.join(tmp, 'tables.db'), "things", SCHEMA)
+        assert not tables.write(
+            ("INSERT INTO things (name, value) VALUES (?, ?)", [("a", 1.0)]),
+            ("INSERT INTO things (name, value) VALUES (?, ?)", [("b", None)]),  # NOT NULL
+        )
+        assert tables.read("SELECT name FROM things") == []
+        assert tables.read("SELECT name FROM missing") is None
+        tables.close()
+
+def test_in_memory_only():
+    tables = SQLiteTables(None, "things", SCHEMA)
+    assert tables.read("SELECT name FROM things") == []
+    assert tables.write(("INSERT INTO things (name, value) VALUES (?, ?)", [("a", 1.0)]))
+
+if __name__ == "__main__":
+    test_one_tuned_connection()
+    test_failed_batches_roll_back()
+    test_in_memory_only()
+    print("All SQLite table tests passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the learned fallback strategy ordering.
+Runs offline: no request is sent to Polygon.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("POLYGON_API_KEY", "test")
+
+import strategy_stats
+from fallback import FallbackChain
+from strategy_stats import StrategyStats, ticker_class
+
+def test_ticker_class():
+    assert ticker_class({'ticker': 'SPY', 'type': 'ETF'}) == 'etf'
+    assert ticker_class({'ticker': 'BABA', 'type': 'ADRC'}) == 'adr'
+    assert ticker_class({'ticker': 'AAPL', 'type': 'CS', 'list_date': '1980-12-12'}) == 'stock'
+    assert ticker_class({'ticker': 'NEW', 'type': 'CS', 'list_date': '2999-01-01'}) == 'recent_ipo'
+    assert ticker_class({'ticker': 'X'}) is None
+
+def test_hopeless_strategies_are_skipped_per_class():
+    """Strategies that never answer for ETFs are skipped for ETFs but still tried for stocks."""
+    learner = StrategyStats()
+    learner.observe({'ticker': 'SPY', 'type': 'ETF'})
+    learner.observe({'ticker': 'AAPL', 'type': 'CS'})
+    chain = FallbackChain("test_pe", hedge_delay=5)
+    chain.learner = learner
+    calls = []
+
+    def strategy(name, answers):
+        return name, lambda: calls.append(name) or (1.0 if answers else None)
+
+    for _ in range(strategy_stats.MIN_ATTEMPTS):
+        assert chain.run([strategy('details', False), strategy('manual', True)], ticker='SPY') == 1.0
+        assert chain.run([strategy('details', True), strategy('manual', True)], ticker='AAPL') == 1.0
+
+    calls.clear()
+    assert chain.run([strategy('details', False), strategy('manual', True)], ticker='SPY') == 1.0
+    assert chain.run([strategy('details', True), strategy('manual', True)], ticker='AAPL') == 1.0
+    assert calls == ['manual', 'details']
+    assert learner.stats()['skipped_calls'] == 1
+
+def test_faster_strategy_goes_first():
+    """With equal hit rates the strategy that answers faster is tried first."""
+    learner = StrategyStats()
+    for _ in range(strategy_stats.MIN_ATTEMPTS):
+        learner.record('price', 'AAPL', 'slow', True, 2.0)
+        learner.record('price', 'AAPL', 'fast', True, 0.1)
+    strategies = [('slow', None), ('fast', None), ('new', None)]
+    assert [name for name, _ in learner.order('price', 'AAPL', strategies)] == ['new', 'fast', 'slow']
+
+def test_statistics_are_persisted():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stats.db')
+        learner = StrategyStats(db_path)
+        learner.observe({'ticker': 'SPY', 'type': 'ETF'})
+        for _ in range(strategy_stats.MIN_ATTEMPTS):
+            learner.record('pe_ratio', 'SPY', 'details', False, 0.2)
+        learner.flush()
+
+        reloaded = StrategyStats(db_path)
+        assert reloaded.class_of('SPY') == 'etf'
+        assert reloaded.stats()['strategies']['pe_ratio']['etf']['details']['hit_rate'] == 0.0
+
+if __name__ == "__main__":
+    test_ticker_class()
+    test_hopeless_strategies_are_skipped_per_class()
+    test_faster_strategy_goes_first()
+    test_statistics_are_persisted()
+    print("All strategy statistics tests passed")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process ticker search index.
+"""
+import os
+import tempfile
+import time
+
+from ticker_search import TickerSearchIndex
+
+UNIVERSE = [
+    {"ticker": "AAPL", "name": "Apple Inc.", "type": "CS", "market": "stocks"},
+    {"ticker": "APLE", "name": "Apple Hospitality REIT, Inc.", "type": "CS", "market": "stocks"},
+    {"ticker": "AMZN", "name": "Amazon.com, Inc.", "type": "CS", "market": "stocks"},
+    {"ticker": "MSFT", "name": "Microsoft Corporation", "type": "CS", "market": "stocks"},
+    {"ticker": "A", "name": "Agilent Technologies Inc.", "type": "CS", "market": "stocks"},
+    {"ticker": "NVDA", "name": "NVIDIA Corporation", "type": "CS", "market": "stocks"},
+]
+
+def _tickers(results):
+    return [r["ticker"] for r in results]
+
+def test_ticker_and_name_search():
+    index = TickerSearchIndex()
+    index.replace(UNIVERSE)
+    assert _tickers(index.search("AAPL"))[0] == "AAPL"
+    assert _tickers(index.search("microsoft"))[0] == "MSFT"
+    assert set(_tickers(index.search("apple"))[:2]) == {"AAPL", "APLE"}
+    assert "NVDA" in _tickers(index.search("nvidia corp"))
+    assert _tickers(index.search("a"))[0] == "A"  # Exact ticker beats prefixes
+    result = index.search("amzn")[0]
+    assert set(result) == {"ticker", "name", "type", "market", "match_score"}
+    assert index.search("   ") == []
+
+def test_popularity_ranking():
+    """Between equally good matches, the more requested ticker ranks first."""
+    index = TickerSearchIndex()
+    index.replace(UNIVERSE)
+    for _ in range(20):
+        index.record_hit("aple")
+    assert _tickers(index.search("apple"))[0] == "APLE"
+
+def test_replace_drops_delisted_tickers():
+    index = TickerSearchIndex()
+    index.replace(UNIVERSE)
+    index.replace([item for item in UNIVERSE if item["ticker"] != "NVDA"])
+    assert "NVDA" not in _tickers(index.search("nvidia"))
+    assert len(index) == len(UNIVERSE) - 1
+
+def test_partial_universe_listing_is_not_replaced():
+    """The peer index only hands complete universe listings to the search index."""
+    os.environ.setdefault("POLYGON_API_KEY", "test")
+    from peer_index import PeerIndex
+
+    index = TickerSearchIndex()
+    index.replace(UNIVERSE)
+    peers = PeerIndex(api_key="test")
+    peers.universe_listeners.append(index.replace)
+    pages = [{"results": UNIVERSE[:1], "next_url": "https://api.polygon.io/next"}, None]
+    peers._request = lambda url: pages.pop(0)
+    peers.refresh_universe()
+    assert len(index) == len(UNIVERSE)
+
+def test_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "search.db")
+        index = TickerSearchIndex(db_path)
+        index.replace(UNIVERSE)
+        index.record_hit("MSFT")
+        index.flush()
+        reloaded = TickerSearchIndex(db_path)
+        assert len(reloaded) == len(UNIVERSE)
+        assert reloaded.popularity == {"MSFT": 1}
+
+def test_search_speed():
+    """Searching a full-size universe stays in the low milliseconds."""
+    index = TickerSearchIndex()
+    index.replace(UNIVERSE + [
+        {"ticker": f"T{i:04d}", "name": f"Test Company {i} Holdings", "type": "CS", "market": "stocks"}
+        for i in range(10000)
+    ])
+    start = time.perf_counter()
+    for query in ("app", "micro", "t12", "holdings 42"):
+        index.search(query)
+    assert (time.perf_counter() - start) / 4 < 0.05
+
+if __name__ == "__main__":
+    test_ticker_and_name_search()
+    test_popularity_ranking()
+    test_replace_drops_delisted_tickers()
+    test_partial_universe_listing_is_not_replaced()
+    test_persistence()
+    test_search_speed()
+    print("All ticker search tests passed")
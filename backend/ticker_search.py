@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+In-process ticker search over every active US stock.
+Tickers and company names are held in memory (and in SQLite) with a prefix map
+for tickers and name words and a trigram index for names, so /api/search can
+rank candidates locally instead of asking Polygon for 20 rows per keystroke.
+The universe comes from the peer index's background listing; popularity
+(how often a ticker's data is requested) feeds into the ranking.
+"""
+import math
+import re
+import threading
+import time
+
+from fuzzywuzzy import fuzz
+
+from sqlite_tables import SQLiteTables
+
+MAX_CANDIDATES = 200  # Candidates scored with fuzzy matching per query
+MAX_PREFIX_LENGTH = 4  # Longest prefix kept in the prefix map
+
+def _trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _score(query, text):
+    """Fuzzy score; partial matching only when the text is at least as long as the query."""
+    if len(text) < len(query):
+        return fuzz.ratio(query, text)  # partial_ratio would score "apple" vs "a" as 100
+    return fuzz.partial_ratio(query, text)
+
+def _words(name):
+    return re.findall(r"[a-z0-9]+", name.lower())
+
+class TickerSearchIndex:
+    """Prefix and trigram index of tickers and company names with popularity-aware ranking."""
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.entries = {}  # ticker -> {'ticker', 'name', 'type', 'market'}
+        self.prefixes = {}  # ticker or name word prefix -> set of tickers
+        self.trigrams = {}  # name trigram -> set of tickers
+        self.popularity = {}  # ticker -> number of times its data was requested
+        self.searches = 0
+
+        self.db = SQLiteTables(db_path, "ticker search index", [
+            '''
+            CREATE TABLE IF NOT EXISTS ticker_search_index (
+                ticker TEXT PRIMARY KEY,
+                name TEXT,
+                type TEXT,
+                market TEXT,
+                popularity INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )
+            ''',
+        ])
+
+        if self.db_path:
+            self.load()
+
+    def load(self):
+        """Load the persisted index into memory."""
+        rows = self.db.read("SELECT ticker, name, type, market, popularity FROM ticker_search_index")
+        if rows is None:
+            return 0
+
+        with self.lock:
+            for ticker, name, type_, market, popularity in rows:
+                self._put({'ticker': ticker, 'name': name, 'type': type_, 'market': market})
+                if popularity:
+                    self.popularity[ticker] = popularity
+        print(f"Loaded {len(rows)} tickers into the search index")
+        return len(rows)
+
+    def _keys(self, entry):
+        """Prefix and trigram keys for an entry."""
+        ticker = entry['ticker'].lower()
+        prefixes = {ticker[:n] for n in range(1, min(len(ticker), MAX_PREFIX_LENGTH) + 1)}
+        words = _words(entry['name'] or '')
+        for word in words:
+            prefixes.update(word[:n] for n in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1))
+        trigrams = _trigrams(' '.join(words)) if words else set()
+        return prefixes, trigrams
+
+    def _put(self, entry):
+        """Add or replace an entry in the maps. Must hold the lock."""
+        self._drop(entry['ticker'])
+        self.entries[entry['ticker']] = entry
+        prefixes, trigrams = self._keys(entry)
+        for prefix in prefixes:
+            self.prefixes.setdefault(prefix, set()).add(entry['ticker'])
+        for trigram in trigrams:
+            self.trigrams.setdefault(trigram, set()).add(entry['ticker'])
+
+    def _drop(self, ticker):
+        """Remove an entry from the maps. Must hold the lock."""
+        entry = self.entries.pop(ticker, None)
+        if entry is None:
+            return
+        prefixes, trigrams = self._keys(entry)
+        for prefix in prefixes:
+            self.prefixes.get(prefix, set()).discard(ticker)
+        for trigram in trigrams:
+            self.trigrams.get(trigram, set()).discard(ticker)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    @staticmethod
+    def _entry(item):
+        """Index entry from a /v3/reference/tickers list item."""
+        return {
+            'ticker': item['ticker'],
+            'name': item.get('name'),
+            'type': item.get('type'),
+            'market': item.get('market'),
+        }
+
+    def replace(self, items):
+        """Replace the whole universe with a fresh /v3/reference/tickers listing."""
+        items = [item for item in items if item.get('ticker')]
+        if not items:
+            return
+        listed = {item['ticker'] for item in items}
+        with self.lock:
+            for ticker in [t for t in self.entries if t not in listed]:
+                self._drop(ticker)
+            for item in items:
+                self._put(self._entry(item))
+        self._write(items, replace=True)
+        print(f"Ticker search index refreshed: {len(items)} tickers")
+
+    def _write(self, items, replace=False):
+        now = time.time()
+        self.db.write(
+            ("DELETE FROM ticker_search_index", [()] if replace else []),
+            ("INSERT INTO ticker_search_index (ticker, name, type, market, popularity, updated) VALUES (?, ?, ?, ?, ?, ?) "
+             "ON CONFLICT(ticker) DO UPDATE SET name = excluded.name, type = excluded.type, "
+             "market = excluded.market, updated = excluded.updated",
+             [(item['ticker'], item.get('name'), item.get('type'), item.get('market'),
+               self.popularity.get(item['ticker'], 0), now) for item in items if item.get('ticker')]),
+        )
+
+    def record_hit(self, ticker):
+        """Count a request for a ticker's data; popular tickers rank higher in search."""
+        ticker = ticker.upper()
+        with self.lock:
+            if ticker not in self.entries:
+                return
+            self.popularity[ticker] = self.popularity.get(ticker, 0) + 1
+
+    def flush(self):
+        """Persist popularity counters."""
+        if not self.db_path:
+            return
+        with self.lock:
+            rows = [(count, ticker) for ticker, count in self.popularity.items()]
+        self.db.write(("UPDATE ticker_search_index SET popularity = ? WHERE ticker = ?", rows))
+
+    def _candidates(self, query):
+        """Tickers worth scoring: prefix matches, then names sharing the most trigrams. Must hold the lock."""
+        candidates = set(self.prefixes.get(query[:MAX_PREFIX_LENGTH], ()))
+        if len(query) > MAX_PREFIX_LENGTH:
+            # Longer prefixes aren't in the map, check them directly
+            candidates = {
+                t for t in candidates
+                if t.lower().startswith(query) or any(w.startswith(query) for w in _words(self.entries[t]['name'] or ''))
+            }
+        if len(query) >= 3:
+            overlap = {}
+            for trigram in _trigrams(' '.join(_words(query))):
+                for ticker in self.trigrams.get(trigram, ()):
+                    overlap[ticker] = overlap.get(ticker, 0) + 1
+            best = sorted(overlap, key=overlap.get, reverse=True)[:MAX_CANDIDATES]
+            candidates.update(best)
+        if len(candidates) > MAX_CANDIDATES:
+            # Short queries match thousands of tickers: keep exact and popular ones first
+            candidates = sorted(
+                candidates,
+                key=lambda t: (t.lower() != query, -self.popularity.get(t, 0), len(t), t)
+            )[:MAX_CANDIDATES]
+        return candidates
+
+    def search(self, query, limit=20):
+        """Rank tickers for a query.
+
+        Returns:
+            List of {'ticker', 'name', 'type', 'market', 'match_score'} dicts, best first
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        with self.lock:
+            self.searches += 1
+            candidates = [self.entries[t] for t in self._candidates(query)]
+            popularity = {e['ticker']: self.popularity.get(e['ticker'], 0) for e in candidates}
+
+        results = []
+        for entry in candidates:
+            ticker_score = _score(query, entry['ticker'].lower())
+            name_score = _score(query, (entry['name'] or '').lower())
+            match_score = max(ticker_score, name_score)
+            # Exact tickers first, then ticker prefixes, with popularity as a tie-breaker
+            rank = match_score + (20 if entry['ticker'].lower() == query else 0) \
+                + (5 if entry['ticker'].lower().startswith(query) else 0) \
+                + min(10, 2 * math.log1p(popularity[entry['ticker']]))
+            results.append((rank, dict(entry, match_score=match_score)))
+
+        results.sort(key=lambda r: (-r[0], r[1]['ticker']))
+        return [result for _, result in results[:limit]]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'tickers': len(self.entries),
+                'searches': self.searches,
+                'popular_tickers': len(self.popularity),
+            }
@@ -157,25 +157,31 @@ export async function getFinancialData(ticker: string): Promise<{
   balance_sheet: any;
   fromCache: boolean;
 }> {
-  const [peRatioResult, balanceSheetResult] = await Promise.all([
-    getPeRatio(ticker), 
-    getBalanceSheet(ticker)
-  ]);
-  
-  // Extract data and cache status
-  const pe_ratio = peRatioResult;
-  const balance_sheet = balanceSheetResult;
-  
-  // Consider it from cache if either result is from cache
-  const fromCache = peRatioResult.fromCache || balanceSheetResult.fromCache;
+  // One round trip: the server fetches both parts concurrently
+  const { data, fromCache } = await get<any>(`/financials/${encodeURIComponent(ticker)}`);
   
+  // Same shape as the separate /pe_ratio and /balance_sheet responses
   return {
-    pe_ratio,
-    balance_sheet,
+    pe_ratio: { data: { ticker: data.ticker, pe_ratio: data.pe_ratio }, fromCache },
+    balance_sheet: { data: { ticker: data.ticker, balance_sheet: data.balance_sheet }, fromCache },
     fromCache
   };
 }
 
+/**
+ * Get everything shown for a stock in one request
+ * (profile, price, P/E ratio, balance sheet, cash flow, dividends, news and risk analysis)
+ * @param ticker - Stock ticker symbol
+ * @param riskLevel - User's risk tolerance level
+ * @returns Promise with the overview; parts that could not be retrieved are null and listed in `errors`
+ */
+export async function getOverview(ticker: string, riskLevel: string = 'moderate'): Promise<any> {
+  const { data } = await get(
+    `/overview/${encodeURIComponent(ticker)}?risk_level=${encodeURIComponent(riskLevel)}`
+  );
+  return data;
+}
+
 /**
  * Get P/E ratio for a stock
  * @param ticker - Stock ticker symbol
@@ -208,6 +214,7 @@ export default {
   searchStocks,
   getStockInfo,
   getFinancialData,
+  getOverview,
   getPeRatio,
   getBalanceSheet,
   getStockNews